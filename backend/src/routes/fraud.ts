@@ -5,6 +5,21 @@ import { analyzeTransaction } from '../services/fraudService';
 const router = Router();
 const prisma = new PrismaClient();
 
+// Index of the first row created after `time` in rows sorted by createdAt
+const firstAfter = (rows: { createdAt: Date }[], time: number): number => {
+  let lo = 0;
+  let hi = rows.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (rows[mid].createdAt.getTime() <= time) {
+      lo = mid + 1;
+    } else {
+      hi = mid;
+    }
+  }
+  return lo;
+};
+
 // Run fraud detection scan on all transactions
 router.post('/scan', async (req: Request, res: Response) => {
   try {
@@ -33,34 +48,51 @@ router.post('/scan', async (req: Request, res: Response) => {
     let flagged = 0;
     const results: any[] = [];
     
+    // Each user's loaded transactions, oldest first: the 24h counts and
+    // histories come from memory instead of one query per transaction
+    const byUser = new Map<string, typeof transactions>();
+    for (const tx of transactions) {
+      const rows = byUser.get(tx.userId) || [];
+      rows.push(tx);
+      byUser.set(tx.userId, rows);
+    }
+    for (const rows of byUser.values()) {
+      rows.sort((a, b) => a.createdAt.getTime() - b.createdAt.getTime());
+    }
+    
     // Scan each transaction
     for (const tx of transactions) {
       scanned++;
       
-      // Get user's transaction frequency
-      const userTxCount = await prisma.transaction.count({
-        where: {
-          userId: tx.userId,
-          createdAt: {
-            gte: new Date(Date.now() - 24 * 60 * 60 * 1000) // Last 24 hours
-          }
-        }
-      });
+      // The user's other transactions in the 24h up to this one, so scanning
+      // again does not change the frequency
+      const userRows = byUser.get(tx.userId) || [];
+      const time = tx.createdAt.getTime();
+      const windowStart = firstAfter(userRows, time - 24 * 60 * 60 * 1000);
+      const windowEnd = firstAfter(userRows, time);
+      const userTxCount = windowEnd - windowStart - 1;
       
-      // Get user's recent transaction history for context
-      const userHistory = await prisma.transaction.findMany({
-        where: { userId: tx.userId },
-        orderBy: { createdAt: 'desc' },
-        take: 10
-      });
+      // User's most recent other transactions for context
+      const userHistory = userRows
+        .slice(-11)
+        .filter((row) => row.id !== tx.id)
+        .slice(-10)
+        .reverse()
+        .map(({ user, ...row }) => row);
       
-      // Analyze transaction (now async)
+      // Analyze transaction (now async). The id lets the ML service's
+      // velocity index record each transaction once however often it is scanned
       const analysis = await analyzeTransaction({
+        id: tx.id,
+        userId: tx.userId,
         amount: tx.amount,
+        merchant: tx.merchant || undefined,
+        category: tx.category || undefined,
         location: tx.country || tx.location || undefined,
         type: tx.type || 'debit',
         description: tx.description || undefined,
-        frequency: userTxCount
+        frequency: userTxCount,
+        timestamp: tx.createdAt.toISOString()
       }, userHistory);
       
       // Update transaction with fraud analysis
@@ -145,6 +177,7 @@ router.get('/:id', async (req: Request, res: Response) => {
     const userTxCount = await prisma.transaction.count({
       where: {
         userId: transaction.userId,
+        id: { not: transaction.id },
         createdAt: {
           gte: new Date(Date.now() - 24 * 60 * 60 * 1000) // Last 24 hours
         }
@@ -153,7 +186,7 @@ router.get('/:id', async (req: Request, res: Response) => {
     
     // Get user's recent transaction history for context
     const userHistory = await prisma.transaction.findMany({
-      where: { userId: transaction.userId },
+      where: { userId: transaction.userId, id: { not: transaction.id } },
       orderBy: { createdAt: 'desc' },
       take: 10
     });
@@ -216,6 +249,7 @@ router.get('/explain/:id', async (req: Request, res: Response) => {
     const recentTransactions = await prisma.transaction.findMany({
       where: {
         userId: transaction.userId,
+        id: { not: transaction.id },
         createdAt: {
           gte: new Date(Date.now() - 7 * 24 * 60 * 60 * 1000) // Last 7 days
         }
@@ -258,12 +292,20 @@ router.get('/explain/:id', async (req: Request, res: Response) => {
       });
     }
     
-    // Location-based risk
-    if (transaction.country && transaction.country !== 'US') {
+    // Location-based risk: compare against the user's usual country rather
+    // than a fixed one
+    const countryCounts = new Map<string, number>();
+    for (const tx of recentTransactions) {
+      if (tx.id !== transaction.id && tx.country) {
+        countryCounts.set(tx.country, (countryCounts.get(tx.country) || 0) + 1);
+      }
+    }
+    const homeCountry = [...countryCounts.entries()].sort((a, b) => b[1] - a[1])[0]?.[0];
+    if (transaction.country && homeCountry && transaction.country !== homeCountry) {
       features.push({
         feature: 'International Transaction',
         contribution: 30,
-        description: `Transaction from country: ${transaction.country}`,
+        description: `Transaction from ${transaction.country}, outside home country ${homeCountry}`,
         impact: 'medium'
       });
     }
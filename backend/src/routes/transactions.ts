@@ -86,11 +86,14 @@ router.post('/import', upload.single('file'), async (req: Request, res: Response
         
         // Analyze transaction for fraud
         const analysis = await analyzeTransaction({
+          userId,
           amount: Math.abs(amount),
+          merchant: merchant || undefined,
+          category: category || undefined,
           location: country || undefined,
           type,
           description,
-          frequency: 0
+          timestamp: new Date(timestamp).toISOString()
         });
         
         // Create transaction
@@ -231,11 +234,12 @@ router.post('/', async (req: Request, res: Response) => {
     // Analyze transaction for fraud
     const analysis = await analyzeTransaction({
       amount,
+      category,
       location,
       type,
       description,
       metadata,
-      frequency: 0 // Would get from user's transaction history
+      userId // Frequency comes from the ML service's velocity index
     });
     
     // Create transaction
@@ -5,12 +5,15 @@ export interface ForecastRequest {
   period: 'daily' | 'weekly' | 'monthly';
   months: number;
   historical_data?: any[];
+  target?: 'spending' | 'income';
 }
 
 export interface ForecastResult {
   predictions: Array<{
     date: string;
     predictedAmount: number;
+    lower?: number;
+    upper?: number;
     confidence: number;
   }>;
   accuracy?: number;
@@ -24,13 +27,14 @@ export const generateForecast = async (request: ForecastRequest): Promise<Foreca
       request.userId,
       request.period,
       request.months,
-      request.historical_data
+      request.historical_data,
+      request.target
     );
     
     if (mlResult) {
       return {
         predictions: mlResult.predictions || [],
-        accuracy: mlResult.accuracy || 0.85,
+        accuracy: mlResult.accuracy ?? 0.85,
         model: mlResult.model || 'prophet-model-v1'
       };
     }
@@ -72,7 +76,8 @@ export const predictIncome = async (userId: string, months: number = 1) => {
   return generateForecast({
     userId,
     period: 'monthly',
-    months
+    months,
+    target: 'income'
   });
 };
 
@@ -2,12 +2,17 @@ import { fraudScore } from './aiService';
 import { fraudAPI } from './mlApiClient';
 
 export interface TransactionData {
+  id?: string;
+  userId?: string;
   amount: number;
+  merchant?: string;
+  category?: string;
   location?: string;
   frequency?: number;
   type: string;
   description?: string;
   metadata?: any;
+  timestamp?: string;
 }
 
 export const calculateFraudScore = (transaction: TransactionData): number => {
@@ -5,6 +5,10 @@
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001';
 
+// Latency budget (ms) for fraud scoring on the payment path; the ML service
+// answers with degraded rule-based scores rather than overrun it
+const FRAUD_DEADLINE_MS = process.env.FRAUD_DEADLINE_MS;
+
 export interface MLServiceError {
   error: string;
   detail?: string;
@@ -16,7 +20,8 @@ export interface MLServiceError {
 async function callMLService<T>(
   endpoint: string,
   method: 'GET' | 'POST' = 'POST',
-  body?: any
+  body?: any,
+  headers: Record<string, string> = {}
 ): Promise<T> {
   try {
     const url = `${ML_SERVICE_URL}${endpoint}`;
@@ -25,6 +30,7 @@ async function callMLService<T>(
       method,
       headers: {
         'Content-Type': 'application/json',
+        ...headers,
       },
     };
 
@@ -62,6 +68,13 @@ export async function isMLServiceAvailable(): Promise<boolean> {
   }
 }
 
+/**
+ * Headers propagating the fraud latency budget, when one is configured
+ */
+function fraudDeadlineHeaders(): Record<string, string> {
+  return FRAUD_DEADLINE_MS ? { 'X-Deadline-Ms': FRAUD_DEADLINE_MS } : {};
+}
+
 /**
  * Fraud Detection API types
  */
@@ -70,6 +83,13 @@ export interface FraudDetectionResponse {
   fraudulent: boolean;
   riskLevel: 'low' | 'medium' | 'high';
   recommendations: string[];
+  rulesFired?: string[];
+  degraded?: boolean;
+}
+
+export interface FraudBatchDetectionResponse {
+  results: Array<FraudDetectionResponse & { transactionId?: string }>;
+  count: number;
 }
 
 export interface FraudExplainResponse {
@@ -88,6 +108,19 @@ export interface FraudAnomalyResponse {
   features?: Array<{ feature: string; value: number; contribution: number }>;
 }
 
+export interface FraudAssessResponse {
+  transactionId?: string;
+  fraud: FraudDetectionResponse;
+  anomaly: {
+    isAnomaly: boolean;
+    anomalyScore: number;
+    normalizedScore: number;
+  } | null;
+  topFeatures: Array<{ feature: string; contribution: number; description?: string; impact?: string }> | null;
+  explained: boolean;
+  degraded?: boolean;
+}
+
 /**
  * Fraud Detection API calls
  */
@@ -96,7 +129,16 @@ export const fraudAPI = {
     return callMLService<FraudDetectionResponse>('/api/fraud/detect', 'POST', {
       transaction,
       user_history: userHistory,
-    });
+    }, fraudDeadlineHeaders());
+  },
+  
+  detectBatch: async (items: Array<{ transaction: any; userHistory?: any[] }>): Promise<FraudBatchDetectionResponse | null> => {
+    return callMLService<FraudBatchDetectionResponse>('/api/fraud/detect/batch', 'POST', {
+      transactions: items.map((item) => ({
+        transaction: item.transaction,
+        user_history: item.userHistory,
+      })),
+    }, fraudDeadlineHeaders());
   },
   
   explain: async (transaction: any, userHistory?: any[]): Promise<FraudExplainResponse | null> => {
@@ -112,6 +154,14 @@ export const fraudAPI = {
       user_history: userHistory,
     });
   },
+  
+  assess: async (transaction: any, userHistory?: any[], explain?: boolean): Promise<FraudAssessResponse | null> => {
+    return callMLService<FraudAssessResponse>('/api/fraud/assess', 'POST', {
+      transaction,
+      user_history: userHistory,
+      explain,
+    }, fraudDeadlineHeaders());
+  },
 };
 
 /**
@@ -121,6 +171,8 @@ export interface ForecastGenerateResponse {
   predictions: Array<{
     date: string;
     predictedAmount: number;
+    lower?: number;
+    upper?: number;
     confidence: number;
   }>;
   accuracy: number;
@@ -138,12 +190,13 @@ export interface ForecastDefaultRiskResponse {
  * Forecast API calls
  */
 export const forecastAPI = {
-  generate: async (userId: string | undefined, period: string, months: number, historicalData?: any[]): Promise<ForecastGenerateResponse | null> => {
+  generate: async (userId: string | undefined, period: string, months: number, historicalData?: any[], target: 'spending' | 'income' = 'spending'): Promise<ForecastGenerateResponse | null> => {
     return callMLService<ForecastGenerateResponse>('/api/forecast/generate', 'POST', {
       userId,
       period,
       months,
       historical_data: historicalData,
+      target,
     });
   },
   
@@ -5,6 +5,10 @@ FastAPI service for serving ML model predictions
 
 import os
 import sys
+import gzip
+import json
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Add parent directory to path to allow imports when running from ml_service directory
@@ -12,22 +16,49 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
 
 # Import model inference modules
 from ml_service.services.fraud_service import FraudDetectionService
 from ml_service.services.forecast_service import ForecastService
+from ml_service.services.forecast_engine import PERIODS, TARGET_TYPES, batch_totals, chunk_totals, columnar_result
 from ml_service.services.kyc_service import KYCService
 from ml_service.services.simulation_service import SimulationService
 from ml_service.services.chat_service import ChatService
+from ml_service.services.micro_batcher import MicroBatcher
+from ml_service.services.metrics import registry as metrics_registry
+from ml_service.services.executors import executors
+from ml_service.services.stream_scoring import StreamScorer
+from ml_service.services.deadlines import Deadline, DeadlineGuard
+from ml_service.services.cache import ResultCache, payload_key
+from ml_service.services.precompute import PrecomputeScheduler
+from ml_service.services.velocity_index import transaction_id
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 load_dotenv()
 
-app = FastAPI(title="Quantra ML Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PRECOMPUTE:
+        precompute_scheduler.start()
+    yield
+    await precompute_scheduler.stop()
+    await fraud_batcher.close()
+    executors.shutdown()
+    fraud_service.checkpoint()
+
+
+app = FastAPI(title="Quantra ML Service", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -45,9 +76,216 @@ kyc_service = KYCService()
 simulation_service = SimulationService()
 chat_service = ChatService()
 
+# CPU-bound model work runs on per-service pools; chat is I/O-bound and stays
+# on the event loop. Fraud keeps in-memory state, so it should stay on threads.
+executors.configure("fraud", FraudDetectionService, kind="thread", workers=4)
+executors.configure("forecast", ForecastService, kind="thread", workers=2)
+executors.configure("kyc", KYCService, kind="thread", workers=2)
+executors.configure("simulation", SimulationService, kind="thread", workers=2)
+# Batch forecasts fan out across processes, one chunk of users per task
+executors.configure("forecast_batch", ForecastService, kind="process", workers=os.cpu_count() or 2)
+FORECAST_BATCH_CHUNK_USERS = int(os.getenv("FORECAST_BATCH_CHUNK_USERS", "200"))
+# Background forecast/default-risk refreshes get their own process, off the fraud threads
+executors.configure("precompute", ForecastService, kind="process", workers=1)
+fraud_service.executor = executors.thread_pool("fraud")
+
+# Concurrent /api/fraud/detect calls are coalesced into one vectorized model call
+FRAUD_MICRO_BATCHING = os.getenv("FRAUD_MICRO_BATCHING", "true").lower() == "true"
+fraud_batcher = MicroBatcher(
+    lambda items: executors.run(
+        "fraud",
+        fraud_service,
+        "score_transactions",
+        [transaction for transaction, _ in items],
+        [history for _, history in items]
+    ),
+    max_batch_size=int(os.getenv("FRAUD_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("FRAUD_BATCH_WINDOW_MS", "2")),
+    name="fraud_detect"
+)
+
+
+async def _precompute(users: List[Dict[str, Any]]):
+    """Refresh a batch of users' forecasts and default-risk scores in the forecast store"""
+    store = forecast_service.store
+    forecast_jobs = [
+        (user["userId"], target, period, months, user["history"], store.fit(user["userId"], target))
+        for user in users
+        for target, period, months in user["forecasts"]
+    ]
+    risk_jobs = [(user["userId"], *user["risk"]) for user in users if user["risk"] is not None]
+    if forecast_jobs:
+        results = await executors.run("precompute", forecast_service, "precompute_forecasts", forecast_jobs)
+        for job, (key, latest, result, fit) in zip(forecast_jobs, results):
+            store.put(key, result, job[0], job[1], fit, latest)
+    if risk_jobs:
+        results = await executors.run("precompute", forecast_service, "precompute_risk", risk_jobs)
+        for job, (key, latest, result) in zip(risk_jobs, results):
+            store.put(key, result, job[0], "default-risk", None, latest)
+
+
+# Users whose forecasts or default risk were requested are kept precomputed in
+# the background, changed users first. The interval stays below
+# FORECAST_CACHE_TTL_SECONDS so results are refreshed before they expire, and
+# the scheduler is busy at most PRECOMPUTE_CPU_SHARE of the time and waits
+# while fraud scoring has every worker busy
+PRECOMPUTE = os.getenv("PRECOMPUTE", "true").lower() == "true"
+precompute_scheduler = PrecomputeScheduler(
+    _precompute,
+    interval_seconds=float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "240")),
+    active_seconds=float(os.getenv("PRECOMPUTE_ACTIVE_SECONDS", "86400")),
+    cpu_share=float(os.getenv("PRECOMPUTE_CPU_SHARE", "0.2")),
+    batch_size=int(os.getenv("PRECOMPUTE_BATCH_SIZE", "100")),
+    max_users=int(os.getenv("PRECOMPUTE_MAX_USERS", "100000")),
+    max_recent=int(os.getenv("PRECOMPUTE_MAX_RECENT", "1000")),
+    busy=lambda: executors["fraud"].saturated(),
+    name="precompute"
+)
+if PRECOMPUTE:
+    fraud_service.on_record = precompute_scheduler.record_transactions
+
+
+# Forecast responses at least this large are brotli- (when installed) or
+# gzip-compressed for clients that accept it (0 disables compression)
+FORECAST_COMPRESS_MIN_BYTES = int(os.getenv("FORECAST_COMPRESS_MIN_BYTES", "1024"))
+FORECAST_FORMATS = ("records", "columnar")
+
+
+def _accepted_encodings(request: Request) -> set:
+    """Content codings the client accepts, ignoring any with q=0"""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        name, _, value = params.partition("=")
+        try:
+            if name.strip().lower() == "q" and float(value) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _json_response(payload: Any, request: Request) -> Response:
+    """Compact JSON, compressed when large enough and the client accepts br or gzip"""
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    # Sent whatever the size, so caches never reuse one encoding for another client
+    headers = {"Vary": "Accept-Encoding"}
+    if FORECAST_COMPRESS_MIN_BYTES > 0 and len(body) >= FORECAST_COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if BROTLI_AVAILABLE and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Results of single-transaction fraud requests, keyed by a hash of the request
+# (transaction, including its id, and history). Gateway retries within the TTL
+# get the first answer, and concurrent duplicates share one computation
+FRAUD_RESULT_CACHE_SIZE = int(os.getenv("FRAUD_RESULT_CACHE_SIZE", "10000"))
+FRAUD_RESULT_CACHE_TTL_SECONDS = float(os.getenv("FRAUD_RESULT_CACHE_TTL_SECONDS", "30"))
+fraud_result_caches = {
+    kind: ResultCache(maxsize=FRAUD_RESULT_CACHE_SIZE, ttl=FRAUD_RESULT_CACHE_TTL_SECONDS)
+    for kind in ("detect", "explain", "anomaly", "assess")
+}
+
+
+async def _cached_result(kind: str, compute, transaction: Dict[str, Any], user_history, *extra) -> Any:
+    """Result of compute() for this request, from the result cache when the request was seen.
+
+    Only transactions with an id are cached: two id-less transactions with the
+    same fields are separate purchases, and each must reach compute() to be recorded.
+    """
+    key = None
+    if transaction_id(transaction) is not None:
+        key = payload_key([transaction, user_history, *extra])
+    return await fraud_result_caches[kind].get_or_compute(key, compute)
+
+
+# Latency budget for fraud requests without an X-Deadline-Ms header (0 = none).
+# Requests that would miss their deadline get rule-table scores marked degraded
+FRAUD_DEADLINE_MS = float(os.getenv("FRAUD_DEADLINE_MS", "0"))
+FRAUD_DEADLINE_MARGIN_MS = float(os.getenv("FRAUD_DEADLINE_MARGIN_MS", "2"))
+deadline_guards = {
+    name: DeadlineGuard(f"fraud_{name}", margin_ms=FRAUD_DEADLINE_MARGIN_MS)
+    for name in ("detect", "detect_batch", "explain", "explain_batch", "assess")
+}
+
+
+async def _with_deadline(http_request: Request, name: str, work, kind: str, transactions, user_histories, explain=None):
+    """Run work under the request's deadline, falling back to degraded rule-table results.
+
+    The fallback runs on the event loop rather than the fraud pool, since a
+    backed-up pool is the usual reason for missing the deadline.
+    """
+    deadline = Deadline.from_headers(http_request.headers, FRAUD_DEADLINE_MS)
+    result, _ = await deadline_guards[name].run(
+        deadline,
+        work,
+        lambda started: fraud_service.degraded_results(
+            kind, transactions, user_histories, record=not started, explain=explain
+        )
+    )
+    return result
+
+
+async def _score_stream_batch(lines: List[Any]) -> List[Dict[str, Any]]:
+    """Parse and score one micro-batch of streamed fraud requests"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(lines)
+    valid = []
+    for i, line in enumerate(lines):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        try:
+            item = FraudAnalysisRequest.model_validate_json(line)
+            valid.append((i, _transaction_dict(item.transaction), item.user_history))
+        except ValidationError as e:
+            # The input echo can hold arbitrary client data; keep error records JSON-safe
+            results[i] = {"error": e.errors(include_url=False, include_context=False, include_input=False)}
+
+    if valid:
+        scored = await executors.run(
+            "fraud",
+            fraud_service,
+            "score_transactions",
+            [transaction for _, transaction, _ in valid],
+            [history for _, _, history in valid]
+        )
+        for (i, transaction, _), result in zip(valid, scored):
+            result["transactionId"] = transaction.get("id")
+            results[i] = result
+    return results
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator may keep reading the request body.
+
+    The stock response listens for client disconnects on `receive`, which
+    would swallow request body chunks still being streamed in. Disconnects
+    surface through request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+# Streaming fraud scoring (WebSocket and NDJSON) feeds the model in micro-batches
+fraud_stream = StreamScorer(
+    _score_stream_batch,
+    max_batch_size=int(os.getenv("FRAUD_STREAM_BATCH_SIZE", "256")),
+    max_wait_ms=float(os.getenv("FRAUD_STREAM_WINDOW_MS", "5")),
+    queue_size=int(os.getenv("FRAUD_STREAM_QUEUE_SIZE", "1024")),
+    name="fraud_stream"
+)
+
 
 # Request/Response Models
 class TransactionData(BaseModel):
+    id: Optional[str] = None
+    userId: Optional[str] = None
     amount: float
     location: Optional[str] = None
     frequency: Optional[int] = None
@@ -65,11 +303,44 @@ class FraudAnalysisRequest(BaseModel):
     user_history: Optional[List[Dict[str, Any]]] = None
 
 
+class FraudAssessRequest(FraudAnalysisRequest):
+    explain: Optional[bool] = None  # None = only when the score is high enough
+
+
+class FraudBatchRequest(BaseModel):
+    transactions: List[FraudAnalysisRequest]
+
+
+class AlertRequest(BaseModel):
+    alertId: str
+    userId: Optional[str] = None
+    transactionId: Optional[str] = None
+    fraudScore: Optional[float] = None
+    anomalyScore: Optional[float] = None
+    createdAt: Optional[str] = None
+
+
 class ForecastRequest(BaseModel):
     userId: Optional[str] = None
     period: str  # "daily" | "weekly" | "monthly"
     months: int
     historical_data: Optional[List[Dict[str, Any]]] = None
+    target: str = "spending"  # "spending" | "income"
+    format: str = "records"  # "records" | "columnar"
+
+
+class ForecastUserHistory(BaseModel):
+    userId: str
+    historical_data: Optional[List[Dict[str, Any]]] = None
+
+
+class ForecastBatchRequest(BaseModel):
+    period: str  # "daily" | "weekly" | "monthly"
+    months: int
+    target: str = "spending"  # "spending" | "income"
+    users: Optional[List[ForecastUserHistory]] = None
+    transactions: Optional[List[Dict[str, Any]]] = None  # flat rows carrying a userId
+    format: str = "records"  # "records" | "columnar"
 
 
 class KYCRequest(BaseModel):
@@ -103,23 +374,144 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Service counters and histograms"""
+    return metrics_registry.snapshot()
+
+
+def _transaction_dict(transaction: TransactionData) -> Dict[str, Any]:
+    """Convert a validated transaction into the plain dict the services expect"""
+    return transaction.model_dump(exclude_none=True)
+
+
+async def _as_list(single) -> List[Any]:
+    """Await a single-item result as a one-item list, matching the batch fallbacks"""
+    return [await single]
+
+
 # Fraud Detection Endpoints
 @app.post("/api/fraud/detect")
-async def detect_fraud(request: FraudAnalysisRequest):
+async def detect_fraud(request: FraudAnalysisRequest, http_request: Request):
     """Detect fraud in a transaction"""
     try:
-        result = await fraud_service.detect_fraud(request.transaction, request.user_history)
-        return result
+        transaction = _transaction_dict(request.transaction)
+        if FRAUD_MICRO_BATCHING:
+            compute = lambda: fraud_batcher.submit((transaction, request.user_history))
+        else:
+            compute = lambda: executors.run("fraud", fraud_service, "detect_fraud", transaction, request.user_history)
+        results = await _with_deadline(
+            http_request,
+            "detect",
+            lambda: _as_list(_cached_result("detect", compute, transaction, request.user_history)),
+            "detect",
+            [transaction],
+            [request.user_history]
+        )
+        return results[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/fraud/detect/batch")
+async def detect_fraud_batch(request: FraudBatchRequest, http_request: Request):
+    """Detect fraud in a batch of transactions with one model call"""
+    try:
+        transactions = [_transaction_dict(item.transaction) for item in request.transactions]
+        user_histories = [item.user_history for item in request.transactions]
+        results = await _with_deadline(
+            http_request,
+            "detect_batch",
+            lambda: executors.run("fraud", fraud_service, "detect_fraud_batch", transactions, user_histories),
+            "detect",
+            transactions,
+            user_histories
+        )
+        for transaction, result in zip(transactions, results):
+            result["transactionId"] = transaction.get("id")
+        return {"results": results, "count": len(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/fraud/detect/stream")
+async def detect_fraud_stream(request: Request):
+    """Score an NDJSON stream of fraud requests, one JSON result per line, in order"""
+    async def lines():
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+
+    async def body():
+        async for result in fraud_stream.score(lines()):
+            yield json.dumps(result, default=str) + "\n"
+
+    return DuplexStreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/fraud/stream")
+async def fraud_stream_websocket(websocket: WebSocket):
+    """Score fraud requests sent as WebSocket text messages; results come back in order"""
+    await websocket.accept()
+
+    async def messages():
+        while True:
+            try:
+                yield await websocket.receive_text()
+            except WebSocketDisconnect:
+                return
+
+    try:
+        async for result in fraud_stream.score(messages()):
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+
+
 @app.post("/api/fraud/explain")
-async def explain_fraud(request: FraudAnalysisRequest):
+async def explain_fraud(request: FraudAnalysisRequest, http_request: Request):
     """Explain why a transaction was flagged"""
     try:
-        result = await fraud_service.explain_fraud(request.transaction, request.user_history)
-        return result
+        transaction = _transaction_dict(request.transaction)
+        results = await _with_deadline(
+            http_request,
+            "explain",
+            lambda: _as_list(_cached_result(
+                "explain",
+                lambda: executors.run("fraud", fraud_service, "explain_fraud", transaction, request.user_history),
+                transaction,
+                request.user_history
+            )),
+            "explain",
+            [transaction],
+            [request.user_history]
+        )
+        return results[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/fraud/explain/batch")
+async def explain_fraud_batch(request: FraudBatchRequest, http_request: Request):
+    """Explain a batch of transactions with one SHAP call"""
+    try:
+        transactions = [_transaction_dict(item.transaction) for item in request.transactions]
+        user_histories = [item.user_history for item in request.transactions]
+        results = await _with_deadline(
+            http_request,
+            "explain_batch",
+            lambda: executors.run("fraud", fraud_service, "explain_fraud_batch", transactions, user_histories),
+            "explain",
+            transactions,
+            user_histories
+        )
+        return {"results": results, "count": len(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -128,26 +520,232 @@ async def explain_fraud(request: FraudAnalysisRequest):
 async def detect_anomaly(request: FraudAnalysisRequest):
     """Detect anomalies in transaction patterns"""
     try:
-        result = await fraud_service.detect_anomaly(request.transaction, request.user_history)
-        return result
+        transaction = _transaction_dict(request.transaction)
+        return await _cached_result(
+            "anomaly",
+            lambda: executors.run("fraud", fraud_service, "detect_anomaly", transaction, request.user_history),
+            transaction,
+            request.user_history
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/fraud/assess")
+async def assess_fraud(request: FraudAssessRequest, http_request: Request):
+    """Fraud score, anomaly check and explanation from one feature pass"""
+    try:
+        transaction = _transaction_dict(request.transaction)
+        results = await _with_deadline(
+            http_request,
+            "assess",
+            lambda: _as_list(_cached_result(
+                "assess",
+                lambda: fraud_service.assess(transaction, request.user_history, request.explain),
+                transaction,
+                request.user_history,
+                request.explain
+            )),
+            "assess",
+            [transaction],
+            [request.user_history],
+            request.explain
+        )
+        return results[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/fraud/cache")
+async def fraud_cache():
+    """Hit, miss and coalesced-request counters of the fraud result caches"""
+    return {
+        "results": {kind: cache.stats() for kind, cache in fraud_result_caches.items()},
+        "explanations": fraud_service.explanation_cache.stats()
+    }
+
+
+@app.get("/api/fraud/deadlines")
+async def fraud_deadlines():
+    """Per-endpoint deadline misses, degradation rates and latency estimates"""
+    return {
+        "defaultDeadlineMs": FRAUD_DEADLINE_MS,
+        "endpoints": {name: guard.stats() for name, guard in deadline_guards.items()}
+    }
+
+
+@app.get("/api/fraud/cascade")
+async def fraud_cascade():
+    """Cascade inference configuration and per-stage hit rates"""
+    return fraud_service.cascade_stats()
+
+
+@app.get("/api/fraud/velocity/{user_id}")
+async def fraud_velocity(user_id: str):
+    """Transaction counts and sums over the last 1h/24h/7d from the velocity index"""
+    stats = fraud_service.velocity_stats(user_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No recent transactions for user {user_id}")
+    return {"userId": user_id, **stats}
+
+
+@app.get("/api/fraud/activity/{dimension}/{key}")
+async def fraud_entity_activity(dimension: str, key: str):
+    """Sketched transaction and distinct-user counts for a merchant, category or country"""
+    activity = fraud_service.entity_activity(dimension, key)
+    if activity is None:
+        raise HTTPException(status_code=404, detail=f"No activity sketch for dimension {dimension}")
+    return {"dimension": dimension, "key": key, **activity}
+
+
+@app.get("/api/fraud/graph")
+async def fraud_graph(limit: int = 10):
+    """User-merchant graph size, components and the riskiest shared-merchant clusters"""
+    summary = fraud_service.graph_summary(limit)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Transaction graph is disabled")
+    return summary
+
+
+@app.get("/api/fraud/graph/users/{user_id}")
+async def fraud_graph_user(user_id: str):
+    """Propagated fraud risk, connected component and shared-merchant cluster of a user"""
+    report = fraud_service.graph_user(user_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} is not in the transaction graph")
+    return {"userId": user_id, **report}
+
+
+@app.get("/api/fraud/alerts")
+async def fraud_alerts(sort: str = "priority", offset: int = 0, limit: int = 50):
+    """Page of open alerts ranked by priority, fraudScore or anomalyScore"""
+    if offset < 0 or not 0 < limit <= 500:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+    try:
+        page = fraud_service.alert_page(sort, offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Alert queue is disabled")
+    return page
+
+
+@app.post("/api/fraud/alerts")
+async def upsert_fraud_alert(request: AlertRequest):
+    """Open an alert or update an open alert's scores"""
+    if fraud_service.alert_queue is None:
+        raise HTTPException(status_code=404, detail="Alert queue is disabled")
+    return fraud_service.alert_queue.upsert(
+        request.alertId,
+        request.userId,
+        request.transactionId,
+        fraud_score=request.fraudScore,
+        anomaly_score=request.anomalyScore,
+        created_at=request.createdAt
+    )
+
+
+@app.delete("/api/fraud/alerts/{alert_id}")
+async def close_fraud_alert(alert_id: str):
+    """Remove a resolved alert from the queue"""
+    if fraud_service.alert_queue is None or not fraud_service.alert_queue.close(alert_id):
+        raise HTTPException(status_code=404, detail=f"No open alert {alert_id}")
+    return {"alertId": alert_id, "closed": True}
+
+
 # Forecast Endpoints
 @app.post("/api/forecast/generate")
-async def generate_forecast(request: ForecastRequest):
-    """Generate spending/income forecast"""
+async def generate_forecast(request: ForecastRequest, http_request: Request):
+    """Generate spending/income forecast; format=columnar returns parallel arrays instead of one record per bucket"""
+    if request.target not in TARGET_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast target {request.target}")
+    if request.period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast period {request.period}")
+    if request.format not in FORECAST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast format {request.format}")
     try:
-        result = await forecast_service.generate_forecast(
+        result = await executors.run(
+            "forecast",
+            forecast_service,
+            "generate_forecast",
             request.userId,
             request.period,
             request.months,
-            request.historical_data
+            request.historical_data,
+            request.target
         )
-        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if PRECOMPUTE and request.userId is not None:
+        precompute_scheduler.touch_forecast(
+            request.userId, request.target, request.period, request.months, request.historical_data or []
+        )
+    if request.format == "columnar":
+        result = columnar_result(result, request.period)
+    return _json_response(result, http_request)
+
+
+@app.post("/api/forecast/batch")
+async def generate_forecast_batch(request: ForecastBatchRequest):
+    """Forecast many users at once; one NDJSON line per user, streamed as worker chunks complete"""
+    if request.target not in TARGET_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast target {request.target}")
+    if request.period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast period {request.period}")
+    if request.format not in FORECAST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast format {request.format}")
+
+    histories = [(user.userId, user.historical_data or []) for user in request.users or []]
+    totals = batch_totals(histories, request.transactions, request.target)
+    chunks = list(chunk_totals(totals, FORECAST_BATCH_CHUNK_USERS))
+    # Requested users without any matching rows still get a (no-history) result
+    with_rows = {user_id for users, _ in chunks for user_id in users}
+    requested = [user_id for user_id, _ in histories] + [row.get("userId") for row in request.transactions or []]
+    without_rows = list(dict.fromkeys(u for u in requested if u is not None and u not in with_rows))
+    if without_rows:
+        chunks.append((without_rows, totals.iloc[:0]))
+
+    async def run_chunk(users, chunk):
+        try:
+            return await executors.run(
+                "forecast_batch",
+                forecast_service,
+                "generate_batch",
+                chunk,
+                request.period,
+                request.months,
+                request.target,
+                users
+            )
+        except Exception as e:
+            return [{"userId": user_id, "error": str(e)} for user_id in users]
+
+    tasks = [asyncio.ensure_future(run_chunk(users, chunk)) for users, chunk in chunks]
+
+    async def body():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    if request.format == "columnar" and "error" not in result:
+                        result = {"userId": result["userId"], **columnar_result(result, request.period)}
+                    yield json.dumps(result, default=str) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.get("/api/forecast/cache")
+async def forecast_cache():
+    """Hit rate of the forecast result cache and incremental refresh counts"""
+    return forecast_service.store.stats()
+
+
+@app.get("/api/forecast/precompute")
+async def forecast_precompute():
+    """Background precompute scheduler state and counters"""
+    return precompute_scheduler.stats()
 
 
 @app.post("/api/forecast/default-risk")
@@ -158,14 +756,19 @@ async def calculate_default_risk(
 ):
     """Calculate default risk score"""
     try:
-        result = await forecast_service.calculate_default_risk(
+        result = await executors.run(
+            "forecast",
+            forecast_service,
+            "calculate_default_risk",
             userId,
             transactions,
             averageIncome
         )
-        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if PRECOMPUTE:
+        precompute_scheduler.touch_risk(userId, transactions, averageIncome)
+    return result
 
 
 # KYC Endpoints
@@ -173,7 +776,10 @@ async def calculate_default_risk(
 async def verify_kyc(request: KYCRequest):
     """Verify KYC documents"""
     try:
-        result = await kyc_service.verify_kyc(
+        result = await executors.run(
+            "kyc",
+            kyc_service,
+            "verify_kyc",
             request.userId,
             request.documentType,
             request.documentNumber,
@@ -189,7 +795,7 @@ async def verify_kyc(request: KYCRequest):
 async def extract_document_text(documentImage: str, documentType: str):
     """Extract text from document using OCR"""
     try:
-        result = await kyc_service.extract_text(documentImage, documentType)
+        result = await executors.run("kyc", kyc_service, "extract_text", documentImage, documentType)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -199,7 +805,7 @@ async def extract_document_text(documentImage: str, documentType: str):
 async def match_face(documentImage: str, faceImage: str):
     """Match face in document with selfie"""
     try:
-        result = await kyc_service.match_face(documentImage, faceImage)
+        result = await executors.run("kyc", kyc_service, "match_face", documentImage, faceImage)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -210,7 +816,10 @@ async def match_face(documentImage: str, faceImage: str):
 async def process_simulation(request: SimulationRequest):
     """Process AI simulation"""
     try:
-        result = await simulation_service.process_simulation(
+        result = await executors.run(
+            "simulation",
+            simulation_service,
+            "process_simulation",
             request.name,
             request.data,
             request.type,
@@ -0,0 +1,233 @@
+"""
+Alert Priority Queue
+Incrementally maintained top-K ranking of open fraud alerts for case triage
+"""
+
+import math
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+from ml_service.services.velocity_index import parse_timestamp
+
+# Orderings the queue maintains, and the alert field each one ranks by
+SORT_KEYS = ('priority', 'fraudScore', 'anomalyScore')
+
+
+class IndexedHeap:
+    """Binary heap of (key, item) with a position index.
+    
+    Keys of items already in the heap can be changed, and any item
+    removed, in O(log n). With largest=True the root is the largest key.
+    """
+    
+    def __init__(self, largest: bool = False):
+        self.largest = largest
+        self.heap: List[Tuple[float, str]] = []
+        self.position: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.heap)
+    
+    def __contains__(self, item: str) -> bool:
+        return item in self.position
+    
+    def _before(self, a: float, b: float) -> bool:
+        return a > b if self.largest else a < b
+    
+    def _swap(self, i: int, j: int):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i][1]] = i
+        self.position[heap[j][1]] = j
+    
+    def _sift_up(self, i: int):
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._before(self.heap[i][0], self.heap[parent][0]):
+                break
+            self._swap(i, parent)
+            i = parent
+    
+    def _sift_down(self, i: int):
+        n = len(self.heap)
+        while True:
+            best = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and self._before(self.heap[child][0], self.heap[best][0]):
+                    best = child
+            if best == i:
+                return
+            self._swap(i, best)
+            i = best
+    
+    def peek(self) -> Tuple[float, str]:
+        return self.heap[0]
+    
+    def push(self, key: float, item: str):
+        self.heap.append((key, item))
+        self.position[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+    
+    def pop(self) -> Tuple[float, str]:
+        root = self.heap[0]
+        self.remove(root[1])
+        return root
+    
+    def remove(self, item: str):
+        i = self.position.pop(item)
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self.position[last[1]])
+
+
+class TopK:
+    """Top-k items by key under inserts, key changes and removals.
+    
+    The top k live in a min-heap whose root is the weakest of them; the
+    rest wait in a max-heap whose root is the strongest of them. Every
+    change moves at most one item across, so it costs O(log n). The
+    sorted top k is cached and only re-sorted after it changes.
+    """
+    
+    def __init__(self, k: int):
+        self.k = k
+        self.top = IndexedHeap(largest=False)
+        self.rest = IndexedHeap(largest=True)
+        self._ranked: Optional[List[str]] = None
+    
+    def __len__(self) -> int:
+        return len(self.top) + len(self.rest)
+    
+    def update(self, item: str, key: float):
+        """Insert an item or change its key"""
+        self.remove(item)
+        if len(self.top) < self.k:
+            self.top.push(key, item)
+            self._ranked = None
+        elif key > self.top.peek()[0]:
+            self.rest.push(*self.top.pop())
+            self.top.push(key, item)
+            self._ranked = None
+        else:
+            self.rest.push(key, item)
+    
+    def remove(self, item: str):
+        if item in self.top:
+            self.top.remove(item)
+            self._ranked = None
+            if len(self.rest):
+                self.top.push(*self.rest.pop())
+        elif item in self.rest:
+            self.rest.remove(item)
+    
+    def ranked(self, stop: int) -> List[str]:
+        """Items in descending key order up to `stop`; past k this sorts the overflow"""
+        if self._ranked is None:
+            self._ranked = [item for _, item in sorted(self.top.heap, reverse=True)]
+        if stop <= len(self._ranked) or not len(self.rest):
+            return self._ranked
+        return self._ranked + [item for _, item in sorted(self.rest.heap, reverse=True)]
+
+
+class AlertQueue:
+    """Open fraud alerts ranked by priority, fraud score and anomaly score.
+    
+    An alert's priority is its weighted fraud/anomaly score halved every
+    `half_life_hours` of age. Because every alert decays at the same
+    rate, ordering by log(score) - age decay is the same at any moment,
+    so the heaps hold that time-invariant key and never need re-keying as
+    the clock moves; the decayed value is only computed for display.
+    """
+    
+    def __init__(
+        self,
+        k: int = 1000,
+        half_life_hours: float = 72.0,
+        fraud_weight: float = 0.7,
+        anomaly_weight: float = 0.3
+    ):
+        self.k = k
+        self.half_life = half_life_hours * 3600
+        self.fraud_weight = fraud_weight
+        self.anomaly_weight = anomaly_weight
+        self.alerts: Dict[str, Dict[str, Any]] = {}
+        self.rankings = {sort: TopK(k) for sort in SORT_KEYS}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.alerts)
+    
+    def _base_priority(self, alert: Dict[str, Any]) -> float:
+        return self.fraud_weight * alert['fraudScore'] + self.anomaly_weight * alert['anomalyScore']
+    
+    def _priority_key(self, alert: Dict[str, Any]) -> float:
+        return math.log(max(self._base_priority(alert), 1e-9)) + alert['createdAt'] * math.log(2) / self.half_life
+    
+    def upsert(
+        self,
+        alert_id: str,
+        user_id: Optional[str] = None,
+        transaction_id: Optional[str] = None,
+        fraud_score: Optional[float] = None,
+        anomaly_score: Optional[float] = None,
+        created_at: Any = None
+    ) -> Dict[str, Any]:
+        """Open an alert or update the scores of an open one; omitted fields keep their values.
+        
+        Both scores are on 0-100 where higher is worse: fraud_score is the
+        fraud probability and anomaly_score the anomaly severity (the
+        normalizedScore of an anomaly result), so they weigh the same way.
+        """
+        with self._lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None:
+                alert = self.alerts[alert_id] = {
+                    'alertId': alert_id,
+                    'userId': user_id,
+                    'transactionId': transaction_id,
+                    'fraudScore': 0.0,
+                    'anomalyScore': 0.0,
+                    'createdAt': parse_timestamp(created_at, time.time())
+                }
+            if fraud_score is not None:
+                alert['fraudScore'] = float(fraud_score)
+            if anomaly_score is not None:
+                alert['anomalyScore'] = float(anomaly_score)
+            
+            self.rankings['priority'].update(alert_id, self._priority_key(alert))
+            self.rankings['fraudScore'].update(alert_id, alert['fraudScore'])
+            self.rankings['anomalyScore'].update(alert_id, alert['anomalyScore'])
+            return self._view(alert, time.time())
+    
+    def close(self, alert_id: str) -> bool:
+        """Remove an alert from the queue; False if it was not open"""
+        with self._lock:
+            if self.alerts.pop(alert_id, None) is None:
+                return False
+            for ranking in self.rankings.values():
+                ranking.remove(alert_id)
+            return True
+    
+    def page(self, sort: str = 'priority', offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """One page of open alerts, highest first"""
+        if sort not in self.rankings:
+            raise ValueError(f"Unknown sort key {sort}, expected one of {', '.join(SORT_KEYS)}")
+        now = time.time()
+        with self._lock:
+            ranked = self.rankings[sort].ranked(offset + limit)
+            items = [self._view(self.alerts[alert_id], now) for alert_id in ranked[offset:offset + limit]]
+            total = len(self.alerts)
+        return {'sort': sort, 'offset': offset, 'limit': limit, 'total': total, 'alerts': items}
+    
+    def _view(self, alert: Dict[str, Any], now: float) -> Dict[str, Any]:
+        age = max(now - alert['createdAt'], 0.0)
+        return {
+            **alert,
+            'createdAt': datetime.fromtimestamp(alert['createdAt'], timezone.utc).isoformat(),
+            'priority': self._base_priority(alert) * 0.5 ** (age / self.half_life)
+        }
@@ -0,0 +1,182 @@
+"""
+Cache Utilities
+Small thread-safe in-process caches shared by the ML services
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters"""
+    
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it recently used"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+    
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit-rate counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose entries also expire `ttl` seconds after they are stored"""
+    
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expired = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expired += 1
+            self.misses += 1
+            return default
+    
+    def put(self, key: Hashable, value: Any):
+        super().put(key, (time.monotonic() + self.ttl, value))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), 'ttl': self.ttl, 'expired': self.expired}
+
+
+class SingleFlight:
+    """Coalesce concurrent async calls with the same key into one in-flight call.
+    
+    The call runs as its own task, so whichever caller started it can be
+    cancelled (client disconnect, deadline) without cancelling it for the
+    others; callers only see the call's own result or exception.
+    """
+    
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the call already running under `key`"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A caller giving up must not cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved in case every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+
+_MISSING = object()
+
+
+class ResultCache:
+    """TTL/LRU cache of async results with single-flight filling.
+    
+    A hit returns the stored result; a miss joins the computation already
+    in flight for the key, or starts it. Results are shared between
+    callers, so they must not be mutated.
+    """
+    
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.cache = TTLCache(maxsize, ttl)
+        self.flight = SingleFlight()
+    
+    async def get_or_compute(self, key: Optional[Hashable], compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached result for key, computing it once on a miss; key None bypasses the cache"""
+        if key is None or self.cache.maxsize <= 0:
+            return await compute()
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        async def fill():
+            result = await compute()
+            self.cache.put(key, result)
+            return result
+        return await self.flight.do(key, fill)
+    
+    def clear(self):
+        self.cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters plus calls coalesced onto an in-flight computation (also counted as misses)"""
+        return {**self.cache.stats(), 'coalesced': self.flight.coalesced, 'inFlight': len(self.flight)}
+
+
+def payload_key(value: Any) -> bytes:
+    """Stable hash of a JSON-serializable request payload, used as a cache key"""
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def row_key(row: np.ndarray) -> bytes:
+    """Stable hash of a feature vector, used as a cache key"""
+    return hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=16).digest()
+
+
+@lru_cache(maxsize=65536)
+def key_hash(value: str) -> int:
+    """Stable 64-bit hash of a string key (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
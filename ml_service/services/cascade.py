@@ -0,0 +1,110 @@
+"""
+Cascade Inference
+Routes only uncertain transactions from a cheap pre-screen to the full models
+"""
+
+import time
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ml_service.services.metrics import registry
+
+# Stage codes returned per row by Cascade.score()
+STAGE_PRESCREEN_LOW = 0
+STAGE_MODEL = 1
+STAGE_PRESCREEN_HIGH = 2
+# Uncertain rows left with their pre-screen score because the model failed
+STAGE_PRESCREEN_FALLBACK = 3
+STAGE_NAMES = {
+    STAGE_PRESCREEN_LOW: 'prescreen_low',
+    STAGE_MODEL: 'model',
+    STAGE_PRESCREEN_HIGH: 'prescreen_high',
+    STAGE_PRESCREEN_FALLBACK: 'prescreen_fallback'
+}
+
+
+class Cascade:
+    """Pre-screen everything, then run the model only inside [low, high).
+    
+    Rows the pre-screen scores below `low` are settled as benign and rows
+    at or above `high` as fraud, both with the pre-screen score. Explanation
+    is only worth computing for scores at or above explain_min_score.
+    Per-stage row counts and latencies go to the metrics registry.
+    """
+    
+    def __init__(self, low: float, high: float, explain_min_score: float, name: str = 'fraud_cascade'):
+        self.low = low
+        self.high = high
+        self.explain_min_score = explain_min_score
+        self.name = name
+        
+        self.rows = {stage: registry.counter(f'{name}_{label}_rows') for stage, label in STAGE_NAMES.items()}
+        self.explained = registry.counter(f'{name}_explain_rows')
+        self.explain_skipped = registry.counter(f'{name}_explain_skipped_rows')
+        self.prescreen_ms = registry.histogram(f'{name}_prescreen_ms')
+        self.model_ms = registry.histogram(f'{name}_model_ms')
+    
+    def score(
+        self,
+        raw: np.ndarray,
+        scaled: np.ndarray,
+        prescreen: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+        model: Callable[[np.ndarray, np.ndarray], Optional[np.ndarray]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (scores, pre-screen fired mask, stage per row).
+        
+        `prescreen(raw)` returns (scores, fired) for every row; `model(raw,
+        scaled)` scores the uncertain subset or returns None when it fails,
+        in which case those rows keep their pre-screen score and are marked
+        STAGE_PRESCREEN_FALLBACK.
+        """
+        start = time.perf_counter()
+        prescreen_scores, fired = prescreen(raw)
+        self.prescreen_ms.observe((time.perf_counter() - start) * 1000)
+        
+        stages = np.full(len(raw), STAGE_MODEL, dtype=np.int8)
+        stages[prescreen_scores < self.low] = STAGE_PRESCREEN_LOW
+        stages[prescreen_scores >= self.high] = STAGE_PRESCREEN_HIGH
+        scores = np.asarray(prescreen_scores, dtype=np.float64).copy()
+        
+        uncertain = np.flatnonzero(stages == STAGE_MODEL)
+        if len(uncertain):
+            start = time.perf_counter()
+            model_scores = model(raw[uncertain], scaled[uncertain])
+            self.model_ms.observe((time.perf_counter() - start) * 1000)
+            if model_scores is not None:
+                scores[uncertain] = model_scores
+            else:
+                # Model unavailable: the pre-screen score stands, but the row was never settled
+                stages[uncertain] = STAGE_PRESCREEN_FALLBACK
+        
+        counts = np.bincount(stages, minlength=len(STAGE_NAMES))
+        for stage, counter in self.rows.items():
+            if counts[stage]:
+                counter.inc(int(counts[stage]))
+        return scores, fired, stages
+    
+    def explain_mask(self, scores: np.ndarray) -> np.ndarray:
+        """Rows whose score is high enough to be worth a model explanation"""
+        mask = np.asarray(scores) >= self.explain_min_score
+        explained = int(mask.sum())
+        self.explained.inc(explained)
+        self.explain_skipped.inc(len(mask) - explained)
+        return mask
+    
+    def stats(self) -> Dict[str, Any]:
+        """Band configuration and the share of rows settled at each stage"""
+        counts = {label: self.rows[stage].snapshot() for stage, label in STAGE_NAMES.items()}
+        total = sum(counts.values())
+        explained = self.explained.snapshot()
+        explain_total = explained + self.explain_skipped.snapshot()
+        return {
+            'low': self.low,
+            'high': self.high,
+            'explainMinScore': self.explain_min_score,
+            'rows': counts,
+            'hitRates': {label: count / total if total else 0.0 for label, count in counts.items()},
+            'explainRate': explained / explain_total if explain_total else 0.0,
+            'prescreenMs': self.prescreen_ms.snapshot(),
+            'modelMs': self.model_ms.snapshot()
+        }
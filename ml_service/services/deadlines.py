@@ -0,0 +1,125 @@
+"""
+Request Deadlines
+Latency budgets propagated from callers, with a cheap fallback when the
+full computation cannot finish in time
+"""
+
+import time
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from ml_service.services.metrics import registry
+
+# Remaining latency budget in milliseconds, sent by the caller
+DEADLINE_HEADER = 'X-Deadline-Ms'
+
+
+class Deadline:
+    """A point on the monotonic clock by which a response is due"""
+    
+    def __init__(self, budget_ms: float):
+        self.expires_at = time.monotonic() + budget_ms / 1000
+    
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str], default_ms: float = 0) -> Optional['Deadline']:
+        """Deadline from the X-Deadline-Ms header, else default_ms; None when neither is set"""
+        value = headers.get(DEADLINE_HEADER)
+        try:
+            budget_ms = float(value) if value is not None else default_ms
+        except ValueError:
+            budget_ms = default_ms
+        return cls(budget_ms) if budget_ms > 0 else None
+    
+    def remaining(self) -> float:
+        """Seconds left, negative once expired"""
+        return self.expires_at - time.monotonic()
+
+
+class DeadlineGuard:
+    """Run work within a deadline, answering from a fallback when it cannot make it.
+    
+    A running estimate of the work's latency lets requests whose budget is
+    already too small go straight to the fallback; otherwise the work runs
+    and is abandoned (not cancelled, it still completes in its worker) once
+    the budget runs out. The estimate drifts down while work is skipped, so
+    the work is retried after a slow spell.
+    
+    The fallback is called with started=True when the abandoned work is
+    still running and will apply its side effects itself.
+    """
+    
+    def __init__(self, name: str, margin_ms: float = 2.0, smoothing: float = 0.2):
+        self.name = name
+        self.margin = margin_ms / 1000
+        self.smoothing = smoothing
+        self.estimate = 0.0
+        self.requests = registry.counter(f'{name}_requests')
+        self.degraded = registry.counter(f'{name}_degraded')
+        self.skipped = registry.counter(f'{name}_degraded_skipped')
+        self.timed_out = registry.counter(f'{name}_degraded_timeout')
+        self.degradation_rate = registry.gauge(f'{name}_degradation_rate')
+    
+    def _observe(self, seconds: float):
+        self.estimate += self.smoothing * (seconds - self.estimate)
+    
+    def _count(self, degraded: bool):
+        self.requests.inc()
+        if degraded:
+            self.degraded.inc()
+        self.degradation_rate.set(self.degraded.value / self.requests.value)
+    
+    async def run(
+        self,
+        deadline: Optional[Deadline],
+        work: Callable[[], Awaitable[Any]],
+        fallback: Callable[[bool], Any]
+    ) -> Tuple[Any, bool]:
+        """Return (result, degraded)"""
+        if deadline is None:
+            result = await work()
+            self._count(False)
+            return result, False
+        
+        budget = deadline.remaining() - self.margin
+        if budget <= self.estimate:
+            self.estimate *= 1 - self.smoothing
+            self.skipped.inc()
+            self._count(True)
+            return await _resolve(fallback(False)), True
+        
+        start = time.monotonic()
+        task = asyncio.ensure_future(work())
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            # The elapsed time is only a lower bound on the work's latency
+            self._observe(time.monotonic() - start)
+            task.add_done_callback(_discard)
+            self.timed_out.inc()
+            self._count(True)
+            return await _resolve(fallback(True)), True
+        self._observe(time.monotonic() - start)
+        self._count(False)
+        return result, False
+    
+    def stats(self) -> Dict[str, Any]:
+        requests = self.requests.value
+        return {
+            'requests': requests,
+            'degraded': self.degraded.value,
+            'skipped': self.skipped.value,
+            'timedOut': self.timed_out.value,
+            'degradationRate': self.degraded.value / requests if requests else 0.0,
+            'latencyEstimateMs': self.estimate * 1000
+        }
+
+
+async def _resolve(value: Any) -> Any:
+    return await value if inspect.isawaitable(value) else value
+
+
+def _discard(task: asyncio.Future):
+    """Retrieve an abandoned task's exception so it is not reported as unhandled"""
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,282 @@
+"""
+Entity Sketches
+Fixed-memory sliding-window transaction counts and distinct-account counts
+per merchant, category and country
+"""
+
+import math
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, Optional, List, Iterable, Sequence, Tuple
+
+from ml_service.services.cache import key_hash
+
+# Entities tracked, and the transaction fields each one is keyed by (first present wins)
+SKETCH_DIMENSIONS = {
+    'merchant': ('merchant', 'merchantName'),
+    'category': ('category',),
+    'country': ('location', 'country')
+}
+
+# Raw feature columns produced per dimension: transactions and distinct users in the window
+SKETCH_FEATURE_NAMES = [
+    f'{dimension}_{measure}' for dimension in SKETCH_DIMENSIONS for measure in ('tx', 'users')
+]
+
+
+def hll_estimate(registers: np.ndarray) -> np.ndarray:
+    """HyperLogLog cardinality estimate over the last axis of a register array"""
+    m = registers.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimate = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=-1)
+    zeros = (registers == 0).sum(axis=-1)
+    # Small-range correction: linear counting while registers are still empty
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, estimate)
+
+
+class WindowedSketch:
+    """Count-min sketches of HyperLogLogs over a ring of time buckets.
+    
+    Every cell of a depth x width count-min grid holds a transaction count
+    and a small HyperLogLog of the users seen in it. One grid is kept per
+    dimension (entity type) and time bucket. A key's window estimate sums
+    its cells' counts (and merges their registers) over the buckets in the
+    window, then takes the minimum over rows. Memory is fixed by buckets,
+    dimensions, depth, width and registers, whatever the number of keys.
+    
+    The window ending at the newest bucket is also kept pre-merged and
+    updated on every insert, so live queries read depth cells and never
+    loop over buckets; it is rebuilt when the ring advances.
+    """
+    
+    def __init__(
+        self,
+        n_dimensions: int = 1,
+        window_seconds: float = 600,
+        bucket_seconds: float = 60,
+        width: int = 2048,
+        depth: int = 3,
+        registers: int = 32
+    ):
+        if registers & (registers - 1):
+            raise ValueError("registers must be a power of two")
+        self.n_dimensions = n_dimensions
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.width = width
+        self.depth = depth
+        self.registers = registers
+        self.n_buckets = max(1, math.ceil(window_seconds / bucket_seconds))
+        self._register_bits = registers.bit_length() - 1
+        
+        shape = (n_dimensions, depth, width)
+        self.counts = np.zeros((self.n_buckets, *shape), dtype=np.uint32)
+        self.hll = np.zeros((self.n_buckets, *shape, registers), dtype=np.uint8)
+        self.bucket_ids = np.full(self.n_buckets, -1, dtype=np.int64)
+        self.newest = -1
+        self.window_counts = np.zeros(shape, dtype=np.uint32)
+        self.window_hll = np.zeros((*shape, registers), dtype=np.uint8)
+        self._rows = np.arange(depth)
+    
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.counts, self.hll, self.bucket_ids, self.window_counts, self.window_hll)
+        return sum(a.nbytes for a in arrays)
+    
+    def _columns(self, key_hashes: Sequence[int]) -> np.ndarray:
+        """Column per row for each key, shape (keys, depth), by double hashing"""
+        hashes = np.array(key_hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = self._rows.astype(np.uint64)
+        return ((h1[:, None] + rows * h2[:, None]) % np.uint64(self.width)).astype(np.int64)
+    
+    def _register(self, user_hash: int) -> Tuple[int, int]:
+        """(register index, rank) of a user hash"""
+        rest = user_hash >> self._register_bits
+        rank = 64 - self._register_bits - rest.bit_length() + 1
+        return user_hash & (self.registers - 1), rank
+    
+    def _buckets(self, timestamps: Sequence[float]) -> np.ndarray:
+        return np.floor(np.asarray(timestamps, dtype=np.float64) / self.bucket_seconds).astype(np.int64)
+    
+    def _live_slots(self, bucket: int) -> np.ndarray:
+        """Slots holding buckets inside the window that ends at `bucket`"""
+        ids = self.bucket_ids
+        return np.flatnonzero((ids > bucket - self.n_buckets) & (ids <= bucket))
+    
+    def _advance(self, buckets: Iterable[int]):
+        """Claim slots for buckets newer than what they hold and re-merge the live window"""
+        advanced = False
+        for bucket in buckets:
+            slot = bucket % self.n_buckets
+            if bucket > self.bucket_ids[slot]:
+                self.bucket_ids[slot] = bucket
+                self.counts[slot] = 0
+                self.hll[slot] = 0
+            if bucket > self.newest:
+                self.newest = bucket
+                advanced = True
+        if advanced:
+            live = self._live_slots(self.newest)
+            self.counts[live].sum(axis=0, out=self.window_counts)
+            self.hll[live].max(axis=0, out=self.window_hll)
+    
+    def add(
+        self,
+        dimensions: Sequence[int],
+        key_hashes: Sequence[int],
+        user_hashes: Sequence[Optional[int]],
+        timestamps: Sequence[float]
+    ):
+        """Record events; events older than the window behind the newest bucket are dropped"""
+        if not len(key_hashes):
+            return
+        buckets = self._buckets(timestamps)
+        self._advance(set(buckets.tolist()))
+        slots = buckets % self.n_buckets
+        keep = self.bucket_ids[slots] == buckets
+        if not keep.any():
+            return
+        
+        dims = np.asarray(dimensions)[keep, None]
+        columns = self._columns(key_hashes)[keep]
+        slots = slots[keep, None]
+        in_window = (buckets[keep] > self.newest - self.n_buckets).astype(np.uint8)[:, None]
+        np.add.at(self.counts, (slots, dims, self._rows, columns), 1)
+        np.add.at(self.window_counts, (dims, self._rows, columns), in_window)
+        
+        users = [(i, h) for i, h in enumerate(np.asarray(user_hashes, dtype=object)[keep]) if h is not None]
+        if users:
+            index = np.array([i for i, _ in users])
+            registers, ranks = zip(*(self._register(h) for _, h in users))
+            registers = np.array(registers)[:, None]
+            ranks = np.array(ranks, dtype=np.uint8)[:, None]
+            cells = (dims[index], self._rows, columns[index], registers)
+            np.maximum.at(self.hll, (slots[index], *cells), ranks)
+            np.maximum.at(self.window_hll, cells, ranks * in_window[index])
+    
+    def query(
+        self,
+        dimensions: Sequence[int],
+        key_hashes: Sequence[int],
+        timestamps: Sequence[float]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (transaction counts, distinct user estimates) in the window ending at each timestamp"""
+        n = len(key_hashes)
+        counts = np.zeros(n, dtype=np.float64)
+        users = np.zeros(n, dtype=np.float64)
+        if not n:
+            return counts, users
+        
+        dims = np.asarray(dimensions)[:, None]
+        columns = self._columns(key_hashes)
+        buckets = self._buckets(timestamps)
+        current = buckets == self.newest
+        if current.all():
+            # Live traffic: read the pre-merged window
+            cells = (dims, self._rows, columns)
+            counts = self.window_counts[cells].min(axis=1).astype(np.float64)
+            users = hll_estimate(self.window_hll[cells]).min(axis=1)
+        else:
+            for bucket in set(buckets.tolist()):
+                live = self._live_slots(bucket)
+                if not len(live):
+                    continue
+                rows = np.flatnonzero(buckets == bucket)
+                cells = (live[:, None, None], dims[rows][None], self._rows, columns[rows][None])
+                counts[rows] = self.counts[cells].sum(axis=0).min(axis=1)
+                users[rows] = hll_estimate(self.hll[cells].max(axis=0)).min(axis=1)
+        # A key's users can never outnumber its transactions
+        return counts, np.minimum(np.round(users), counts)
+    
+    def clear(self):
+        self.counts[:] = 0
+        self.hll[:] = 0
+        self.bucket_ids[:] = -1
+        self.newest = -1
+        self.window_counts[:] = 0
+        self.window_hll[:] = 0
+
+
+class EntitySketches:
+    """A WindowedSketch over every entity type in SKETCH_DIMENSIONS, behind one lock"""
+    
+    def __init__(self, **sketch_params):
+        self.sketch = WindowedSketch(n_dimensions=len(SKETCH_DIMENSIONS), **sketch_params)
+        self.dimensions = list(SKETCH_DIMENSIONS)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def entity_key(transaction: Dict[str, Any], dimension: str) -> Optional[str]:
+        for field in SKETCH_DIMENSIONS[dimension]:
+            value = transaction.get(field)
+            if value is not None and value != '':
+                return str(value)
+        return None
+    
+    def _keyed(self, transactions: List[Dict[str, Any]]) -> List[Tuple[int, int, int]]:
+        """(row index, dimension index, key hash) for every entity the rows carry"""
+        keyed = []
+        for i, t in enumerate(transactions):
+            for d, dimension in enumerate(self.dimensions):
+                key = self.entity_key(t, dimension)
+                if key is not None:
+                    keyed.append((i, d, key_hash(key)))
+        return keyed
+    
+    def record(self, transactions: List[Dict[str, Any]], timestamps: Sequence[float]):
+        """Add scored transactions to the sketches"""
+        keyed = self._keyed(transactions)
+        if not keyed:
+            return
+        # A client clock running ahead must not claim buckets real time has not reached
+        now = time.time()
+        user_hashes = [
+            key_hash(str(t['userId'])) if t.get('userId') is not None else None
+            for t in transactions
+        ]
+        rows, dims, hashes = zip(*keyed)
+        with self._lock:
+            self.sketch.add(dims, hashes, [user_hashes[i] for i in rows], [min(timestamps[i], now) for i in rows])
+    
+    def fill_features(self, out: np.ndarray, transactions: List[Dict[str, Any]], timestamps: Sequence[float]):
+        """Write the SKETCH_FEATURE_NAMES columns for a batch into `out` (rows x 2 * dimensions)"""
+        out[:] = 0
+        keyed = self._keyed(transactions)
+        if not keyed:
+            return
+        rows, dims, hashes = zip(*keyed)
+        with self._lock:
+            counts, users = self.sketch.query(dims, hashes, [timestamps[i] for i in rows])
+        columns = 2 * np.array(dims)
+        out[rows, columns] = counts
+        out[rows, columns + 1] = users
+    
+    def estimate(self, dimension: str, key: str, until: Optional[float] = None) -> Dict[str, float]:
+        """Window transaction count and distinct users for one entity"""
+        if until is None:
+            until = time.time()
+        with self._lock:
+            counts, users = self.sketch.query([self.dimensions.index(dimension)], [key_hash(key)], [until])
+        return {'transactions': float(counts[0]), 'users': float(users[0])}
+    
+    def stats(self) -> Dict[str, Any]:
+        """Sketch geometry and fixed memory footprint"""
+        sketch = self.sketch
+        return {
+            'dimensions': self.dimensions,
+            'windowSeconds': sketch.window_seconds,
+            'bucketSeconds': sketch.bucket_seconds,
+            'width': sketch.width,
+            'depth': sketch.depth,
+            'registers': sketch.registers,
+            'memoryBytes': sketch.nbytes
+        }
+    
+    def clear(self):
+        with self._lock:
+            self.sketch.clear()
@@ -0,0 +1,139 @@
+"""
+Service Executors
+Runs CPU-bound service work on per-service thread or process pools so the
+event loop only handles I/O
+"""
+
+import os
+import asyncio
+import inspect
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+EXECUTOR_KINDS = ('thread', 'process', 'inline')
+
+# Per-thread event loop used to drive `async def` service methods whose
+# bodies are synchronous
+_local = threading.local()
+
+# Service instances created inside process-pool workers, keyed by name
+_worker_services: Dict[str, Any] = {}
+
+
+class ServiceExecutor:
+    """Executor for one service.
+    
+    thread:  shares the service instance; use for native code that
+             releases the GIL (XGBoost, NumPy, OpenCV, tesseract, dlib)
+    process: each worker builds its own instance with `factory`; use for
+             Python-heavy work. In-memory state is per worker process.
+    inline:  run on the event loop (I/O-bound services)
+    """
+    
+    def __init__(self, name: str, factory: Callable[[], Any], kind: str = 'thread', workers: int = 2):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind for {name}: {kind}")
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        # Calls submitted and not yet finished (updated on the event loop)
+        self.in_flight = 0
+        self.pool: Optional[Executor] = None
+        if kind == 'thread':
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        elif kind == 'process':
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(name, factory)
+            )
+    
+    async def run(self, instance: Any, method: str, *args, **kwargs) -> Any:
+        """Call instance.method(*args, **kwargs) on this service's executor"""
+        if self.kind == 'inline':
+            return await _maybe_await(getattr(instance, method)(*args, **kwargs))
+        
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            if self.kind == 'thread':
+                return await loop.run_in_executor(self.pool, _call, getattr(instance, method), args, kwargs)
+            return await loop.run_in_executor(self.pool, _call_in_worker, self.name, method, args, kwargs)
+        finally:
+            self.in_flight -= 1
+    
+    def saturated(self) -> bool:
+        """True while every worker has a call to run"""
+        return self.kind != 'inline' and self.in_flight >= self.workers
+    
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ServiceExecutors:
+    """Registry of per-service executors configured from the environment.
+    
+    ML_EXECUTOR_<NAME>=thread|process|inline and ML_EXECUTOR_<NAME>_WORKERS=N
+    override the defaults passed to configure().
+    """
+    
+    def __init__(self):
+        self._executors: Dict[str, ServiceExecutor] = {}
+    
+    def configure(self, name: str, factory: Callable[[], Any], kind: str = 'thread', workers: int = 2) -> ServiceExecutor:
+        env_name = f"ML_EXECUTOR_{name.upper()}"
+        kind = os.getenv(env_name, kind).lower()
+        workers = int(os.getenv(f"{env_name}_WORKERS", str(workers)))
+        self._executors[name] = ServiceExecutor(name, factory, kind, workers)
+        return self._executors[name]
+    
+    def __getitem__(self, name: str) -> ServiceExecutor:
+        return self._executors[name]
+    
+    def thread_pool(self, name: str) -> Optional[Executor]:
+        """Return the service's pool if it can run bound methods of the shared instance"""
+        executor = self._executors.get(name)
+        return executor.pool if executor is not None and executor.kind == 'thread' else None
+    
+    async def run(self, name: str, instance: Any, method: str, *args, **kwargs) -> Any:
+        return await self._executors[name].run(instance, method, *args, **kwargs)
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            name: {'kind': executor.kind, 'workers': executor.workers, 'inFlight': executor.in_flight}
+            for name, executor in self._executors.items()
+        }
+    
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown()
+
+
+def _call(fn: Callable, args: tuple, kwargs: dict) -> Any:
+    """Call fn in a worker, driving it to completion if it is a coroutine function"""
+    result = fn(*args, **kwargs)
+    if inspect.iscoroutine(result):
+        loop = getattr(_local, 'loop', None)
+        if loop is None:
+            loop = _local.loop = asyncio.new_event_loop()
+        result = loop.run_until_complete(result)
+    return result
+
+
+def _init_worker(name: str, factory: Callable[[], Any]):
+    _worker_services[name] = factory()
+
+
+def _call_in_worker(name: str, method: str, args: tuple, kwargs: dict) -> Any:
+    return _call(getattr(_worker_services[name], method), args, kwargs)
+
+
+async def _maybe_await(result: Any) -> Any:
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+executors = ServiceExecutors()
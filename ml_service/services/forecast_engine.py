@@ -0,0 +1,588 @@
+"""
+Forecast Engine
+Vectorized history resampling and recursive multi-step forecasting with the
+trained spending/income models
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+
+from ml_service.services.cache import payload_key
+from ml_service.services.tree_inference import compile_forecast_model
+from ml_service.services.velocity_index import parse_timestamp
+
+# Lag and calendar features of the XGBoost models, in training column order
+# (scripts/train_forecast_model.py)
+LAGS = (1, 7, 30)
+MAX_LAG = max(LAGS)
+N_CALENDAR = 4
+
+# Days of history the weekday-mean baseline averages over, and the window
+# its in-sample accuracy is compared with the lag model's on
+BASELINE_DAYS = 56
+
+# Output buckets of the requested period; weeks start on Monday
+PERIODS = ('daily', 'weekly', 'monthly')
+
+# ISO 8601 duration between consecutive buckets, for columnar responses
+PERIOD_STEPS = {'daily': 'P1D', 'weekly': 'P1W', 'monthly': 'P1M'}
+
+# Transaction types counted towards each forecast target
+TARGET_TYPES = {
+    'spending': ('debit', 'withdrawal', 'payment', 'purchase', 'transfer'),
+    'income': ('credit', 'deposit', 'salary', 'income', 'refund')
+}
+
+# z-score of the reported interval bounds (95%)
+INTERVAL_Z = 1.96
+
+_DATE_FIELDS = ('date', 'timestamp', 'createdAt', 'ds')
+_AMOUNT_FIELDS = ('amount', 'y', 'value')
+
+
+def _target_amounts(frame: pd.DataFrame, target: str) -> Tuple[pd.Series, pd.Series]:
+    """(day, absolute amount) of the rows counting towards the target.
+    
+    Rows are transactions or already-aggregated points. Rows with a type
+    count when it is one of the target's types; for the others the sign
+    decides (negative amounts are spending) unless none is negative.
+    """
+    date_field = next((f for f in _DATE_FIELDS if f in frame), None)
+    amount_field = next((f for f in _AMOUNT_FIELDS if f in frame), None)
+    if date_field is None or amount_field is None:
+        empty = frame.iloc[:0]
+        return pd.Series(index=empty.index, dtype='datetime64[ns]'), pd.Series(index=empty.index, dtype=np.float64)
+    
+    dates = pd.to_datetime(frame[date_field], errors='coerce', utc=True).dt.tz_localize(None).dt.floor('D')
+    amounts = pd.to_numeric(frame[amount_field], errors='coerce')
+    typed = frame['type'].notna() if 'type' in frame else pd.Series(False, index=frame.index)
+    if (amounts[~typed] < 0).any():
+        keep = amounts < 0 if target == 'spending' else amounts > 0
+    else:
+        keep = pd.Series(True, index=frame.index)
+    if typed.any():
+        keep = keep.where(~typed, frame['type'].astype(str).str.lower().isin(TARGET_TYPES[target]))
+    keep &= dates.notna() & amounts.notna()
+    return dates[keep], amounts[keep].abs()
+
+
+def row_time(row: Dict[str, Any]) -> Optional[float]:
+    """Epoch seconds of a history row's first date field, None if it has none that parses"""
+    for field in _DATE_FIELDS:
+        value = row.get(field)
+        if value is not None and value != '':
+            seconds = parse_timestamp(value, np.nan)
+            return None if np.isnan(seconds) else seconds
+    return None
+
+
+def latest_marker(rows: List[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """(time, absolute amount) of the newest row, which identifies how far a history reaches"""
+    newest = None
+    for row in rows:
+        seconds = row_time(row)
+        if seconds is not None and (newest is None or seconds >= newest[0]):
+            amount = next((row[f] for f in _AMOUNT_FIELDS if row.get(f) is not None), 0)
+            try:
+                newest = (seconds, round(abs(float(amount)), 2))
+            except (TypeError, ValueError):
+                newest = (seconds, 0.0)
+    return newest
+
+
+def history_fingerprint(rows: List[Dict[str, Any]]) -> Optional[Tuple[int, float, bytes]]:
+    """(row count, newest time, hash) of a history's dated rows, independent of row order and other fields.
+    
+    Each row contributes its id, time and absolute amount, so the same
+    transactions assembled differently (the precompute scheduler's history
+    against a client's) match, while a longer or shorter history does not.
+    """
+    entries = []
+    for row in rows:
+        seconds = row_time(row)
+        if seconds is None:
+            continue
+        amount = next((row[f] for f in _AMOUNT_FIELDS if row.get(f) is not None), 0)
+        try:
+            amount = round(abs(float(amount)), 2)
+        except (TypeError, ValueError):
+            amount = 0.0
+        value = row.get('id')
+        entries.append(('' if value is None else str(value), seconds, amount))
+    if not entries:
+        return None
+    entries.sort()
+    return len(entries), max(entry[1] for entry in entries), payload_key(entries)
+
+
+def daily_series(historical_data: List[Dict[str, Any]], target: str = 'spending') -> pd.Series:
+    """Daily totals of the target's transactions, with days without any filled with 0"""
+    if not historical_data:
+        return pd.Series(dtype=np.float64)
+    dates, amounts = _target_amounts(pd.DataFrame(historical_data), target)
+    if not len(amounts):
+        return pd.Series(dtype=np.float64)
+    return amounts.groupby(dates).sum().sort_index().asfreq('D', fill_value=0.0)
+
+
+def daily_totals(frame: pd.DataFrame, target: str = 'spending', user_field: str = 'userId') -> pd.Series:
+    """Daily totals of the target for every user in one groupby, indexed by (user, day) in sorted order.
+    
+    Days without transactions are absent; user_series() fills them in.
+    """
+    dates, amounts = _target_amounts(frame, target)
+    users = frame.loc[amounts.index, user_field] if user_field in frame else amounts.iloc[:0]
+    keep = users.reindex(amounts.index).notna()
+    if not keep.any():
+        index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=[user_field, None])
+        return pd.Series(index=index, dtype=np.float64)
+    return amounts[keep].groupby([users[keep], dates[keep]]).sum().sort_index()
+
+
+def batch_totals(
+    histories: Sequence[Tuple[Any, List[Dict[str, Any]]]],
+    rows: Optional[List[Dict[str, Any]]] = None,
+    target: str = 'spending',
+    user_field: str = 'userId'
+) -> pd.Series:
+    """daily_totals() of (user, history) pairs plus flat rows that carry their user"""
+    frame = pd.DataFrame([record for _, history in histories for record in history])
+    frame[user_field] = np.repeat([user_id for user_id, _ in histories], [len(history) for _, history in histories])
+    if rows:
+        frame = pd.concat([frame, pd.DataFrame(rows)], ignore_index=True)
+    return daily_totals(frame, target, user_field)
+
+
+def _user_bounds(totals: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Unique users of sorted (user, day) totals and the start row of each, plus the end"""
+    users = totals.index.get_level_values(0)
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.empty(0, dtype=np.intp)
+    return users[starts].to_numpy(), np.append(starts, len(users))
+
+
+def user_series(totals: pd.Series) -> Dict[Any, pd.Series]:
+    """Split (user, day) totals into one gap-filled daily series per user"""
+    users, bounds = _user_bounds(totals)
+    values = totals.to_numpy(dtype=np.float64)
+    days = totals.index.get_level_values(1)
+    return {
+        user: pd.Series(values[start:stop], index=days[start:stop]).asfreq('D', fill_value=0.0)
+        for user, start, stop in zip(users, bounds[:-1], bounds[1:])
+    }
+
+
+def chunk_totals(totals: pd.Series, users_per_chunk: int):
+    """Yield (users, totals rows) chunks of whole users, for fanning out to workers"""
+    users, bounds = _user_bounds(totals)
+    for first in range(0, len(users), users_per_chunk):
+        last = min(first + users_per_chunk, len(users))
+        yield users[first:last].tolist(), totals.iloc[bounds[first]:bounds[last]]
+
+
+def calendar_features(dates: pd.DatetimeIndex) -> np.ndarray:
+    """day_of_year, day_of_week, month, year columns for each date"""
+    return np.column_stack([dates.dayofyear, dates.dayofweek, dates.month, dates.year]).astype(np.float32)
+
+
+def lag_matrix(values: np.ndarray, start: int = MAX_LAG) -> np.ndarray:
+    """Lag columns for positions start.. of a series (start >= MAX_LAG), shape (n - start, len(LAGS))"""
+    n = len(values)
+    return np.column_stack([values[start - lag:n - lag] for lag in LAGS])
+
+
+def first_change(old: pd.Series, new: pd.Series) -> int:
+    """Position of the first day where two daily series differ; 0 when they start on different days"""
+    if not len(old) or not len(new) or old.index[0] != new.index[0]:
+        return 0
+    m = min(len(old), len(new))
+    changed = np.flatnonzero(old.to_numpy()[:m] != new.to_numpy()[:m])
+    return int(changed[0]) if len(changed) else m
+
+
+class LagRing:
+    """Ring buffer of the last MAX_LAG values of many series.
+    
+    push() overwrites the oldest column and lag(k) reads the value k steps
+    back, both O(series), so recursive forecasting never shifts or rebuilds
+    arrays.
+    """
+    
+    def __init__(self, history: np.ndarray):
+        # history: (series, MAX_LAG), oldest first
+        self.buffer = np.array(history, dtype=np.float32)
+        self.head = 0  # column of the oldest value, overwritten next
+    
+    def push(self, values: np.ndarray):
+        self.buffer[:, self.head] = values
+        self.head = (self.head + 1) % MAX_LAG
+    
+    def lag(self, k: int) -> np.ndarray:
+        return self.buffer[:, (self.head - k) % MAX_LAG]
+
+
+class SeriesFit:
+    """Model state of one series, kept so a later forecast only redoes what changed.
+    
+    For the lag model `fitted` holds the one-step in-sample prediction of
+    every day after the first MAX_LAG and `ahead` the recursive forecast
+    from the day after the series ends. For Prophet `model` is the model
+    fitted on the first `fit_length` days.
+    """
+    
+    def __init__(
+        self,
+        series: pd.Series,
+        fitted: Optional[np.ndarray] = None,
+        ahead: Optional[np.ndarray] = None,
+        model: Any = None,
+        fit_length: int = 0
+    ):
+        self.series = series
+        self.fitted = fitted
+        self.ahead = ahead
+        self.model = model
+        self.fit_length = fit_length
+
+
+class ForecastEngine:
+    """Daily forecasts from one trained model, reported at any period.
+    
+    XGBoost lag models run recursively: every step predicts one day for
+    all series in one call, and feeds the predictions back through a
+    LagRing. Prophet models are refit on each series and predict the whole
+    horizon in one call. Without a usable model, with less history than
+    the longest lag, or where the lag model fits a series worse than the
+    baseline does, a weekday-mean baseline is used.
+    """
+    
+    def __init__(
+        self,
+        model: Any = None,
+        name: str = 'forecast',
+        compiled: bool = True,
+        compiled_max_rows: int = 256,
+        prophet_refit_days: int = 7
+    ):
+        self.model = model
+        self.name = name
+        self.prophet_refit_days = prophet_refit_days
+        self.kind = None
+        self.backend = None
+        self.compiled_max_rows = compiled_max_rows
+        if model is None:
+            return
+        if type(model).__name__ == 'Prophet':
+            self.kind = 'prophet'
+        elif hasattr(model, 'predict') and getattr(model, 'n_features_in_', None) == N_CALENDAR + len(LAGS):
+            self.kind = 'xgboost'
+            self.backend = compile_forecast_model(model) if compiled else None
+        else:
+            print(f"Warning: Unsupported {name} model {type(model).__name__}, using baseline forecasts")
+    
+    def predictor(self, X: np.ndarray) -> np.ndarray:
+        # The compiled trees win on small batches; native xgboost on large ones
+        if self.backend is not None and len(X) <= self.compiled_max_rows:
+            return self.backend.predict(X)
+        return self.model.predict(X)
+    
+    @property
+    def model_name(self) -> str:
+        return {'prophet': 'prophet-model-v1', 'xgboost': 'xgboost-lag-v1'}.get(self.kind, 'baseline-weekday')
+    
+    def forecast(
+        self,
+        series: Sequence[pd.Series],
+        today: pd.Timestamp,
+        months: int,
+        previous: Optional[Sequence[Optional[SeriesFit]]] = None
+    ) -> List[Tuple[pd.DataFrame, float, str, Optional[SeriesFit]]]:
+        """Daily forecasts from `today` through `months` months ahead, for every series.
+        
+        Returns (frame, accuracy, model name, fit) per series; frame is
+        indexed by date with predictedAmount and sigma columns. A series is
+        forecast from the day after its last observation, so stale history
+        is rolled forward to `today` before the reported horizon starts.
+        
+        `previous` holds each series' fit from an earlier call, if any.
+        Only the days from the first change onwards are fitted again, an
+        unchanged series reuses (and extends) its earlier forecast, and a
+        Prophet model is only refit once `prophet_refit_days` new days
+        have arrived.
+        """
+        today = pd.Timestamp(today).normalize()
+        end = today + pd.DateOffset(months=months)
+        previous = previous or [None] * len(series)
+        results: List[Optional[Tuple[pd.DataFrame, float, str, Optional[SeriesFit]]]] = [None] * len(series)
+        
+        lagged = []
+        for i, s in enumerate(series):
+            if self.kind == 'xgboost' and len(s) > MAX_LAG:
+                lagged.append(i)
+            elif self.kind == 'prophet' and len(s) >= 2:
+                results[i] = self._prophet(s, today, end, previous[i])
+            else:
+                results[i] = (*_baseline(s, today, end), None)
+        
+        fits = self._lag_fits([series[i] for i in lagged], [previous[i] for i in lagged])
+        
+        # The model was trained on one spending scale and is applied to the
+        # raw series, so a user it fits worse than their weekday means gets those
+        modelled = []
+        for i, fit in zip(lagged, fits):
+            baseline = _baseline(series[i], today, end)
+            n = min(BASELINE_DAYS, len(fit.fitted))
+            if _accuracy(fit.series.to_numpy(dtype=np.float32)[-n:], fit.fitted[-n:]) < baseline[1]:
+                results[i] = (*baseline, fit)
+            else:
+                modelled.append((i, fit))
+        
+        # Series ending on the same day with the same number of reusable
+        # forecast days share calendar features and one recursion
+        groups: Dict[Tuple[pd.Timestamp, int], List[int]] = {}
+        for i, fit in modelled:
+            known = len(fit.ahead) if fit.ahead is not None else 0
+            groups.setdefault((series[i].index[-1], known), []).append(i)
+        fit_of = dict(modelled)
+        for (last_day, _), members in groups.items():
+            group = [fit_of[i] for i in members]
+            for i, result in zip(members, self._recursive(group, last_day, today, end)):
+                results[i] = result
+        return results
+    
+    def _lag_fits(self, series: List[pd.Series], previous: List[Optional[SeriesFit]]) -> List[SeriesFit]:
+        """One-step in-sample predictions, refitting each series only from its first changed day"""
+        fits = []
+        rows = []
+        for s, prev in zip(series, previous):
+            values = s.to_numpy(dtype=np.float32)
+            kept = np.empty(0, dtype=np.float32)
+            ahead = None
+            if prev is not None and prev.fitted is not None:
+                change = first_change(prev.series, s)
+                # Day `change` keeps its prediction (its lags are older); later days' lags changed
+                kept = prev.fitted[:max(min(change + 1, len(prev.series), len(s)) - MAX_LAG, 0)]
+                if change == len(s) == len(prev.series):
+                    ahead = prev.ahead
+            start = MAX_LAG + len(kept)
+            if start < len(s):
+                rows.append(np.hstack([calendar_features(s.index[start:]), lag_matrix(values, start)]))
+            fits.append(SeriesFit(s, kept, ahead))
+        
+        # Every series' stale rows go through the model in one call
+        if rows:
+            fitted = self.predictor(np.vstack(rows))
+            offset = 0
+            for fit in fits:
+                missing = len(fit.series) - MAX_LAG - len(fit.fitted)
+                if missing:
+                    fit.fitted = np.concatenate([fit.fitted, fitted[offset:offset + missing]])
+                    offset += missing
+        return fits
+    
+    def _recursive(
+        self,
+        fits: List[SeriesFit],
+        last_day: pd.Timestamp,
+        today: pd.Timestamp,
+        end: pd.Timestamp
+    ) -> List[Tuple[pd.DataFrame, float, str, SeriesFit]]:
+        """Recursive lag-model forecasts for series whose history ends on the same day.
+        
+        Days already forecast in an earlier call (fit.ahead, the same
+        length for the whole group) are reused and the recursion continues
+        after them.
+        """
+        dates = pd.date_range(last_day + pd.Timedelta(days=1), max(end, last_day + pd.Timedelta(days=1)), freq='D', inclusive='left')
+        n = len(fits)
+        known = min(len(fits[0].ahead) if fits[0].ahead is not None else 0, len(dates))
+        
+        # One-step in-sample errors give each series' noise level and accuracy
+        sigma = np.empty(n)
+        accuracy = np.empty(n)
+        for j, fit in enumerate(fits):
+            actual = fit.series.to_numpy(dtype=np.float32)[MAX_LAG:]
+            sigma[j] = np.sqrt(np.mean((actual - fit.fitted) ** 2))
+            accuracy[j] = _accuracy(actual, fit.fitted)
+        
+        predictions = np.empty((n, len(dates)), dtype=np.float32)
+        tails = []
+        for j, fit in enumerate(fits):
+            values = fit.series.to_numpy(dtype=np.float32)
+            if known:
+                predictions[j, :known] = fit.ahead[:known]
+                values = np.concatenate([values, fit.ahead[:known]])
+            tails.append(values[-MAX_LAG:])
+        
+        ring = LagRing(np.stack(tails))
+        calendar = calendar_features(dates[known:])
+        X = np.empty((n, N_CALENDAR + len(LAGS)), dtype=np.float32)
+        for t in range(known, len(dates)):
+            X[:, :N_CALENDAR] = calendar[t - known]
+            for column, lag in enumerate(LAGS):
+                X[:, N_CALENDAR + column] = ring.lag(lag)
+            step = np.maximum(self.predictor(X), 0)
+            predictions[:, t] = step
+            ring.push(step)
+        
+        # Recursive errors compound, so the band widens with the steps ahead
+        # until every lag input is itself a prediction
+        growth = np.sqrt(np.minimum(np.arange(1, len(dates) + 1), MAX_LAG))
+        first = int(dates.searchsorted(today))
+        reported = dates[first:]
+        results = []
+        for j, fit in enumerate(fits):
+            if fit.ahead is None or len(fit.ahead) < len(dates):
+                fit.ahead = predictions[j].copy()
+            frame = pd.DataFrame(
+                {'predictedAmount': predictions[j, first:], 'sigma': sigma[j] * growth[first:]},
+                index=reported
+            )
+            results.append((frame, accuracy[j], self.model_name, fit))
+        return results
+    
+    def _prophet(
+        self,
+        s: pd.Series,
+        today: pd.Timestamp,
+        end: pd.Timestamp,
+        previous: Optional[SeriesFit] = None
+    ) -> Tuple[pd.DataFrame, float, str, SeriesFit]:
+        """Forecast one series with a Prophet model fitted on it, refit with the trained model's settings when stale"""
+        if (
+            previous is not None and previous.model is not None
+            and first_change(previous.series, s) >= previous.fit_length
+            and len(s) - previous.fit_length < self.prophet_refit_days
+        ):
+            model, fit_length = previous.model, previous.fit_length
+        else:
+            template = self.model
+            params = {
+                name: getattr(template, name)
+                for name in (
+                    'growth', 'changepoint_prior_scale', 'seasonality_prior_scale', 'seasonality_mode',
+                    'yearly_seasonality', 'weekly_seasonality', 'daily_seasonality', 'interval_width'
+                )
+                if hasattr(template, name)
+            }
+            model = type(template)(**params)
+            model.fit(pd.DataFrame({'ds': s.index, 'y': s.to_numpy()}))
+            fit_length = len(s)
+        
+        future = pd.date_range(today, end, freq='D', inclusive='left')
+        predicted = model.predict(pd.DataFrame({'ds': s.index.append(future)}))
+        fitted = predicted['yhat'].to_numpy()[:len(s)]
+        ahead = predicted.iloc[len(s):]
+        # Convert Prophet's interval back to a standard deviation
+        sigma = (ahead['yhat_upper'] - ahead['yhat_lower']).to_numpy() / (2 * INTERVAL_Z)
+        frame = pd.DataFrame(
+            {'predictedAmount': np.maximum(ahead['yhat'].to_numpy(), 0), 'sigma': sigma},
+            index=future
+        )
+        return frame, _accuracy(s.to_numpy(), fitted), self.model_name, SeriesFit(s, model=model, fit_length=fit_length)
+
+
+def _baseline(s: pd.Series, today: pd.Timestamp, end: pd.Timestamp) -> Tuple[pd.DataFrame, float, str]:
+    """Weekday means (and spreads) over the last BASELINE_DAYS, repeated over the horizon"""
+    dates = pd.date_range(today, end, freq='D', inclusive='left')
+    recent = s.iloc[-BASELINE_DAYS:]
+    if len(recent):
+        by_weekday = recent.groupby(recent.index.dayofweek)
+        means = by_weekday.mean().reindex(range(7)).fillna(recent.mean())
+        spreads = by_weekday.std(ddof=0).reindex(range(7)).fillna(recent.std(ddof=0))
+        fitted = means.to_numpy()[recent.index.dayofweek]
+        accuracy = _accuracy(recent.to_numpy(), fitted)
+    else:
+        means = spreads = pd.Series(0.0, index=range(7))
+        accuracy = 0.0
+    frame = pd.DataFrame(
+        {
+            'predictedAmount': means.to_numpy()[dates.dayofweek],
+            'sigma': spreads.to_numpy()[dates.dayofweek]
+        },
+        index=dates
+    )
+    return frame, accuracy, 'baseline-weekday'
+
+
+def zero_forecast(today: pd.Timestamp, months: int) -> pd.DataFrame:
+    """Daily zeros without spread from `today` through `months` months ahead, for series with no history"""
+    today = pd.Timestamp(today).normalize()
+    dates = pd.date_range(today, today + pd.DateOffset(months=months), freq='D', inclusive='left')
+    return pd.DataFrame({'predictedAmount': 0.0, 'sigma': 0.0}, index=dates)
+
+
+def _accuracy(actual: np.ndarray, fitted: np.ndarray) -> float:
+    """1 - weighted absolute percentage error, clipped to [0, 1]"""
+    total = np.abs(actual).sum()
+    if total == 0:
+        return 0.0
+    return float(np.clip(1 - np.abs(actual - fitted).sum() / total, 0, 1))
+
+
+def _bucket_starts(dates: pd.DatetimeIndex, period: str) -> np.ndarray:
+    """First day of the period bucket containing each date"""
+    days = dates.to_numpy().astype('datetime64[D]')
+    if period == 'weekly':
+        # 1970-01-01 was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def aggregate(frame: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Sum daily forecasts into the period's buckets; errors are summed in quadrature"""
+    if period not in PERIODS[1:] or frame.empty:
+        return frame
+    starts = _bucket_starts(frame.index, period)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    return pd.DataFrame(
+        {
+            'predictedAmount': np.add.reduceat(frame['predictedAmount'].to_numpy(dtype=np.float64), first),
+            'sigma': np.sqrt(np.add.reduceat(frame['sigma'].to_numpy(dtype=np.float64) ** 2, first))
+        },
+        index=pd.DatetimeIndex(starts[first])
+    )
+
+
+def prediction_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Prediction dicts with 95% bounds; confidence shrinks as the band widens relative to the value"""
+    values = frame['predictedAmount'].to_numpy(dtype=np.float64)
+    half_width = INTERVAL_Z * frame['sigma'].to_numpy(dtype=np.float64)
+    lower = np.maximum(values - half_width, 0)
+    upper = values + half_width
+    confidence = 1 / (1 + half_width / np.maximum(np.abs(values), 1e-9))
+    dates = frame.index.strftime('%Y-%m-%d')
+    return [
+        {
+            'date': date,
+            'predictedAmount': float(value),
+            'lower': float(lo),
+            'upper': float(hi),
+            'confidence': float(conf)
+        }
+        for date, value, lo, hi, conf in zip(dates, values, lower, upper, confidence)
+    ]
+
+
+def columnar_result(result: Dict[str, Any], period: str) -> Dict[str, Any]:
+    """A forecast result as parallel arrays: the first bucket's date, the step between buckets and one array per field.
+    
+    Amounts are rounded to cents and confidences to four decimals; bounds
+    are None where the model gives none.
+    """
+    predictions = result['predictions']
+    return {
+        'start': predictions[0]['date'] if predictions else None,
+        'step': PERIOD_STEPS.get(period, 'P1D'),
+        'length': len(predictions),
+        'values': [round(p['predictedAmount'], 2) for p in predictions],
+        'lower': [_rounded(p.get('lower'), 2) for p in predictions],
+        'upper': [_rounded(p.get('upper'), 2) for p in predictions],
+        'confidence': [_rounded(p.get('confidence'), 4) for p in predictions],
+        'accuracy': result['accuracy'],
+        'model': result['model']
+    }
+
+
+def _rounded(value: Optional[float], digits: int) -> Optional[float]:
+    return round(value, digits) if value is not None else None
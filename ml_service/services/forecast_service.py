@@ -8,19 +8,58 @@ import sys
 import joblib
 import numpy as np
 import pandas as pd
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from ml_service.services.forecast_engine import ForecastEngine, SeriesFit, TARGET_TYPES, daily_series, user_series, aggregate, prediction_records, zero_forecast, history_fingerprint
+from ml_service.services.forecast_store import ForecastStore, series_fingerprint
+from ml_service.services.cache import payload_key
+
 # Go up to Quantra directory (parent of ml_service)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 
+# Evaluate the forecast trees from compiled NumPy node arrays for batches up
+# to this many rows; larger batches go to native xgboost
+COMPILED_FORECAST_MAX_ROWS = int(os.getenv("FORECAST_COMPILED_MAX_ROWS", "256"))
+
+# Forecast results per (user, target, period, horizon, history), and each
+# user's model state for incremental refreshes (0 disables both)
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "10000"))
+FORECAST_CACHE_TTL_SECONDS = float(os.getenv("FORECAST_CACHE_TTL_SECONDS", "300"))
+FORECAST_STATE_TTL_SECONDS = float(os.getenv("FORECAST_STATE_TTL_SECONDS", "86400"))
+
+# A Prophet model fitted on a user's history is reused until this many new days arrive
+FORECAST_PROPHET_REFIT_DAYS = int(os.getenv("FORECAST_PROPHET_REFIT_DAYS", "7"))
+
+def forecast_key(user_id: Any, target: str, period: str, months: int, series: pd.Series) -> Tuple:
+    """Store key of a forecast; results are only reused on the day they were computed"""
+    return (user_id, target, period, months, series_fingerprint(series), datetime.now().date())
+
+
+def risk_key(user_id: Any, transactions: List[Dict[str, Any]], average_income: float) -> Tuple:
+    """Store key of a default-risk score; it depends on the date through the 30-day window"""
+    return ('default-risk', user_id, payload_key([transactions, average_income]), datetime.now().date())
+
+
+def latest_key(request: Tuple, rows: List[Dict[str, Any]]) -> Tuple[Tuple, Any]:
+    """(store key, history fingerprint) under which a result is also found when the payload differs.
+    
+    Precomputed results come from histories the scheduler extended with
+    scored transactions, whose rows are ordered and shaped differently
+    from the history a client sends next; a request on the same day with
+    the same transactions (ids, times and amounts) is answered from them.
+    """
+    return (*request, datetime.now().date()), history_fingerprint(rows)
+
+
 class ForecastService:
     def __init__(self):
         self.spending_model = None
         self.income_model = None
         self.default_risk_model = None
+        self.store = ForecastStore(FORECAST_CACHE_SIZE, FORECAST_CACHE_TTL_SECONDS, FORECAST_STATE_TTL_SECONDS)
         self.load_models()
     
     def load_models(self):
@@ -46,64 +85,150 @@ class ForecastService:
                 self.default_risk_model = joblib.load(risk_path)
             except Exception as e:
                 print(f"Warning: Could not load default risk model: {e}")
+        
+        # The income model falls back to the spending model until one is trained
+        self.engines = {
+            target: ForecastEngine(
+                model,
+                target,
+                compiled_max_rows=COMPILED_FORECAST_MAX_ROWS,
+                prophet_refit_days=FORECAST_PROPHET_REFIT_DAYS
+            )
+            for target, model in (
+                ('spending', self.spending_model),
+                ('income', self.income_model or self.spending_model)
+            )
+        }
     
     async def generate_forecast(
         self,
         userId: Optional[str],
         period: str,
         months: int,
-        historical_data: Optional[List[Dict[str, Any]]] = None
+        historical_data: Optional[List[Dict[str, Any]]] = None,
+        target: str = 'spending'
     ) -> Dict[str, Any]:
         """Generate spending/income forecast"""
-        if not historical_data:
-            historical_data = []
-        
-        # Prepare data
-        df = pd.DataFrame(historical_data) if historical_data else pd.DataFrame()
+        series = daily_series(historical_data or [], target)
+        if userId is None or FORECAST_CACHE_SIZE <= 0:
+            return self.forecast_series([series], period, months, target)[0][0]
         
-        predictions = []
-        start_date = datetime.now()
+        key = forecast_key(userId, target, period, months, series)
+        latest = latest_key((userId, target, period, months), historical_data or [])
+        result = self.store.result(key, latest)
+        if result is None:
+            result, fit = self.forecast_series([series], period, months, target, [self.store.fit(userId, target)])[0]
+            self.store.put(key, result, userId, target, fit, latest)
+        return result
+    
+    def precompute_forecasts(
+        self,
+        jobs: List[Tuple[Any, str, str, int, List[Dict[str, Any]], Optional[SeriesFit]]]
+    ) -> List[Tuple[Tuple, Tuple[Tuple, Any], Dict[str, Any], Optional[SeriesFit]]]:
+        """Forecast (userId, target, period, months, history, previous fit) jobs for the store.
         
-        # Determine model to use
-        model = self.spending_model if period == 'monthly' else self.income_model
+        Jobs with the same target, period and horizon are forecast together.
+        Returns (store key, latest key, result, fit) per job, in job order.
+        """
+        groups: Dict[Tuple[str, str, int], List[int]] = {}
+        for i, (_, target, period, months, _, _) in enumerate(jobs):
+            groups.setdefault((target, period, months), []).append(i)
         
-        if model and len(df) > 0:
-            try:
-                # Use trained model
-                # This is simplified - actual implementation would use Prophet/LSTM
-                # For now, generate mock predictions
-                for i in range(months * 30):
-                    date = start_date + timedelta(days=i)
-                    predictions.append({
-                        'date': date.isoformat().split('T')[0],
-                        'predictedAmount': np.random.uniform(1000, 5000),
-                        'confidence': np.random.uniform(0.7, 1.0)
-                    })
-            except Exception as e:
-                print(f"Error using forecast model: {e}")
-                # Fallback to mock
-                predictions = self._mock_predictions(start_date, months)
-        else:
-            # Fallback to mock predictions
-            predictions = self._mock_predictions(start_date, months)
+        output: List[Optional[Tuple[Tuple, Tuple[Tuple, Any], Dict[str, Any], Optional[SeriesFit]]]] = [None] * len(jobs)
+        for (target, period, months), members in groups.items():
+            series = [daily_series(jobs[i][4], target) for i in members]
+            results = self.forecast_series(series, period, months, target, [jobs[i][5] for i in members])
+            for i, s, (result, fit) in zip(members, series, results):
+                output[i] = (
+                    forecast_key(jobs[i][0], target, period, months, s),
+                    latest_key((jobs[i][0], target, period, months), jobs[i][4]),
+                    result,
+                    fit
+                )
+        return output
+    
+    def precompute_risk(
+        self,
+        jobs: List[Tuple[Any, List[Dict[str, Any]], float]]
+    ) -> List[Tuple[Tuple, Tuple[Tuple, Any], Dict[str, Any]]]:
+        """Default-risk scores for (userId, transactions, averageIncome) jobs; returns (store key, latest key, result) per job"""
+        return [
+            (
+                risk_key(user_id, transactions, average_income),
+                latest_key(('default-risk', user_id, average_income), transactions),
+                self._default_risk(transactions, average_income)
+            )
+            for user_id, transactions, average_income in jobs
+        ]
+    
+    def generate_batch(
+        self,
+        totals: pd.Series,
+        period: str,
+        months: int,
+        target: str = 'spending',
+        user_ids: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Forecast every user in (userId, day) daily totals from forecast_engine.daily_totals.
         
-        return {
-            'predictions': predictions,
-            'accuracy': 0.85,
-            'model': 'prophet-model-v1' if model else 'mock-model'
-        }
+        user_ids adds users without any rows in totals, who get the no-history result.
+        """
+        histories = user_series(totals)
+        for user_id in user_ids or []:
+            histories.setdefault(user_id, pd.Series(dtype=np.float64))
+        results = self.forecast_series(list(histories.values()), period, months, target)
+        return [{'userId': user_id, **result} for user_id, (result, _) in zip(histories, results)]
     
-    def _mock_predictions(self, start_date: datetime, months: int) -> List[Dict[str, Any]]:
-        """Generate mock predictions"""
-        predictions = []
-        for i in range(months * 30):
-            date = start_date + timedelta(days=i)
-            predictions.append({
-                'date': date.isoformat().split('T')[0],
-                'predictedAmount': np.random.uniform(1000, 5000),
-                'confidence': np.random.uniform(0.7, 1.0)
-            })
-        return predictions
+    def forecast_series(
+        self,
+        series: List[pd.Series],
+        period: str,
+        months: int,
+        target: str = 'spending',
+        previous: Optional[List[Optional[SeriesFit]]] = None
+    ) -> List[Tuple[Dict[str, Any], Optional[SeriesFit]]]:
+        """Forecast daily series together; the lag model steps through all of them at once.
+        
+        Returns (result, fit) per series. `previous` holds fits from earlier
+        forecasts of the same series, which are refreshed instead of refit.
+        """
+        if target not in TARGET_TYPES:
+            raise ValueError(f"Unknown forecast target {target}, expected spending or income")
+        today = pd.Timestamp(datetime.now())
+        results: List[Optional[Tuple[Dict[str, Any], Optional[SeriesFit]]]] = [None] * len(series)
+        previous = previous or [None] * len(series)
+        
+        with_history = []
+        no_history = None
+        for i, s in enumerate(series):
+            if len(s):
+                with_history.append(i)
+                continue
+            # Nothing to forecast from: zeros, with no confidence in them
+            if no_history is None:
+                predictions = prediction_records(aggregate(zero_forecast(today, months), period))
+                no_history = {
+                    'predictions': [{**p, 'confidence': 0.0} for p in predictions],
+                    'accuracy': 0.0,
+                    'model': 'no-history'
+                }
+            results[i] = (no_history, None)
+        
+        engine = self.engines['income' if target == 'income' else 'spending']
+        histories = [series[i] for i in with_history]
+        try:
+            forecasts = engine.forecast(histories, today, months, [previous[i] for i in with_history])
+        except Exception as e:
+            print(f"Error using forecast model: {e}")
+            forecasts = ForecastEngine().forecast(histories, today, months)
+        
+        for i, (frame, accuracy, model_name, fit) in zip(with_history, forecasts):
+            results[i] = ({
+                'predictions': prediction_records(aggregate(frame, period)),
+                'accuracy': accuracy,
+                'model': model_name
+            }, fit)
+        return results
     
     async def calculate_default_risk(
         self,
@@ -112,6 +237,19 @@ class ForecastService:
         averageIncome: float
     ) -> Dict[str, Any]:
         """Calculate default risk score"""
+        if userId is None or FORECAST_CACHE_SIZE <= 0:
+            return self._default_risk(transactions, averageIncome)
+        
+        key = risk_key(userId, transactions, averageIncome)
+        latest = latest_key(('default-risk', userId, averageIncome), transactions)
+        result = self.store.result(key, latest)
+        if result is None:
+            result = self._default_risk(transactions, averageIncome)
+            self.store.put(key, result, userId, 'default-risk', None, latest)
+        return result
+    
+    def _default_risk(self, transactions: List[Dict[str, Any]], averageIncome: float) -> Dict[str, Any]:
+        """Rule- and model-based default risk of a transaction history"""
         if not transactions:
             return {
                 'score': 0,
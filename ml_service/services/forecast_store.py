@@ -0,0 +1,110 @@
+"""
+Forecast Store
+Cached forecast results and per-user model state, so repeated requests are
+served from memory and new transactions only refresh what they change
+"""
+
+import hashlib
+from typing import Dict, Any, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ml_service.services.cache import TTLCache
+from ml_service.services.metrics import registry
+from ml_service.services.forecast_engine import SeriesFit
+
+
+def series_fingerprint(series: pd.Series) -> bytes:
+    """Stable hash of a daily series' first day and values"""
+    digest = hashlib.blake2b(digest_size=16)
+    if len(series):
+        digest.update(str(series.index[0].date()).encode())
+        digest.update(np.ascontiguousarray(series.to_numpy(dtype=np.float64)).tobytes())
+    return digest.digest()
+
+
+class ForecastStore:
+    """Forecast results by (user, target, period, horizon, history fingerprint, day), plus each user's latest fit.
+    
+    A result hit needs the exact same daily history on the same day, or,
+    through the `latest` table, the same request on the same day with a
+    history holding the same transactions as the stored one (histories
+    assembled by the precompute scheduler differ in shape from what
+    clients send).
+    On a miss the user's previous SeriesFit lets the engine refit only the
+    days from the first change onwards, so a few new transactions cost a
+    few model rows plus the forecast recursion rather than a full refit.
+    All tables are LRU-bounded and expire after their TTL.
+    """
+    
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 300.0,
+        state_ttl: float = 86400.0,
+        name: str = 'forecast_cache'
+    ):
+        self.results = TTLCache(maxsize, ttl)
+        self.latest = TTLCache(maxsize, ttl)
+        self.fits = TTLCache(maxsize, state_ttl)
+        self.hits = registry.counter(f'{name}_hits')
+        self.latest_hits = registry.counter(f'{name}_latest_hits')
+        self.misses = registry.counter(f'{name}_misses')
+        self.incremental = registry.counter(f'{name}_incremental')
+        self.hit_rate = registry.gauge(f'{name}_hit_rate')
+    
+    def _count(self, hit: bool):
+        (self.hits if hit else self.misses).inc()
+        self.hit_rate.set(self.hits.value / (self.hits.value + self.misses.value))
+    
+    def result(self, key: Hashable, latest: Optional[Tuple[Hashable, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Cached result for key, else for a (latest key, history fingerprint) pair; results are shared and must not be mutated"""
+        result = self.results.get(key)
+        if result is None and latest is not None and latest[1] is not None:
+            entry = self.latest.get(latest[0])
+            if entry is not None and entry[0] == latest[1]:
+                result = entry[1]
+                self.latest_hits.inc()
+        self._count(result is not None)
+        return result
+    
+    def fit(self, user_id: Any, target: str) -> Optional[SeriesFit]:
+        """The user's fit from their latest forecast, if it has not expired"""
+        fit = self.fits.get((user_id, target))
+        if fit is not None:
+            self.incremental.inc()
+        return fit
+    
+    def put(
+        self,
+        key: Hashable,
+        result: Dict[str, Any],
+        user_id: Any,
+        target: str,
+        fit: Optional[SeriesFit],
+        latest: Optional[Tuple[Hashable, Any]] = None
+    ):
+        self.results.put(key, result)
+        if latest is not None and latest[1] is not None:
+            self.latest.put(latest[0], (latest[1], result))
+        if fit is not None:
+            self.fits.put((user_id, target), fit)
+    
+    def clear(self):
+        self.results.clear()
+        self.latest.clear()
+        self.fits.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Result-cache counters and the number of forecasts refreshed from a previous fit"""
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            'results': self.results.stats(),
+            'fits': self.fits.stats(),
+            'hits': hits,
+            'misses': misses,
+            'hitRate': hits / (hits + misses) if hits + misses else 0.0,
+            'latestHits': self.latest_hits.value,
+            'incrementalRefreshes': self.incremental.value
+        }
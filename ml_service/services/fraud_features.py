@@ -0,0 +1,263 @@
+"""
+Fraud Feature Compiler
+Builds fraud model feature matrices column by column into preallocated buffers
+"""
+
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, Optional, List, Tuple
+
+from ml_service.services.velocity_index import DAY, parse_timestamp, transaction_time, transaction_id
+from ml_service.services.entity_sketches import SKETCH_FEATURE_NAMES
+from ml_service.services.risk_tables import RISK_FEATURE_NAMES
+from ml_service.services.transaction_graph import GRAPH_FEATURE_NAMES
+
+FEATURE_NAMES = [
+    'amount', 'amount_high', 'amount_medium', 'amount_low',
+    'location_foreign', 'frequency', 'frequency_high', 'frequency_medium',
+    'type_withdrawal', 'type_credit', 'avg_amount', 'amount_deviation'
+]
+N_FEATURES = len(FEATURE_NAMES)
+
+# Context columns appended after the model features in the raw matrix. The
+# models and scaler only see the first N_FEATURES columns; rules can use all
+CONTEXT_FEATURE_NAMES = SKETCH_FEATURE_NAMES + RISK_FEATURE_NAMES + GRAPH_FEATURE_NAMES
+N_RAW_FEATURES = N_FEATURES + len(CONTEXT_FEATURE_NAMES)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES + CONTEXT_FEATURE_NAMES)}
+_SKETCH_COLUMNS = slice(N_FEATURES, N_FEATURES + len(SKETCH_FEATURE_NAMES))
+_GRAPH_COLUMNS = slice(FEATURE_INDEX[GRAPH_FEATURE_NAMES[0]], N_RAW_FEATURES)
+
+
+class FeatureCompiler:
+    """Compile transactions into raw and scaled float32 feature matrices.
+    
+    Buffers are allocated once per thread and grown on demand, so the
+    matrices returned by compile() are views that stay valid until the
+    next compile() call on the same thread. Copy them if they must
+    outlive that.
+    """
+    
+    def __init__(self, scaler: Any = None, capacity: int = 256):
+        self.capacity = capacity
+        self.mean = None
+        self.inv_scale = None
+        self._local = threading.local()
+        if scaler is not None:
+            self.set_scaler(scaler)
+    
+    def set_scaler(self, scaler: Any):
+        """Use a fitted StandardScaler's parameters for the scaled output"""
+        self.mean = np.asarray(scaler.mean_, dtype=np.float32)
+        self.inv_scale = (1.0 / np.asarray(scaler.scale_, dtype=np.float64)).astype(np.float32)
+    
+    def _buffers(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return this thread's raw and scaled buffers sized for n rows"""
+        raw = getattr(self._local, 'raw', None)
+        if raw is None or raw.shape[0] < n:
+            size = max(n, self.capacity)
+            self._local.raw = np.empty((size, N_RAW_FEATURES), dtype=np.float32)
+            self._local.scaled = np.empty((size, N_FEATURES), dtype=np.float32)
+        return self._local.raw[:n], self._local.scaled[:n]
+    
+    def compile(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None,
+        aggregates: Any = None,
+        velocity: Any = None,
+        sketches: Any = None,
+        risk: Any = None,
+        graph: Any = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Compile transactions into (raw, scaled) feature matrices.
+        
+        Rows without a user history fall back to the running mean kept in
+        `aggregates` (a UserAggregateStore) for the transaction's userId.
+        Rows without a client-supplied frequency use the 24h count from
+        `velocity` (a VelocityIndex), or from the user history's timestamps.
+        Foreign location and the merchant/category fraud rates come from
+        `risk` (RiskTables); without it any location counts as foreign.
+        The sketch columns come from `sketches` (EntitySketches) and the
+        graph columns from `graph` (TransactionGraph), or are 0.
+        """
+        n = len(transactions)
+        raw, scaled = self._buffers(n)
+        if n == 0:
+            return raw, scaled
+        
+        now = time.time()
+        times = [parse_timestamp(t.get('timestamp'), now) for t in transactions]
+        
+        # Amount-based features
+        raw[:, 0] = [t.get('amount') or 0 for t in transactions]
+        
+        # Location features: foreign means outside the user's home country
+        locations = [t.get('location') or t.get('country') for t in transactions]
+        if risk is not None:
+            raw[:, 4] = risk.foreign_mask(locations, [t.get('userId') for t in transactions])
+        else:
+            raw[:, 4] = [location not in (None, '') for location in locations]
+        
+        # Frequency features
+        self._fill_frequency(raw, transactions, times, user_histories, velocity)
+        _fill_thresholds(raw)
+        
+        # Type features
+        tx_types = [t.get('type') for t in transactions]
+        raw[:, 8] = [tx_type == 'withdrawal' for tx_type in tx_types]
+        raw[:, 9] = [tx_type == 'credit' for tx_type in tx_types]
+        
+        # User history features
+        self._fill_history(raw, transactions, user_histories, aggregates)
+        
+        # Merchant, category and country activity in the sketch window
+        if sketches is not None:
+            sketches.fill_features(raw[:, _SKETCH_COLUMNS], transactions, times)
+        else:
+            raw[:, _SKETCH_COLUMNS] = 0
+        
+        # Historical merchant and category fraud rates
+        for name in RISK_FEATURE_NAMES:
+            table = name.split('_')[0]
+            if risk is not None:
+                raw[:, FEATURE_INDEX[name]] = risk.rates(table, [t.get(table) for t in transactions])
+            else:
+                raw[:, FEATURE_INDEX[name]] = 0
+        
+        # Propagated fraud risk and shared-merchant cluster size
+        if graph is not None:
+            graph.fill_features(raw[:, _GRAPH_COLUMNS], transactions)
+        else:
+            raw[:, _GRAPH_COLUMNS] = 0
+        
+        # Scale in the same pass when a scaler is available
+        self._scale(raw, scaled)
+        return raw, scaled
+    
+    def compile_columns(
+        self,
+        amount: np.ndarray,
+        location_foreign: np.ndarray,
+        frequency: np.ndarray,
+        tx_type: np.ndarray,
+        avg_amount: np.ndarray,
+        context: Optional[Dict[str, np.ndarray]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Compile column arrays (e.g. from a DataFrame chunk) into new (raw, scaled) matrices.
+        
+        avg_amount is NaN for rows without a user average. `context` maps
+        CONTEXT_FEATURE_NAMES to columns; the others are left at 0. Unlike
+        compile(), the returned matrices are freshly allocated and owned by
+        the caller.
+        """
+        n = len(amount)
+        raw = np.zeros((n, N_RAW_FEATURES), dtype=np.float32)
+        raw[:, 0] = amount
+        raw[:, 4] = location_foreign
+        raw[:, 5] = frequency
+        _fill_thresholds(raw)
+        raw[:, 8] = tx_type == 'withdrawal'
+        raw[:, 9] = tx_type == 'credit'
+        
+        known = ~np.isnan(avg_amount)
+        raw[known, 10] = avg_amount[known]
+        raw[:, 11] = known & (raw[:, 0] > raw[:, 10] * 3)
+        for name, values in (context or {}).items():
+            raw[:, FEATURE_INDEX[name]] = values
+        
+        scaled = np.empty((n, N_FEATURES), dtype=np.float32)
+        self._scale(raw, scaled)
+        return raw, scaled
+    
+    def _scale(self, raw: np.ndarray, scaled: np.ndarray):
+        model_raw = raw[:, :N_FEATURES]
+        if self.mean is not None:
+            np.subtract(model_raw, self.mean, out=scaled)
+            np.multiply(scaled, self.inv_scale, out=scaled)
+        else:
+            scaled[:] = model_raw
+    
+    def _fill_frequency(
+        self,
+        raw: np.ndarray,
+        transactions: List[Dict[str, Any]],
+        times: List[float],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]],
+        velocity: Any
+    ):
+        """Fill the 24h transaction count column"""
+        frequency = raw[:, 5]
+        missing = []
+        for i, t in enumerate(transactions):
+            value = t.get('frequency')
+            if value is None:
+                missing.append(i)
+                frequency[i] = 0
+            else:
+                frequency[i] = value
+        if not missing:
+            return
+        
+        until = [times[i] for i in missing]
+        if velocity is not None:
+            counts = velocity.counts(
+                [transactions[i].get('userId') for i in missing],
+                until,
+                exclude_ids=[transaction_id(transactions[i]) for i in missing]
+            )
+        else:
+            counts = [None] * len(missing)
+        
+        for i, until, count in zip(missing, until, counts):
+            history = user_histories[i] if user_histories else None
+            if count is None and history:
+                # Unknown to the index: count the other history rows that carry timestamps
+                own_id = transaction_id(transactions[i])
+                history_times = (transaction_time(t) for t in history if own_id is None or transaction_id(t) != own_id)
+                count = sum(1 for ts in history_times if ts is not None and until - DAY < ts <= until)
+            if count:
+                frequency[i] = count
+    
+    def _fill_history(
+        self,
+        raw: np.ndarray,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]],
+        aggregates: Any
+    ):
+        """Fill the average amount and deviation columns from user history"""
+        avg_amount = raw[:, 10]
+        deviation = raw[:, 11]
+        avg_amount[:] = 0
+        deviation[:] = 0
+        
+        missing = []
+        for i in range(len(transactions)):
+            history = user_histories[i] if user_histories else None
+            if history:
+                avg_amount[i] = sum(t.get('amount') or 0 for t in history) / len(history)
+                deviation[i] = raw[i, 0] > avg_amount[i] * 3
+            else:
+                missing.append(i)
+        
+        # Rows without history read the per-user running mean instead
+        if aggregates is None or not missing:
+            return
+        
+        means = aggregates.mean_amounts([transactions[i].get('userId') for i in missing])
+        for i, mean in zip(missing, means):
+            if mean is not None:
+                avg_amount[i] = mean
+                deviation[i] = raw[i, 0] > mean * 3
+
+
+def _fill_thresholds(raw: np.ndarray):
+    """Derive the amount and frequency threshold flags from columns 0 and 5"""
+    amount = raw[:, 0]
+    frequency = raw[:, 5]
+    np.greater(amount, 50000, out=raw[:, 1])
+    np.greater(amount, 10000, out=raw[:, 2])
+    np.greater(amount, 5000, out=raw[:, 3])
+    np.greater(frequency, 10, out=raw[:, 6])
+    np.greater(frequency, 5, out=raw[:, 7])
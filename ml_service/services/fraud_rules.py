@@ -0,0 +1,189 @@
+"""
+Fraud Rule Engine
+Declarative rule table compiled into vectorized NumPy mask operations
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Union
+
+from ml_service.services.fraud_features import FEATURE_INDEX
+
+# Comparison operators a rule condition may use
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
+
+# Rules with the same `group` are exclusive: only the first match in table
+# order fires, like an if/elif chain
+DEFAULT_RULES: Dict[str, Any] = {
+    'maxScore': 100,
+    'rules': [
+        {
+            'id': 'amount_high', 'group': 'amount', 'weight': 60, 'impact': 'high',
+            'label': 'High Transaction Amount',
+            'description': 'Transaction amount of ${amount:,.2f} exceeds high-risk threshold',
+            'when': [['amount', '>', 50000]]
+        },
+        {
+            'id': 'amount_large', 'group': 'amount', 'weight': 40, 'impact': 'medium',
+            'label': 'Large Transaction Amount',
+            'description': 'Transaction amount of ${amount:,.2f} is significantly above average',
+            'when': [['amount', '>', 10000]]
+        },
+        {
+            'id': 'amount_elevated', 'group': 'amount', 'weight': 20, 'impact': 'low',
+            'label': 'Elevated Transaction Amount',
+            'description': 'Transaction amount of ${amount:,.2f} exceeds $5,000',
+            'when': [['amount', '>', 5000]]
+        },
+        {
+            'id': 'foreign_location', 'weight': 30, 'impact': 'medium',
+            'label': 'International Transaction',
+            'description': 'Transaction from outside the user\'s home country',
+            'when': [['location_foreign', '==', 1]]
+        },
+        {
+            'id': 'frequency_high', 'group': 'frequency', 'weight': 30, 'impact': 'medium',
+            'label': 'High Transaction Frequency',
+            'description': 'User has made {frequency:g} transactions in the last 24 hours',
+            'when': [['frequency', '>', 10]]
+        },
+        {
+            'id': 'frequency_elevated', 'group': 'frequency', 'weight': 15, 'impact': 'low',
+            'label': 'Elevated Transaction Frequency',
+            'description': 'User has made {frequency:g} transactions in the last 24 hours',
+            'when': [['frequency', '>', 5]]
+        },
+        {
+            'id': 'large_withdrawal', 'weight': 20, 'impact': 'low',
+            'label': 'Large Withdrawal',
+            'description': 'Withdrawal of ${amount:,.2f}',
+            'when': [['type_withdrawal', '==', 1], ['amount', '>', 5000]]
+        },
+        {
+            'id': 'risky_merchant', 'weight': 20, 'impact': 'low',
+            'label': 'High-Risk Merchant',
+            'description': 'Merchant\'s historical fraud rate is {merchant_fraud_rate:.0%}',
+            'when': [['merchant_fraud_rate', '>', 0.3]]
+        }
+    ]
+}
+
+
+class RuleEngine:
+    """Score raw feature matrices with a rule table.
+    
+    Each rule is a weighted AND of conditions [feature, operator, value] on
+    the raw fraud features. At construction every distinct condition becomes
+    one column of a comparison matrix and rules become an incidence matrix,
+    so evaluate() is a few array comparisons and one matrix product for the
+    whole batch, independent of how the rules are written.
+    """
+    
+    def __init__(self, table: Dict[str, Any]):
+        self.table = table
+        self.rules: List[Dict[str, Any]] = list(table.get('rules', []))
+        self.max_score = float(table.get('maxScore', 100))
+        self.rule_ids = [rule['id'] for rule in self.rules]
+        self.weights = np.array([float(rule.get('weight', 0)) for rule in self.rules])
+        
+        conditions: Dict[Tuple[int, str, float], int] = {}
+        incidence = np.zeros((0, len(self.rules)), dtype=np.float32)
+        rows = []
+        for r, rule in enumerate(self.rules):
+            if not rule.get('when'):
+                raise ValueError(f"Rule {rule['id']} has no conditions")
+            for feature, op, value in rule['when']:
+                if feature not in FEATURE_INDEX:
+                    raise ValueError(f"Rule {rule['id']}: unknown feature {feature}")
+                if op not in OPERATORS:
+                    raise ValueError(f"Rule {rule['id']}: unknown operator {op}")
+                key = (FEATURE_INDEX[feature], op, float(value))
+                if key not in conditions:
+                    conditions[key] = len(conditions)
+                    rows.append(np.zeros(len(self.rules), dtype=np.float32))
+                rows[conditions[key]][r] = 1
+        if rows:
+            incidence = np.vstack(rows)
+        
+        self.incidence = incidence
+        self.required = incidence.sum(axis=0)
+        
+        # Conditions grouped by operator so each operator is one broadcast compare
+        self._compares = []
+        for op in OPERATORS:
+            keys = [(key, i) for key, i in conditions.items() if key[1] == op]
+            if keys:
+                self._compares.append((
+                    OPERATORS[op],
+                    np.array([i for _, i in keys]),
+                    np.array([key[0] for key, _ in keys]),
+                    np.array([key[2] for key, _ in keys], dtype=np.float32)
+                ))
+        
+        groups: Dict[str, List[int]] = {}
+        for r, rule in enumerate(self.rules):
+            if rule.get('group'):
+                groups.setdefault(rule['group'], []).append(r)
+        self._groups = [np.array(members) for members in groups.values() if len(members) > 1]
+    
+    @classmethod
+    def load(cls, path: Optional[Union[str, Path]] = None) -> 'RuleEngine':
+        """Build an engine from a JSON rule table, falling back to DEFAULT_RULES"""
+        if path:
+            try:
+                with open(path) as f:
+                    return cls(json.load(f))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Warning: Could not load fraud rules from {path}: {e}")
+        return cls(DEFAULT_RULES)
+    
+    def evaluate(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, fired) for a raw feature matrix; fired is an (n, rules) bool mask"""
+        n = len(features)
+        satisfied = np.empty((n, len(self.incidence)), dtype=np.float32)
+        for compare, columns, feature_columns, values in self._compares:
+            satisfied[:, columns] = compare(features[:, feature_columns], values)
+        
+        fired = (satisfied @ self.incidence) >= self.required
+        for members in self._groups:
+            # Keep only the first match per group: a rule is shadowed when any
+            # earlier rule of its group fired
+            group = fired[:, members]
+            shadowed = np.logical_or.accumulate(group, axis=1)
+            group[:, 1:] &= ~shadowed[:, :-1]
+            fired[:, members] = group
+        
+        scores = np.clip(fired @ self.weights, 0, self.max_score)
+        return scores, fired
+    
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return self.evaluate(features)[0]
+    
+    def fired_ids(self, fired_row: np.ndarray) -> List[str]:
+        """Ids of the rules set in one row of evaluate()'s fired mask"""
+        return [self.rule_ids[r] for r in np.flatnonzero(fired_row)]
+    
+    def explain(self, fired_row: np.ndarray, raw_row: np.ndarray) -> List[Dict[str, Any]]:
+        """Describe the rules that fired for one transaction, highest weight first"""
+        values = {name: float(raw_row[i]) for name, i in FEATURE_INDEX.items()}
+        explanation = []
+        for r in sorted(np.flatnonzero(fired_row), key=lambda r: -self.weights[r]):
+            rule = self.rules[r]
+            explanation.append({
+                'feature': rule.get('label', rule['id']),
+                'rule': rule['id'],
+                'contribution': self.weights[r].item(),
+                'description': rule.get('description', '').format(**values),
+                'impact': rule.get('impact', 'medium')
+            })
+        return explanation
@@ -5,28 +5,209 @@ Handles fraud detection, anomaly detection, and explainability
 
 import os
 import sys
+import time
+import asyncio
 import joblib
 import numpy as np
+import pandas as pd
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
+from ml_service.services.fraud_features import FeatureCompiler, FEATURE_NAMES, FEATURE_INDEX, N_FEATURES
+from ml_service.services.user_aggregates import UserAggregateStore
+from ml_service.services.fraud_rules import RuleEngine
+from ml_service.services.online_anomaly import OnlineAnomalyDetector
+from ml_service.services.cascade import Cascade, STAGE_MODEL, STAGE_PRESCREEN_FALLBACK, STAGE_NAMES
+from ml_service.services.velocity_index import VelocityIndex, parse_timestamp, transaction_time, transaction_id
+from ml_service.services.entity_sketches import EntitySketches, SKETCH_DIMENSIONS
+from ml_service.services.risk_tables import RiskTables
+from ml_service.services.transaction_graph import TransactionGraph
+from ml_service.services.alert_queue import AlertQueue
+from ml_service.services.tree_inference import compile_fraud_model, compile_anomaly_model
+from ml_service.services.cache import LRUCache, row_key
+
 # Add models directory to path
 # Go up to Quantra directory (parent of ml_service)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 
+# JSON rule table for the rule-based fallback; the built-in table is used when absent
+RULES_PATH = os.getenv("FRAUD_RULES_PATH", str(MODELS_DIR / "fraud" / "fraud_rules.json"))
+
+# Merchant/category fraud rates and user home countries built by
+# scripts/build_risk_tables.py. FRAUD_HOME_COUNTRY is the home of users the
+# tables do not know (default: the tables' most common home country)
+RISK_TABLES_DIR = os.getenv("FRAUD_RISK_TABLES_DIR", str(MODELS_DIR / "fraud" / "risk_tables"))
+HOME_COUNTRY = os.getenv("FRAUD_HOME_COUNTRY", "") or None
+
+# Maximum number of users whose running amount aggregates are kept in memory
+USER_AGGREGATES_MAX_USERS = int(os.getenv("FRAUD_USER_AGGREGATES_MAX_USERS", "100000"))
+
+# Per-user transaction timestamps kept for the 1h/24h/7d velocity windows
+VELOCITY_MAX_AGE_HOURS = float(os.getenv("FRAUD_VELOCITY_MAX_AGE_HOURS", "168"))
+VELOCITY_MAX_EVENTS_PER_USER = int(os.getenv("FRAUD_VELOCITY_MAX_EVENTS_PER_USER", "1000"))
+
+# Sliding-window count-min/HyperLogLog sketches of merchant, category and
+# country activity. Memory per dimension is fixed at roughly
+# (window / bucket) * depth * width * (4 + registers) bytes
+ENTITY_SKETCHES_ENABLED = os.getenv("FRAUD_ENTITY_SKETCHES", "true").lower() == "true"
+SKETCH_WINDOW_SECONDS = float(os.getenv("FRAUD_SKETCH_WINDOW_SECONDS", "600"))
+SKETCH_BUCKET_SECONDS = float(os.getenv("FRAUD_SKETCH_BUCKET_SECONDS", "60"))
+SKETCH_WIDTH = int(os.getenv("FRAUD_SKETCH_WIDTH", "2048"))
+SKETCH_DEPTH = int(os.getenv("FRAUD_SKETCH_DEPTH", "3"))
+SKETCH_REGISTERS = int(os.getenv("FRAUD_SKETCH_REGISTERS", "32"))
+
+# User-merchant transaction graph for fraud-ring detection, seeded at startup
+# from FRAUD_GRAPH_HISTORY (flagged rows seed risk) and FRAUD_GRAPH_CASES (users
+# with unresolved AML cases seed full risk), then refreshed in the background
+GRAPH_ENABLED = os.getenv("FRAUD_GRAPH", "true").lower() == "true"
+GRAPH_HISTORY_PATH = os.getenv("FRAUD_GRAPH_HISTORY", str(BASE_DIR / "data" / "transactions.csv"))
+GRAPH_CASES_PATH = os.getenv("FRAUD_GRAPH_CASES", str(BASE_DIR / "data" / "aml_cases.csv"))
+GRAPH_REFRESH_SECONDS = float(os.getenv("FRAUD_GRAPH_REFRESH_SECONDS", "30"))
+GRAPH_DAMPING = float(os.getenv("FRAUD_GRAPH_DAMPING", "0.85"))
+GRAPH_MIN_SHARED_MERCHANTS = int(os.getenv("FRAUD_GRAPH_MIN_SHARED_MERCHANTS", "2"))
+GRAPH_MAX_MERCHANT_DEGREE = int(os.getenv("FRAUD_GRAPH_MAX_MERCHANT_DEGREE", "1000"))
+
+# Open alert ranking for case triage. Scores at or above FRAUD_ALERT_MIN_SCORE
+# open (or update) an alert keyed by transaction id; flagged rows of
+# FRAUD_ALERT_HISTORY are loaded at startup. Only the top FRAUD_ALERT_TOP_K
+# per ordering are kept sorted, so deeper pages sort the remainder
+ALERT_QUEUE_ENABLED = os.getenv("FRAUD_ALERT_QUEUE", "true").lower() == "true"
+ALERT_HISTORY_PATH = os.getenv("FRAUD_ALERT_HISTORY", str(BASE_DIR / "data" / "transactions.csv"))
+ALERT_MIN_SCORE = float(os.getenv("FRAUD_ALERT_MIN_SCORE", "70"))
+ALERT_TOP_K = int(os.getenv("FRAUD_ALERT_TOP_K", "1000"))
+ALERT_HALF_LIFE_HOURS = float(os.getenv("FRAUD_ALERT_HALF_LIFE_HOURS", "72"))
+
+# Evaluate tree models from compiled NumPy node arrays instead of xgboost/sklearn
+COMPILED_INFERENCE = os.getenv("FRAUD_COMPILED_INFERENCE", "true").lower() == "true"
+
+# The compiled backends win on small batches; larger batches go to the
+# native xgboost/sklearn implementations, which vectorize better
+COMPILED_FRAUD_MAX_ROWS = int(os.getenv("FRAUD_COMPILED_MAX_ROWS", "256"))
+COMPILED_ANOMALY_MAX_ROWS = int(os.getenv("FRAUD_COMPILED_ANOMALY_MAX_ROWS", "2048"))
+
+# Online Half-Space Trees anomaly detector that learns from scored traffic.
+# FRAUD_ANOMALY_BACKEND=online makes it the anomaly score once warm; otherwise
+# it is reported alongside the IsolationForest
+ONLINE_ANOMALY_ENABLED = os.getenv("FRAUD_ONLINE_ANOMALY", "true").lower() == "true"
+ONLINE_ANOMALY_THRESHOLD = float(os.getenv("FRAUD_ONLINE_ANOMALY_THRESHOLD", "0.6"))
+ONLINE_ANOMALY_WINDOW = int(os.getenv("FRAUD_ONLINE_ANOMALY_WINDOW", "250"))
+ONLINE_ANOMALY_CHECKPOINT = os.getenv(
+    "FRAUD_ONLINE_ANOMALY_CHECKPOINT",
+    str(MODELS_DIR / "fraud" / "online_anomaly_state.npz")
+)
+ONLINE_ANOMALY_CHECKPOINT_SECONDS = float(os.getenv("FRAUD_ONLINE_ANOMALY_CHECKPOINT_SECONDS", "300"))
+ANOMALY_BACKEND = os.getenv("FRAUD_ANOMALY_BACKEND", "isolation_forest").lower()
+
+# /api/fraud/assess only computes explanations for scores at or above this
+ASSESS_EXPLAIN_MIN_SCORE = float(os.getenv("FRAUD_ASSESS_EXPLAIN_MIN_SCORE", "50"))
+
+# Cascade inference: the rule pre-screen settles scores below FRAUD_CASCADE_LOW
+# or at/above FRAUD_CASCADE_HIGH (rule points) without running the models, and
+# only scores at/above FRAUD_CASCADE_EXPLAIN_MIN_SCORE get SHAP explanations
+CASCADE_ENABLED = os.getenv("FRAUD_CASCADE", "false").lower() == "true"
+CASCADE_LOW = float(os.getenv("FRAUD_CASCADE_LOW", "20"))
+CASCADE_HIGH = float(os.getenv("FRAUD_CASCADE_HIGH", "101"))
+CASCADE_EXPLAIN_MIN_SCORE = float(os.getenv("FRAUD_CASCADE_EXPLAIN_MIN_SCORE", "30"))
+
+# Number of feature vectors whose SHAP contributions are kept for reuse
+EXPLANATION_CACHE_SIZE = int(os.getenv("FRAUD_EXPLANATION_CACHE_SIZE", "10000"))
+
+FEATURE_LABELS = {
+    'amount': 'Transaction Amount',
+    'amount_high': 'High Transaction Amount',
+    'amount_medium': 'Large Transaction Amount',
+    'amount_low': 'Elevated Transaction Amount',
+    'location_foreign': 'International Transaction',
+    'frequency': 'Transaction Frequency',
+    'frequency_high': 'High Transaction Frequency',
+    'frequency_medium': 'Elevated Transaction Frequency',
+    'type_withdrawal': 'Withdrawal',
+    'type_credit': 'Credit',
+    'avg_amount': 'User Average Amount',
+    'amount_deviation': 'Deviation From User Average'
+}
+
+FEATURE_FLAG_DESCRIPTIONS = {
+    'amount_high': ('Amount exceeds the $50,000 high-risk threshold', 'Amount is below $50,000'),
+    'amount_medium': ('Amount exceeds $10,000', 'Amount is below $10,000'),
+    'amount_low': ('Amount exceeds $5,000', 'Amount is below $5,000'),
+    'frequency_high': ('More than 10 transactions in the last 24 hours', 'At most 10 transactions in the last 24 hours'),
+    'frequency_medium': ('More than 5 transactions in the last 24 hours', 'At most 5 transactions in the last 24 hours'),
+    'type_withdrawal': ('Transaction is a withdrawal', 'Transaction is not a withdrawal'),
+    'type_credit': ('Transaction is a credit', 'Transaction is not a credit'),
+    'amount_deviation': ('Amount is more than 3x the user average', 'Amount is within 3x the user average')
+}
+
 class FraudDetectionService:
     def __init__(self):
         self.fraud_model = None
         self.anomaly_model = None
         self.shap_explainer = None
+        self.fraud_backend = None
+        self.anomaly_backend = None
+        self.scaler = None
+        self.rule_engine = None
+        self.risk_tables = RiskTables(default_country=HOME_COUNTRY)
+        self.feature_compiler = FeatureCompiler()
+        self.user_aggregates = UserAggregateStore(max_users=USER_AGGREGATES_MAX_USERS)
+        self.velocity_index = VelocityIndex(
+            max_age=VELOCITY_MAX_AGE_HOURS * 3600,
+            max_events_per_user=VELOCITY_MAX_EVENTS_PER_USER,
+            max_users=USER_AGGREGATES_MAX_USERS
+        )
+        self.entity_sketches = None
+        if ENTITY_SKETCHES_ENABLED:
+            self.entity_sketches = EntitySketches(
+                window_seconds=SKETCH_WINDOW_SECONDS,
+                bucket_seconds=SKETCH_BUCKET_SECONDS,
+                width=SKETCH_WIDTH,
+                depth=SKETCH_DEPTH,
+                registers=SKETCH_REGISTERS
+            )
+        self.transaction_graph = None
+        if GRAPH_ENABLED:
+            self.transaction_graph = TransactionGraph(
+                damping=GRAPH_DAMPING,
+                min_shared_merchants=GRAPH_MIN_SHARED_MERCHANTS,
+                max_merchant_degree=GRAPH_MAX_MERCHANT_DEGREE,
+                refresh_seconds=GRAPH_REFRESH_SECONDS
+            )
+        self.alert_queue = None
+        if ALERT_QUEUE_ENABLED:
+            self.alert_queue = AlertQueue(k=ALERT_TOP_K, half_life_hours=ALERT_HALF_LIFE_HOURS)
+        self.explanation_cache = LRUCache(maxsize=EXPLANATION_CACHE_SIZE)
+        self.online_anomaly = None
+        if ONLINE_ANOMALY_ENABLED:
+            self.online_anomaly = OnlineAnomalyDetector(
+                checkpoint_path=ONLINE_ANOMALY_CHECKPOINT,
+                checkpoint_interval=ONLINE_ANOMALY_CHECKPOINT_SECONDS,
+                threshold=ONLINE_ANOMALY_THRESHOLD,
+                window_size=ONLINE_ANOMALY_WINDOW
+            )
+        self.cascade = Cascade(CASCADE_LOW, CASCADE_HIGH, CASCADE_EXPLAIN_MIN_SCORE) if CASCADE_ENABLED else None
+        # Executor for the model calls in assess(); None uses the loop default
+        self.executor = None
+        # Called with every batch of recorded transactions (e.g. to refresh precomputed forecasts)
+        self.on_record = None
         self.load_models()
+        if self.transaction_graph is not None:
+            self.seed_graph()
+        if self.alert_queue is not None:
+            self.seed_alerts()
     
     def load_models(self):
         """Load trained models"""
         fraud_model_path = MODELS_DIR / "fraud" / "fraud_detection_model.pkl"
         anomaly_model_path = MODELS_DIR / "fraud" / "anomaly_detection_model.pkl"
         shap_explainer_path = MODELS_DIR / "fraud" / "shap_explainer.pkl"
+        scaler_path = MODELS_DIR / "fraud" / "fraud_scaler.pkl"
+        
+        # Rule table scores every request the models cannot
+        self.rule_engine = RuleEngine.load(RULES_PATH)
+        
+        # Lookup tables are memory-mapped, so loading is cheap at any size
+        self.risk_tables = RiskTables.load(RISK_TABLES_DIR, default_country=HOME_COUNTRY)
         
         # Load models if they exist, otherwise use fallback
         if fraud_model_path.exists():
@@ -46,61 +227,320 @@ class FraudDetectionService:
                 self.shap_explainer = joblib.load(shap_explainer_path)
             except Exception as e:
                 print(f"Warning: Could not load SHAP explainer: {e}")
+        
+        # The fraud model and SHAP explainer were trained on scaled features
+        if scaler_path.exists():
+            try:
+                self.scaler = joblib.load(scaler_path)
+                self.feature_compiler.set_scaler(self.scaler)
+            except Exception as e:
+                print(f"Warning: Could not load fraud scaler: {e}")
+        
+        # Compiled backends are only used when they match the original models
+        if COMPILED_INFERENCE and self.fraud_model is not None:
+            self.fraud_backend = compile_fraud_model(self.fraud_model)
+        if COMPILED_INFERENCE and self.anomaly_model is not None:
+            self.anomaly_backend = compile_anomaly_model(self.anomaly_model)
+    
+    def seed_graph(self):
+        """Load historical edges and seed risk into the transaction graph, then build it"""
+        graph = self.transaction_graph
+        if Path(GRAPH_HISTORY_PATH).exists():
+            try:
+                history = pd.read_csv(GRAPH_HISTORY_PATH, dtype=str)
+                merchants = history.get('merchant', history.get('merchantName'))
+                if 'userId' in history and merchants is not None:
+                    graph.add_edges(history['userId'].tolist(), merchants.tolist())
+                if 'isFlagged' in history and 'fraudScore' in history:
+                    flagged = history[history['isFlagged'].str.lower() == 'true']
+                    scores = pd.to_numeric(flagged['fraudScore'], errors='coerce').fillna(100)
+                    graph.seed_risk(flagged['userId'].tolist(), (scores / 100).tolist())
+            except Exception as e:
+                print(f"Warning: Could not load graph history from {GRAPH_HISTORY_PATH}: {e}")
+        
+        if Path(GRAPH_CASES_PATH).exists():
+            try:
+                cases = pd.read_csv(GRAPH_CASES_PATH, dtype=str)
+                open_cases = cases[cases['status'].str.lower() != 'resolved']
+                graph.seed_risk(open_cases['userId'].tolist(), [1.0] * len(open_cases))
+            except Exception as e:
+                print(f"Warning: Could not load AML cases from {GRAPH_CASES_PATH}: {e}")
+        
+        graph.refresh()
+    
+    def seed_alerts(self):
+        """Open an alert for every flagged transaction in the alert history file"""
+        if not Path(ALERT_HISTORY_PATH).exists():
+            return
+        try:
+            history = pd.read_csv(ALERT_HISTORY_PATH, dtype=str).fillna('')
+            flagged = history[history['isFlagged'].str.lower() == 'true']
+            scores = pd.to_numeric(flagged['fraudScore'], errors='coerce').fillna(100)
+            for row, score in zip(flagged.itertuples(index=False), scores):
+                self.alert_queue.upsert(row.id, row.userId, row.id, fraud_score=score, created_at=row.timestamp)
+        except Exception as e:
+            print(f"Warning: Could not load alert history from {ALERT_HISTORY_PATH}: {e}")
+    
+    def open_alerts(
+        self,
+        transactions: List[Dict[str, Any]],
+        fraud_scores: np.ndarray,
+        anomaly_scores: Optional[List[Optional[float]]] = None
+    ):
+        """Open or update alerts for transactions scored at or above ALERT_MIN_SCORE"""
+        if self.alert_queue is None:
+            return
+        for i, (transaction, fraud_score) in enumerate(zip(transactions, fraud_scores)):
+            transaction_id = transaction.get('id')
+            if fraud_score < ALERT_MIN_SCORE or not transaction_id:
+                continue
+            self.alert_queue.upsert(
+                str(transaction_id),
+                transaction.get('userId'),
+                str(transaction_id),
+                fraud_score=fraud_score,
+                anomaly_score=anomaly_scores[i] if anomaly_scores else None,
+                created_at=transaction.get('timestamp')
+            )
+    
+    def alert_page(self, sort: str = 'priority', offset: int = 0, limit: int = 50) -> Optional[Dict[str, Any]]:
+        """One page of open alerts from the in-memory ranking"""
+        if self.alert_queue is None:
+            return None
+        return self.alert_queue.page(sort, offset, limit)
+    
+    def compile_features(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ):
+        """Compile (raw, scaled) feature matrices, using per-user state when the client sends none"""
+        return self.feature_compiler.compile(
+            transactions, user_histories, self.user_aggregates, self.velocity_index,
+            self.entity_sketches, self.risk_tables, self.transaction_graph
+        )
+    
+    def record_transactions(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None,
+        raw: Optional[np.ndarray] = None,
+        scores: Optional[np.ndarray] = None
+    ):
+        """Fold scored transactions into the per-user state, entity sketches, graph and online anomaly detector"""
+        if user_histories:
+            for transaction, history in zip(transactions, user_histories):
+                user_id = transaction.get('userId')
+                if not history or user_id is None:
+                    continue
+                if user_id not in self.user_aggregates:
+                    self.user_aggregates.seed(user_id, (t.get('amount') or 0 for t in history))
+                if user_id not in self.velocity_index:
+                    timed = ((transaction_time(t), t.get('amount') or 0, transaction_id(t)) for t in history)
+                    self.velocity_index.seed(user_id, (event for event in timed if event[0] is not None))
+        
+        now = time.time()
+        times = [parse_timestamp(t.get('timestamp'), now) for t in transactions]
+        new = self.velocity_index.record_many(
+            (t.get('userId'), ts, t.get('amount') or 0, transaction_id(t)) for t, ts in zip(transactions, times)
+        )
+        if not all(new):
+            # Retried, rescanned or re-assessed transactions were folded in the first time
+            keep = np.flatnonzero(new)
+            transactions = [transactions[i] for i in keep]
+            times = [times[i] for i in keep]
+            raw = raw[keep] if raw is not None else None
+            scores = np.asarray(scores)[keep] if scores is not None else None
+            if not transactions:
+                return
+        
+        self.user_aggregates.update_many(
+            (t.get('userId') for t in transactions),
+            (t.get('amount') or 0 for t in transactions)
+        )
+        if self.entity_sketches is not None:
+            self.entity_sketches.record(transactions, times)
+        if self.transaction_graph is not None:
+            self.transaction_graph.add_transactions(transactions, scores)
+        if raw is not None and self.online_anomaly is not None:
+            self.online_anomaly.learn(raw)
+        if self.on_record is not None:
+            self.on_record(transactions)
+    
+    def checkpoint(self):
+        """Persist learned online state (called periodically and on shutdown)"""
+        if self.online_anomaly is not None:
+            self.online_anomaly.checkpoint()
+    
+    def velocity_stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the user's 1h/24h/7d transaction counts and sums, or None if unknown"""
+        return self.velocity_index.window_stats(user_id)
+    
+    def entity_activity(self, dimension: str, key: str) -> Optional[Dict[str, Any]]:
+        """Window transaction count and distinct users for one merchant, category or country"""
+        if self.entity_sketches is None or dimension not in SKETCH_DIMENSIONS:
+            return None
+        return {**self.entity_sketches.estimate(dimension, key), **self.entity_sketches.stats()}
+    
+    def graph_summary(self, limit: int = 10) -> Optional[Dict[str, Any]]:
+        """Graph size, components and the riskiest shared-merchant clusters"""
+        if self.transaction_graph is None:
+            return None
+        return self.transaction_graph.summary(limit)
+    
+    def graph_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Propagated risk, component and cluster of one user, or None if unknown"""
+        if self.transaction_graph is None:
+            return None
+        return self.transaction_graph.user_report(user_id)
     
     def extract_features(self, transaction: Dict[str, Any], user_history: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
-        """Extract features from transaction data"""
-        features = []
-        
-        # Amount-based features
-        amount = transaction.get('amount', 0)
-        features.append(amount)
-        features.append(1 if amount > 50000 else 0)
-        features.append(1 if amount > 10000 else 0)
-        features.append(1 if amount > 5000 else 0)
-        
-        # Location features
-        location = transaction.get('location') or transaction.get('country')
-        features.append(1 if location and location != "userCountry" else 0)
-        
-        # Frequency features
-        frequency = transaction.get('frequency', 0)
-        features.append(frequency)
-        features.append(1 if frequency > 10 else 0)
-        features.append(1 if frequency > 5 else 0)
-        
-        # Type features
-        tx_type = transaction.get('type', '')
-        features.append(1 if tx_type == 'withdrawal' else 0)
-        features.append(1 if tx_type == 'credit' else 0)
-        
-        # Time-based features (if timestamp available)
-        # Simplified for now
-        
-        # User history features
-        if user_history:
-            avg_amount = np.mean([t.get('amount', 0) for t in user_history]) if user_history else 0
-            features.append(avg_amount)
-            features.append(1 if amount > avg_amount * 3 else 0)
-        else:
-            features.extend([0, 0])
+        """Extract raw features from transaction data"""
+        raw, _ = self.compile_features([transaction], [user_history])
+        return raw
+    
+    def extract_features_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ) -> np.ndarray:
+        """Extract one raw feature matrix for a batch of transactions"""
+        raw, _ = self.compile_features(transactions, user_histories)
+        return raw
+    
+    def score_batch(self, raw: np.ndarray, scaled: np.ndarray) -> np.ndarray:
+        """Score a feature matrix with a single model call, falling back to rules"""
+        return self.score_batch_detailed(raw, scaled)[0]
+    
+    def score_batch_detailed(self, raw: np.ndarray, scaled: np.ndarray):
+        """Return (scores, fired rule mask, cascade stages).
+        
+        The mask is None when the model scored every row and the stages are
+        None unless the cascade is enabled.
+        """
+        if self.cascade is not None:
+            return self.cascade.score(raw, scaled, self.rule_engine.evaluate, self._model_scores)
         
-        return np.array(features).reshape(1, -1)
+        scores = self._model_scores(raw, scaled)
+        if scores is not None:
+            return scores, None, None
+        
+        # Fallback to rule-based scoring
+        scores, fired = self.rule_engine.evaluate(raw)
+        return scores, fired, None
     
-    async def detect_fraud(self, transaction: Dict[str, Any], user_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
-        """Detect fraud in a transaction"""
-        features = self.extract_features(transaction, user_history)
+    def _model_scores(self, raw: np.ndarray, scaled: np.ndarray) -> Optional[np.ndarray]:
+        """Score with the fraud model, or return None when no model can"""
+        if self.fraud_backend and len(raw) <= COMPILED_FRAUD_MAX_ROWS:
+            try:
+                return self.fraud_backend.predict_proba(scaled)[:, 1] * 100
+            except Exception as e:
+                print(f"Error using compiled fraud model: {e}")
         
         if self.fraud_model:
             try:
                 # Use trained model
-                fraud_score = self.fraud_model.predict_proba(features)[0][1] * 100
+                return self.fraud_model.predict_proba(scaled)[:, 1] * 100
             except Exception as e:
                 print(f"Error using fraud model: {e}")
-                fraud_score = self._rule_based_score(transaction)
-        else:
-            # Fallback to rule-based scoring
-            fraud_score = self._rule_based_score(transaction)
+        return None
+    
+    def cascade_stats(self) -> Dict[str, Any]:
+        """Cascade configuration and per-stage hit rates"""
+        if self.cascade is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cascade.stats()}
+    
+    async def detect_fraud(self, transaction: Dict[str, Any], user_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Detect fraud in a transaction"""
+        return self.score_transactions([transaction], [user_history])[0]
+    
+    async def detect_fraud_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Detect fraud in a batch of transactions with one vectorized model call"""
+        results = self.score_transactions(transactions, user_histories)
+        for transaction, result in zip(transactions, results):
+            result['transactionId'] = transaction.get('id')
+        return results
+    
+    def score_transactions(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Synchronously build detect_fraud results for a batch of transactions"""
+        if not transactions:
+            return []
+        
+        raw, scaled = self.compile_features(transactions, user_histories)
+        fraud_scores, fired, stages = self.score_batch_detailed(raw, scaled)
+        self.record_transactions(transactions, user_histories, raw, fraud_scores)
+        self.open_alerts(transactions, fraud_scores)
         
+        results = [self._build_fraud_result(fraud_score) for fraud_score in fraud_scores]
+        for i, result in enumerate(results):
+            if stages is not None:
+                result['stage'] = STAGE_NAMES[stages[i]]
+            if fired is not None and (stages is None or stages[i] != STAGE_MODEL):
+                result['rulesFired'] = self.rule_engine.fired_ids(fired[i])
+        return results
+    
+    def degraded_results(
+        self,
+        kind: str,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None,
+        record: bool = False,
+        explain: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """Rule-table results shaped like 'detect', 'explain' or 'assess' responses, marked degraded.
+        
+        Answers requests whose deadline leaves no time for the models.
+        record=True folds the transactions into per-user state, for when
+        no model call was started that would do it.
+        """
+        if not transactions:
+            return []
+        
+        raw, _ = self.compile_features(transactions, user_histories)
+        fraud_scores, fired = self.rule_engine.evaluate(raw)
+        if record:
+            self.record_transactions(transactions, user_histories, raw, fraud_scores)
+            self.open_alerts(transactions, fraud_scores)
+        
+        results = []
+        for i, transaction in enumerate(transactions):
+            analysis = self._build_fraud_result(fraud_scores[i])
+            analysis['rulesFired'] = self.rule_engine.fired_ids(fired[i])
+            if kind == 'detect':
+                result = analysis
+            elif kind == 'explain':
+                result = {
+                    'transactionId': transaction.get('id'),
+                    'fraudScore': analysis['score'],
+                    'isFlagged': analysis['fraudulent'],
+                    'topFeatures': self.rule_engine.explain(fired[i], raw[i])[:5],
+                    'explanation': '; '.join(analysis['recommendations']),
+                    'recommendations': analysis['recommendations']
+                }
+            else:
+                explained = explain if explain is not None else analysis['score'] >= ASSESS_EXPLAIN_MIN_SCORE
+                result = {
+                    'transactionId': transaction.get('id'),
+                    'fraud': analysis,
+                    'anomaly': None,
+                    'topFeatures': self.rule_engine.explain(fired[i], raw[i])[:5] if explained else None,
+                    'explained': bool(explained)
+                }
+            result['degraded'] = True
+            results.append(result)
+        return results
+    
+    def _build_fraud_result(self, fraud_score: float) -> Dict[str, Any]:
+        """Build the fraud response payload for a score"""
         is_fraudulent = fraud_score >= 70
         risk_level = 'high' if fraud_score >= 70 else ('medium' if fraud_score >= 30 else 'low')
         
@@ -114,126 +554,272 @@ class FraudDetectionService:
         
         return {
             'score': float(fraud_score),
-            'fraudulent': is_fraudulent,
+            'fraudulent': bool(is_fraudulent),
             'riskLevel': risk_level,
             'recommendations': recommendations
         }
     
     async def explain_fraud(self, transaction: Dict[str, Any], user_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """Explain why a transaction was flagged"""
-        features = self.extract_features(transaction, user_history)
-        analysis = await self.detect_fraud(transaction, user_history)
-        
-        # Feature contributions (simplified)
-        feature_names = [
-            'amount', 'amount_high', 'amount_medium', 'amount_low',
-            'location_foreign', 'frequency', 'frequency_high', 'frequency_medium',
-            'type_withdrawal', 'type_credit', 'avg_amount', 'amount_deviation'
-        ]
-        
-        top_features = []
-        amount = transaction.get('amount', 0)
-        location = transaction.get('location') or transaction.get('country')
-        frequency = transaction.get('frequency', 0)
+        return self.explain_batch([transaction], [user_history])[0]
+    
+    async def explain_fraud_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Explain a batch of transactions with one SHAP call"""
+        return self.explain_batch(transactions, user_histories)
+    
+    def explain_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_histories: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Score and explain transactions from one feature matrix"""
+        if not transactions:
+            return []
         
-        if amount > 50000:
-            top_features.append({
-                'feature': 'High Transaction Amount',
-                'contribution': 60,
-                'description': f'Transaction amount of ${amount} exceeds high-risk threshold',
-                'impact': 'high'
-            })
-        elif amount > 10000:
-            top_features.append({
-                'feature': 'Large Transaction Amount',
-                'contribution': 40,
-                'description': f'Transaction amount of ${amount} is significantly above average',
-                'impact': 'medium'
-            })
+        raw, scaled = self.compile_features(transactions, user_histories)
+        fraud_scores = self.score_batch(raw, scaled)
+        if self.cascade is not None:
+            # Low scorers get the cheap rule explanation instead of SHAP
+            explained = np.flatnonzero(self.cascade.explain_mask(fraud_scores))
+            contributions = [None] * len(transactions)
+            for i, row in zip(explained, self.cached_contributions(scaled[explained])):
+                contributions[i] = row
+        else:
+            contributions = self.cached_contributions(scaled)
         
-        if location and location != 'US':
-            top_features.append({
-                'feature': 'International Transaction',
-                'contribution': 30,
-                'description': f'Transaction from country: {location}',
-                'impact': 'medium'
+        results = []
+        for i, transaction in enumerate(transactions):
+            analysis = self._build_fraud_result(fraud_scores[i])
+            if contributions[i] is not None:
+                top_features = self._rank_features(transaction, raw[i], contributions[i])
+            else:
+                top_features = self._rule_based_explanation(raw[i])
+            
+            results.append({
+                'transactionId': transaction.get('id'),
+                'fraudScore': analysis['score'],
+                'isFlagged': analysis['fraudulent'],
+                'topFeatures': top_features,
+                'explanation': '; '.join(analysis['recommendations']),
+                'recommendations': analysis['recommendations']
             })
+        return results
+    
+    def cached_contributions(self, scaled: np.ndarray) -> List[Optional[np.ndarray]]:
+        """Per-row feature contributions, computing only cache misses in one SHAP call"""
+        keys = [row_key(row) for row in scaled]
+        contributions = [self.explanation_cache.get(key) for key in keys]
         
-        if frequency > 10:
-            top_features.append({
-                'feature': 'High Transaction Frequency',
-                'contribution': 30,
-                'description': f'User has made {frequency} transactions in the last 24 hours',
-                'impact': 'medium'
-            })
+        # Identical rows within the batch share one computation
+        missing: Dict[bytes, List[int]] = {}
+        for i, row in enumerate(contributions):
+            if row is None:
+                missing.setdefault(keys[i], []).append(i)
+        if not missing:
+            return contributions
         
-        # Use SHAP if available
-        if self.shap_explainer and self.fraud_model:
+        first_rows = [rows[0] for rows in missing.values()]
+        computed = self.feature_contributions(scaled[first_rows])
+        if computed is not None:
+            for (key, rows), row in zip(missing.items(), computed):
+                self.explanation_cache.put(key, row)
+                for i in rows:
+                    contributions[i] = row
+        return contributions
+    
+    def feature_contributions(self, scaled: np.ndarray) -> Optional[np.ndarray]:
+        """TreeSHAP contributions (log-odds) per feature for a scaled feature matrix"""
+        if self.shap_explainer is not None:
             try:
-                shap_values = self.shap_explainer.shap_values(features)
-                # Process SHAP values for top features
-                # This is simplified - actual implementation would rank features
+                values = self.shap_explainer.shap_values(scaled)
+                # Older shap versions return one array per class
+                if isinstance(values, list):
+                    values = values[-1]
+                values = np.asarray(values, dtype=np.float64)
+                if values.ndim == 3:
+                    values = values[:, :, -1]
+                return values
             except Exception as e:
                 print(f"Error using SHAP explainer: {e}")
         
-        return {
-            'transactionId': transaction.get('id'),
-            'fraudScore': analysis['score'],
-            'isFlagged': analysis['fraudulent'],
-            'topFeatures': sorted(top_features, key=lambda x: x['contribution'], reverse=True)[:5],
-            'explanation': '; '.join(analysis['recommendations']),
-            'recommendations': analysis['recommendations']
-        }
+        # XGBoost computes the same TreeSHAP values natively
+        if self.fraud_model is not None and hasattr(self.fraud_model, 'get_booster'):
+            try:
+                import xgboost as xgb
+                values = self.fraud_model.get_booster().predict(xgb.DMatrix(scaled), pred_contribs=True)
+                # Last column is the bias term
+                return np.asarray(values[:, :-1], dtype=np.float64)
+            except Exception as e:
+                print(f"Error computing XGBoost contributions: {e}")
+        
+        return None
+    
+    def _rank_features(self, transaction: Dict[str, Any], raw: np.ndarray, contributions: np.ndarray, limit: int = 5) -> List[Dict[str, Any]]:
+        """Rank features by absolute contribution; positive values push towards fraud"""
+        total = np.abs(contributions).sum()
+        if total == 0:
+            return []
+        
+        top_features = []
+        for i in np.argsort(-np.abs(contributions))[:limit]:
+            value = float(contributions[i])
+            if value == 0:
+                break
+            share = float(100 * abs(value) / total)
+            name = FEATURE_NAMES[i]
+            top_features.append({
+                'feature': FEATURE_LABELS[name],
+                'contribution': round(share if value > 0 else -share, 2),
+                'shapValue': value,
+                'description': self._describe_feature(name, transaction, raw),
+                'impact': 'high' if share >= 40 else ('medium' if share >= 15 else 'low')
+            })
+        return top_features
+    
+    def _describe_feature(self, name: str, transaction: Dict[str, Any], raw: np.ndarray) -> str:
+        """Human readable description of a feature's value for a transaction"""
+        value = raw[FEATURE_INDEX[name]]
+        if name == 'amount':
+            return f'Transaction amount of ${value:,.2f}'
+        if name == 'frequency':
+            return f'User has made {value:g} transactions in the last 24 hours'
+        if name == 'avg_amount':
+            return f'User average transaction amount is ${value:,.2f}' if value else 'No user history available'
+        if name == 'location_foreign':
+            location = transaction.get('location') or transaction.get('country')
+            home = self.risk_tables.home_country(transaction.get('userId'))
+            if not value:
+                return 'Domestic transaction'
+            return f'Transaction from {location}, outside home country {home}' if home else f'Transaction from country: {location}'
+        
+        present, absent = FEATURE_FLAG_DESCRIPTIONS[name]
+        return present if value else absent
+    
+    def _rule_based_explanation(self, raw: np.ndarray) -> List[Dict[str, Any]]:
+        """Explain a raw feature row by the rules that fire, used when no model contributions are available"""
+        _, fired = self.rule_engine.evaluate(raw[None, :])
+        return self.rule_engine.explain(fired[0], raw)[:5]
     
     async def detect_anomaly(self, transaction: Dict[str, Any], user_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """Detect anomalies in transaction patterns"""
-        features = self.extract_features(transaction, user_history)
+        raw, scaled = self.compile_features([transaction], [user_history])
+        anomaly_scores, is_anomaly, severities = self.score_anomaly_detailed(raw, scaled)
+        result = self._build_anomaly_result(anomaly_scores[0], is_anomaly[0], severities[0])
+        if self.online_anomaly is not None:
+            online_scores, online_flags = self.online_anomaly.score(raw)
+            result['online'] = {
+                'score': float(online_scores[0]),
+                'isAnomaly': bool(online_flags[0]),
+                'warm': self.online_anomaly.is_warm
+            }
+        return result
+    
+    def score_anomaly_batch(
+        self,
+        raw: np.ndarray,
+        scaled: np.ndarray,
+        fraud_scores: Optional[np.ndarray] = None
+    ):
+        """Return (anomaly scores, anomaly flags) for a feature matrix"""
+        anomaly_scores, is_anomaly, _ = self.score_anomaly_detailed(raw, scaled, fraud_scores)
+        return anomaly_scores, is_anomaly
+    
+    def score_anomaly_detailed(
+        self,
+        raw: np.ndarray,
+        scaled: np.ndarray,
+        fraud_scores: Optional[np.ndarray] = None
+    ):
+        """Return (anomaly scores, anomaly flags, severities) for a feature matrix.
+        
+        Each backend scores on its own scale; the severity puts them all on
+        0-100 where higher is more anomalous.
+        """
+        if ANOMALY_BACKEND == 'online' and self.online_anomaly is not None and self.online_anomaly.is_warm:
+            # Same sign convention as decision_function(): negative is anomalous
+            online_scores, online_flags = self.online_anomaly.score(raw)
+            return self.online_anomaly.threshold - online_scores, online_flags, np.clip(online_scores * 100, 0, 100)
         
-        if self.anomaly_model:
+        anomaly_model = self.anomaly_model
+        if self.anomaly_backend and (anomaly_model is None or len(raw) <= COMPILED_ANOMALY_MAX_ROWS):
+            anomaly_model = self.anomaly_backend
+        if anomaly_model:
             try:
-                anomaly_score = self.anomaly_model.decision_function(features)[0]
-                is_anomaly = self.anomaly_model.predict(features)[0] == -1
+                # predict() is decision_function() < 0, so one call gives both
+                anomaly_scores = np.asarray(anomaly_model.decision_function(raw[:, :N_FEATURES]), dtype=np.float64)
+                return anomaly_scores, anomaly_scores < 0, np.clip(-anomaly_scores * 100, 0, 100)
             except Exception as e:
                 print(f"Error using anomaly model: {e}")
-                is_anomaly = False
-                anomaly_score = 0
-        else:
-            # Fallback: use fraud detection score
-            analysis = await self.detect_fraud(transaction, user_history)
-            is_anomaly = analysis['fraudulent']
-            anomaly_score = analysis['score'] / 100
+                return np.zeros(len(raw)), np.zeros(len(raw), dtype=bool), np.zeros(len(raw))
         
+        # Fallback: use fraud detection score
+        if fraud_scores is None:
+            fraud_scores = self.score_batch(raw, scaled)
+        return fraud_scores / 100, fraud_scores >= 70, np.clip(fraud_scores, 0, 100)
+    
+    def _build_anomaly_result(self, anomaly_score: float, is_anomaly: bool, severity: float) -> Dict[str, Any]:
+        """Build the anomaly response payload; normalizedScore is the 0-100 severity"""
         return {
             'isAnomaly': bool(is_anomaly),
             'anomalyScore': float(anomaly_score),
-            'normalizedScore': float(min(max(anomaly_score * 100, 0), 100))
+            'normalizedScore': float(severity)
         }
     
-    def _rule_based_score(self, transaction: Dict[str, Any]) -> float:
-        """Fallback rule-based scoring"""
-        score = 0
-        amount = transaction.get('amount', 0)
+    async def assess(
+        self,
+        transaction: Dict[str, Any],
+        user_history: Optional[List[Dict[str, Any]]] = None,
+        explain: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """Score, anomaly-check and (when warranted) explain a transaction in one pass.
         
-        if amount > 50000:
-            score += 60
-        elif amount > 10000:
-            score += 40
-        elif amount > 5000:
-            score += 20
+        explain=None explains only scores at or above ASSESS_EXPLAIN_MIN_SCORE.
+        With the cascade enabled, anomaly is None for rows the pre-screen settled.
+        """
+        raw, scaled = self.compile_features([transaction], [user_history])
+        # The compiled buffers are reused by the next request on this thread,
+        # so the worker threads below get their own copy
+        raw, scaled = raw.copy(), scaled.copy()
         
-        location = transaction.get('location') or transaction.get('country')
-        if location and location != "userCountry":
-            score += 30
+        loop = asyncio.get_running_loop()
+        if self.cascade is None:
+            fraud_scores, (anomaly_scores, is_anomaly, severities) = await asyncio.gather(
+                loop.run_in_executor(self.executor, self.score_batch, raw, scaled),
+                loop.run_in_executor(self.executor, self.score_anomaly_detailed, raw, scaled)
+            )
+            anomaly = self._build_anomaly_result(anomaly_scores[0], is_anomaly[0], severities[0])
+        else:
+            # Rows the pre-screen settles skip the anomaly model as well
+            fraud_scores, _, stages = await loop.run_in_executor(self.executor, self.score_batch_detailed, raw, scaled)
+            anomaly = None
+            if stages[0] in (STAGE_MODEL, STAGE_PRESCREEN_FALLBACK):
+                anomaly_scores, is_anomaly, severities = await loop.run_in_executor(
+                    self.executor, self.score_anomaly_detailed, raw, scaled
+                )
+                anomaly = self._build_anomaly_result(anomaly_scores[0], is_anomaly[0], severities[0])
+        self.record_transactions([transaction], [user_history], raw, fraud_scores)
+        self.open_alerts([transaction], fraud_scores, [anomaly['normalizedScore'] if anomaly else None])
         
-        frequency = transaction.get('frequency', 0)
-        if frequency > 10:
-            score += 30
-        elif frequency > 5:
-            score += 15
+        fraud_score = fraud_scores[0]
+        if explain is None:
+            explain = fraud_score >= ASSESS_EXPLAIN_MIN_SCORE
         
-        tx_type = transaction.get('type', '')
-        if tx_type == 'withdrawal' and amount > 5000:
-            score += 20
+        top_features = None
+        if explain:
+            contributions = (await loop.run_in_executor(self.executor, self.cached_contributions, scaled))[0]
+            if contributions is not None:
+                top_features = self._rank_features(transaction, raw[0], contributions)
+            else:
+                top_features = self._rule_based_explanation(raw[0])
         
-        return min(score, 100)
-
+        return {
+            'transactionId': transaction.get('id'),
+            'fraud': self._build_fraud_result(fraud_score),
+            'anomaly': anomaly,
+            'topFeatures': top_features,
+            'explained': bool(explain)
+        }
@@ -0,0 +1,114 @@
+"""
+Service Metrics
+In-process counters, gauges and histograms exposed by the /metrics endpoint
+"""
+
+import bisect
+import threading
+from typing import Dict, Any, List, Optional, Sequence
+
+
+class Counter:
+    """Monotonic counter"""
+    
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+    
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Gauge:
+    """Last value set"""
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = value
+    
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are cumulative like Prometheus"""
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+    
+    def observe_many(self, values: Sequence[float]):
+        with self._lock:
+            for value in values:
+                self.counts[bisect.bisect_left(self.buckets, value)] += 1
+                self.sum += value
+            self.count += len(values)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + ['+Inf'], counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+            'buckets': buckets
+        }
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, created on first use"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter()
+            return self._metrics[name]
+    
+    def gauge(self, name: str) -> Gauge:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Gauge()
+            return self._metrics[name]
+    
+    def histogram(self, name: str, buckets: Optional[Sequence[float]] = None) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(buckets or LATENCY_MS_BUCKETS)
+            return self._metrics[name]
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every metric's current value keyed by name"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+LATENCY_MS_BUCKETS: List[float] = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+registry = MetricsRegistry()
@@ -0,0 +1,96 @@
+"""
+Micro Batcher
+Coalesces concurrent single-item requests into vectorized batch calls
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple, Union
+
+from ml_service.services.metrics import registry
+
+
+class MicroBatcher:
+    """Collect items for up to max_wait_ms or max_batch_size, then process them together.
+    
+    process_batch receives a list of items and must return (or return an
+    awaitable of) one result per item in the same order.
+    """
+    
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Union[List[Any], Awaitable[List[Any]]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        name: str = 'batcher'
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.Handle] = None
+        # The loop only holds weak references to tasks; keep in-flight batches alive
+        self._running: Set[asyncio.Task] = set()
+        
+        size_buckets = [2 ** i for i in range(self.max_batch_size.bit_length() + 1)]
+        self.batch_sizes = registry.histogram(f'{name}_batch_size', size_buckets)
+        self.wait_times = registry.histogram(f'{name}_batch_wait_ms')
+        self.batch_errors = registry.counter(f'{name}_batch_errors')
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        # Anything left over starts a new window right away
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_soon(self._flush)
+        
+        now = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        self.wait_times.observe_many([(now - queued_at) * 1000 for _, _, queued_at in batch])
+        task = asyncio.ensure_future(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+    
+    async def close(self):
+        """Flush anything still queued and wait for in-flight batches to finish"""
+        self._flush()
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+    
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if inspect.isawaitable(results):
+                results = await results
+        except Exception as e:
+            self.batch_errors.inc()
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future, _), result in zip(batch, results):
+            # The caller may have gone away (e.g. request cancelled)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,271 @@
+"""
+Online Anomaly Detection
+Half-Space Trees that learn from the live transaction stream in constant time
+and memory per event
+"""
+
+import os
+import time
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from ml_service.services.fraud_features import FEATURE_INDEX, N_FEATURES
+
+# Unbounded features are log-compressed into [0, 1] against these caps;
+# every other fraud feature is already a 0/1 flag
+LOG_FEATURE_CAPS = {'amount': 1e7, 'avg_amount': 1e7, 'frequency': 1e3}
+
+
+def normalize_features(raw: np.ndarray) -> np.ndarray:
+    """Map raw fraud features onto the unit hypercube the trees partition"""
+    X = np.clip(np.asarray(raw[:, :N_FEATURES], dtype=np.float64), 0, None)
+    for name, cap in LOG_FEATURE_CAPS.items():
+        i = FEATURE_INDEX[name]
+        X[:, i] = np.minimum(np.log1p(X[:, i]) / np.log1p(cap), 1)
+    return X
+
+
+class HalfSpaceTrees:
+    """Streaming anomaly detector (Tan, Ting & Liu, 2011).
+    
+    Each tree is a complete binary tree of fixed depth over randomly
+    perturbed half-spaces of [0, 1]^d. Nodes count the mass of the
+    reference window (r) and of the window being filled (l); every
+    window_size events l becomes the new r. A point scores as anomalous
+    when it lands in regions that held little mass in the reference
+    window. Learning and scoring visit depth+1 nodes per tree, so the
+    cost per event is constant and memory is fixed by n_trees and depth.
+    """
+    
+    def __init__(
+        self,
+        n_features: int = N_FEATURES,
+        n_trees: int = 25,
+        depth: int = 10,
+        window_size: int = 250,
+        size_limit: Optional[float] = None,
+        seed: int = 0
+    ):
+        self.n_features = n_features
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.size_limit = size_limit if size_limit is not None else 0.1 * window_size
+        self.seed = seed
+        
+        n_nodes = 2 ** (depth + 1) - 1
+        self.split_dim = np.zeros((n_trees, n_nodes), dtype=np.int16)
+        self.split_value = np.zeros((n_trees, n_nodes))
+        self.r_mass = np.zeros((n_trees, n_nodes))
+        self.l_mass = np.zeros((n_trees, n_nodes))
+        self.filled = 0
+        self.windows = 0
+        self._build(np.random.default_rng(seed))
+        self._lock = threading.Lock()
+        self._offsets = np.arange(n_trees) * n_nodes
+    
+    def _build(self, rng: np.random.Generator):
+        """Random work spaces and mid-point splits, laid out heap-style"""
+        n_internal = 2 ** self.depth - 1
+        for t in range(self.n_trees):
+            # Work space per dimension: a random point widened to cover [0, 1]
+            sq = rng.random(self.n_features)
+            width = 2 * np.maximum(sq, 1 - sq)
+            lo = np.repeat((sq - width)[None, :], n_internal * 2 + 1, axis=0)
+            hi = np.repeat((sq + width)[None, :], n_internal * 2 + 1, axis=0)
+            for node in range(n_internal):
+                q = rng.integers(self.n_features)
+                mid = (lo[node, q] + hi[node, q]) / 2
+                self.split_dim[t, node] = q
+                self.split_value[t, node] = mid
+                left, right = 2 * node + 1, 2 * node + 2
+                lo[left], hi[left] = lo[node], hi[node]
+                lo[right], hi[right] = lo[node], hi[node]
+                hi[left, q] = mid
+                lo[right, q] = mid
+    
+    @property
+    def is_warm(self) -> bool:
+        """True once a full reference window has been observed"""
+        return self.windows > 0
+    
+    def _paths(self, X: np.ndarray) -> np.ndarray:
+        """Flat (tree, node) index visited at each depth, shape (depth + 1, rows, trees)"""
+        n = len(X)
+        split_dim = self.split_dim.ravel()
+        split_value = self.split_value.ravel()
+        paths = np.empty((self.depth + 1, n, self.n_trees), dtype=np.int64)
+        rows = np.arange(n)[:, None]
+        node = np.zeros((n, self.n_trees), dtype=np.int64)
+        paths[0] = self._offsets
+        for d in range(self.depth):
+            flat = paths[d]
+            right = X[rows, split_dim[flat]] >= split_value[flat]
+            node = 2 * node + 1 + right
+            paths[d + 1] = node + self._offsets
+        return paths
+    
+    def learn(self, raw: np.ndarray):
+        """Add a batch of raw feature rows to the latest window"""
+        X = normalize_features(raw)
+        with self._lock:
+            start = 0
+            while start < len(X):
+                # Split the batch at window boundaries so every row lands in the right window
+                stop = min(len(X), start + self.window_size - self.filled)
+                paths = self._paths(X[start:stop]).ravel()
+                l_mass = self.l_mass.reshape(-1)
+                if stop - start == 1:
+                    # One row visits each (tree, node) at most once
+                    l_mass[paths] += 1
+                else:
+                    l_mass += np.bincount(paths, minlength=l_mass.size)
+                self.filled += stop - start
+                start = stop
+                if self.filled >= self.window_size:
+                    self.r_mass, self.l_mass = self.l_mass, np.zeros_like(self.l_mass)
+                    self.filled = 0
+                    self.windows += 1
+    
+    def score(self, raw: np.ndarray) -> np.ndarray:
+        """Anomaly score in [0, 1] per row; higher is more anomalous.
+        
+        Each tree contributes the classic HS-Trees mass r * 2^depth at the
+        node where the descent stops (the first node below size_limit, or a
+        leaf). Its log is divided by the log of the largest possible mass,
+        window_size * 2^depth, and the score is 1 minus the tree average.
+        """
+        X = normalize_features(raw)
+        with self._lock:
+            paths = self._paths(X)
+            mass = self.r_mass.reshape(-1)[paths]
+        
+        sparse = mass < self.size_limit
+        # Depth of the first sparse node, or the leaf when none is sparse
+        stop = np.where(sparse.any(axis=0), sparse.argmax(axis=0), self.depth)
+        stop_mass = np.take_along_axis(mass, stop[None], axis=0)[0]
+        normal = np.log2(1 + stop_mass * np.exp2(stop)) / np.log2(1 + self.window_size * 2 ** self.depth)
+        return np.clip(1 - normal.mean(axis=1), 0, 1)
+    
+    def state_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'config': np.array([self.n_features, self.n_trees, self.depth, self.window_size, self.seed]),
+                'size_limit': np.array(self.size_limit),
+                'split_dim': self.split_dim,
+                'split_value': self.split_value,
+                'r_mass': self.r_mass.copy(),
+                'l_mass': self.l_mass.copy(),
+                'counters': np.array([self.filled, self.windows])
+            }
+    
+    def save(self, path: Union[str, Path]):
+        """Write a checkpoint atomically, so a crash never leaves a torn file.
+        
+        Each save writes its own temporary file next to the checkpoint, so
+        concurrent saves cannot interleave; the last replace wins.
+        """
+        path = Path(path)
+        state = self.state_dict()
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.stem}.', suffix='.tmp.npz', delete=False) as f:
+            tmp_path = f.name
+        try:
+            np.savez(tmp_path, **state)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'HalfSpaceTrees':
+        with np.load(path) as state:
+            n_features, n_trees, depth, window_size, seed = (int(v) for v in state['config'])
+            model = cls.__new__(cls)
+            model.n_features, model.n_trees, model.depth = n_features, n_trees, depth
+            model.window_size, model.seed = window_size, seed
+            model.size_limit = float(state['size_limit'])
+            model.split_dim = state['split_dim']
+            model.split_value = state['split_value']
+            model.r_mass = state['r_mass']
+            model.l_mass = state['l_mass']
+            model.filled, model.windows = (int(v) for v in state['counters'])
+        model._lock = threading.Lock()
+        model._offsets = np.arange(n_trees) * model.split_dim.shape[1]
+        return model
+
+
+class OnlineAnomalyDetector:
+    """HalfSpaceTrees with periodic checkpoints to disk.
+    
+    The first learn() call after each interval claims the checkpoint and
+    writes it on a background thread, so scoring requests never wait on
+    disk and concurrent callers never write at the same time.
+    """
+    
+    def __init__(
+        self,
+        checkpoint_path: Optional[Union[str, Path]] = None,
+        checkpoint_interval: float = 300.0,
+        threshold: float = 0.6,
+        **tree_params
+    ):
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_interval = checkpoint_interval
+        self.threshold = threshold
+        self.trees = None
+        self._last_checkpoint = time.monotonic()
+        self._claim_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        
+        if self.checkpoint_path is not None and self.checkpoint_path.exists():
+            try:
+                self.trees = HalfSpaceTrees.load(self.checkpoint_path)
+            except Exception as e:
+                print(f"Warning: Could not load online anomaly checkpoint: {e}")
+        if self.trees is None:
+            self.trees = HalfSpaceTrees(**tree_params)
+    
+    @property
+    def is_warm(self) -> bool:
+        return self.trees.is_warm
+    
+    def learn(self, raw: np.ndarray):
+        """Update the trees and start a background checkpoint when the interval has passed"""
+        self.trees.learn(raw)
+        if self.checkpoint_path is not None and self._claim_checkpoint():
+            threading.Thread(target=self._write_checkpoint, name='online-anomaly-checkpoint', daemon=True).start()
+    
+    def _claim_checkpoint(self) -> bool:
+        """True for exactly one caller once the interval has passed"""
+        now = time.monotonic()
+        with self._claim_lock:
+            if now - self._last_checkpoint < self.checkpoint_interval:
+                return False
+            self._last_checkpoint = now
+            return True
+    
+    def score(self, raw: np.ndarray):
+        """Return (scores, flags); flags are all False until the first window completes"""
+        scores = self.trees.score(raw)
+        if not self.is_warm:
+            return scores, np.zeros(len(scores), dtype=bool)
+        return scores, scores >= self.threshold
+    
+    def checkpoint(self):
+        """Write a checkpoint now (e.g. on shutdown), after any background write in progress"""
+        with self._claim_lock:
+            self._last_checkpoint = time.monotonic()
+        self._write_checkpoint()
+    
+    def _write_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        with self._write_lock:
+            try:
+                self.trees.save(self.checkpoint_path)
+            except Exception as e:
+                print(f"Warning: Could not write online anomaly checkpoint: {e}")
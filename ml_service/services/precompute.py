@@ -0,0 +1,226 @@
+"""
+Precompute Scheduler
+Background refresh of per-user forecasts and default-risk scores for
+recently active users, so dashboard requests are answered from the store
+"""
+
+import time
+import heapq
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+from ml_service.services.metrics import registry
+from ml_service.services.forecast_engine import latest_marker, row_time
+
+
+class PrecomputeScheduler:
+    """Recompute recently active users' forecasts and risk scores on a cadence.
+    
+    Online requests register what a user asked for (touch_forecast,
+    touch_risk) together with the data it was computed from. Transactions
+    scored by the fraud service go into a per-user buffer of the newest
+    `max_recent` and mark the user as changed; when a batch is taken, each
+    data set is extended with the buffered transactions newer than its own
+    newest row. Every pass picks up to `batch_size` users seen within
+    `active_seconds` that changed or were last computed more than
+    `interval_seconds` ago, changed users first and then the most recently
+    seen, and hands them to `compute`.
+    
+    The scheduler idles long enough after each batch that it is busy at
+    most `cpu_share` of the time, and defers while `busy()` reports that
+    live traffic has saturated its workers.
+    """
+    
+    def __init__(
+        self,
+        compute: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        interval_seconds: float = 300.0,
+        active_seconds: float = 86400.0,
+        cpu_share: float = 0.2,
+        batch_size: int = 100,
+        max_users: int = 100000,
+        max_recent: int = 1000,
+        poll_seconds: float = 1.0,
+        busy: Optional[Callable[[], bool]] = None,
+        name: str = 'precompute'
+    ):
+        self.compute = compute
+        self.interval = interval_seconds
+        self.active = active_seconds
+        self.cpu_share = min(max(cpu_share, 0.01), 1.0)
+        self.batch_size = batch_size
+        self.max_users = max_users
+        self.max_recent = max_recent
+        self.poll = poll_seconds
+        self.busy = busy
+        self.users: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        
+        self.computed = registry.counter(f'{name}_users')
+        self.batches = registry.counter(f'{name}_batches')
+        self.errors = registry.counter(f'{name}_errors')
+        self.deferred = registry.counter(f'{name}_deferred')
+        self.busy_seconds = registry.counter(f'{name}_busy_seconds')
+        self.batch_ms = registry.histogram(f'{name}_batch_ms')
+    
+    def __len__(self) -> int:
+        return len(self.users)
+    
+    def _entry(self, user_id: Any) -> Dict[str, Any]:
+        """The user's entry, marked as just seen; callers hold the lock"""
+        entry = self.users.get(user_id)
+        if entry is None:
+            entry = self.users[user_id] = {
+                'userId': user_id,
+                'forecasts': set(),
+                'history': [],
+                'historyNewest': None,
+                'risk': None,
+                'riskNewest': None,
+                'recent': deque(maxlen=self.max_recent),
+                'changed': True,
+                'computedAt': 0.0
+            }
+        entry['lastSeen'] = time.time()
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+        return entry
+    
+    def touch_forecast(self, user_id: Any, target: str, period: str, months: int, history: List[Dict[str, Any]]):
+        """Record a forecast request so it is kept precomputed"""
+        newest = latest_marker(history)
+        with self._lock:
+            entry = self._entry(user_id)
+            entry['forecasts'].add((target, period, months))
+            entry['history'] = history
+            entry['historyNewest'] = newest[0] if newest else None
+    
+    def touch_risk(self, user_id: Any, transactions: List[Dict[str, Any]], average_income: float):
+        """Record a default-risk request so it is kept precomputed"""
+        newest = latest_marker(transactions)
+        with self._lock:
+            entry = self._entry(user_id)
+            entry['risk'] = (transactions, average_income)
+            entry['riskNewest'] = newest[0] if newest else None
+    
+    def record_transactions(self, transactions: List[Dict[str, Any]]):
+        """Buffer newly scored transactions of tracked users and mark them changed"""
+        with self._lock:
+            for transaction in transactions:
+                entry = self.users.get(transaction.get('userId'))
+                if entry is None:
+                    continue
+                entry['recent'].append(transaction)
+                entry['changed'] = True
+    
+    @staticmethod
+    def _extend(rows: List[Dict[str, Any]], newest: Optional[float], recent: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """rows plus the buffered transactions newer than their newest row"""
+        if newest is None:
+            return rows + recent
+        newer = [t for t in recent if (row_time(t) or 0.0) > newest]
+        return rows + newer if newer else rows
+    
+    def due(self, now: float) -> List[Dict[str, Any]]:
+        """Snapshot of the next users to recompute, highest priority first"""
+        with self._lock:
+            candidates = [
+                entry for entry in self.users.values()
+                if entry['lastSeen'] >= now - self.active
+                and (entry['forecasts'] or entry['risk'] is not None)
+                and (entry['changed'] or entry['computedAt'] <= now - self.interval)
+            ]
+            chosen = heapq.nsmallest(
+                self.batch_size, candidates, key=lambda entry: (not entry['changed'], -entry['lastSeen'])
+            )
+            batch = []
+            for entry in chosen:
+                entry['changed'] = False
+                entry['computedAt'] = now
+                recent = list(entry['recent'])
+                risk = entry['risk']
+                batch.append({
+                    'userId': entry['userId'],
+                    'forecasts': sorted(entry['forecasts']),
+                    'history': self._extend(entry['history'], entry['historyNewest'], recent),
+                    'risk': (self._extend(risk[0], entry['riskNewest'], recent), risk[1]) if risk is not None else None
+                })
+            return batch
+    
+    async def run_once(self) -> int:
+        """Compute one batch of due users; returns how many were computed"""
+        batch = self.due(time.time())
+        if not batch:
+            return 0
+        start = time.monotonic()
+        try:
+            await self.compute(batch)
+        except Exception as e:
+            # The users are retried once their interval has passed again
+            self.errors.inc()
+            print(f"Warning: Precompute batch failed: {e}")
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            self.busy_seconds.inc(elapsed)
+            self.batch_ms.observe(elapsed * 1000)
+        self.batches.inc()
+        self.computed.inc(len(batch))
+        return len(batch)
+    
+    async def run(self):
+        """Scheduler loop; runs until cancelled"""
+        while True:
+            if self.busy is not None and self.busy():
+                self.deferred.inc()
+                await asyncio.sleep(self.poll)
+                continue
+            
+            start = time.monotonic()
+            try:
+                computed = await self.run_once()
+            except Exception:
+                computed = 0
+            if not computed:
+                await asyncio.sleep(self.poll)
+                continue
+            # Idle in proportion to the work done to stay within the CPU share
+            busy = time.monotonic() - start
+            await asyncio.sleep(busy * (1 - self.cpu_share) / self.cpu_share)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            tracked = len(self.users)
+            active = sum(1 for entry in self.users.values() if entry['lastSeen'] >= now - self.active)
+            changed = sum(1 for entry in self.users.values() if entry['changed'])
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'trackedUsers': tracked,
+            'activeUsers': active,
+            'changedUsers': changed,
+            'computedUsers': self.computed.value,
+            'batches': self.batches.value,
+            'errors': self.errors.value,
+            'deferred': self.deferred.value,
+            'busySeconds': self.busy_seconds.value,
+            'intervalSeconds': self.interval,
+            'cpuShare': self.cpu_share
+        }
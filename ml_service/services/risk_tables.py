@@ -0,0 +1,283 @@
+"""
+Risk Lookup Tables
+Merchant and category fraud rates and user home countries, built offline from
+transaction history and memory-mapped at startup behind perfect-hash indexes
+"""
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Union
+
+from ml_service.services.cache import key_hash
+
+# Raw feature columns read from the rate tables
+RISK_FEATURE_NAMES = ['merchant_fraud_rate', 'category_fraud_rate']
+
+# Rate tables written by write_risk_tables(), keyed by the transaction field
+RATE_TABLES = ('merchant', 'category')
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX = np.uint64(0xFF51AFD7ED558CCD)
+_SHIFT = np.uint64(33)
+
+
+def _mix(hashes: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    """Remix 64-bit key hashes with per-bucket seeds (murmur3 finalizer)"""
+    x = hashes ^ (seeds.astype(np.uint64) * _GOLDEN)
+    x ^= x >> _SHIFT
+    x *= _MIX
+    x ^= x >> _SHIFT
+    return x
+
+
+def _hashes(keys: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(64-bit hashes, present mask) for string keys; None and '' are absent"""
+    present = np.array([key is not None and key != '' for key in keys], dtype=bool)
+    hashes = np.array([key_hash(str(key)) if ok else 0 for key, ok in zip(keys, present)], dtype=np.uint64)
+    return hashes, present
+
+
+class PerfectHashIndex:
+    """Hash-and-displace perfect hash over 64-bit key hashes.
+    
+    Keys are split into buckets by hash, and each bucket stores a seed
+    chosen at build time so that remixing its keys with the seed sends
+    every key of the table to its own slot. A lookup is one seed read, one
+    remix and one key compare, O(1) and vectorized over a batch. The slot
+    array stores the key hashes so absent keys are detected.
+    """
+    
+    def __init__(self, keys: np.ndarray, seeds: np.ndarray):
+        self.keys = keys
+        self.seeds = seeds
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    @classmethod
+    def build(
+        cls,
+        hashes: np.ndarray,
+        load_factor: float = 0.8,
+        bucket_size: int = 4,
+        max_seed: int = 1 << 20
+    ) -> Tuple['PerfectHashIndex', np.ndarray]:
+        """Return (index, slot of each input hash); hashes must be distinct"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        n = len(hashes)
+        if len(np.unique(hashes)) != n:
+            raise ValueError("Key hashes must be distinct")
+        n_slots = max(1, int(np.ceil(n / load_factor)))
+        n_buckets = max(1, int(np.ceil(n / bucket_size)))
+        
+        buckets = (hashes % np.uint64(n_buckets)).astype(np.int64)
+        order = np.argsort(buckets, kind='stable')
+        starts = np.searchsorted(buckets[order], np.arange(n_buckets + 1))
+        members = [order[starts[b]:starts[b + 1]] for b in range(n_buckets)]
+        
+        taken = np.zeros(n_slots, dtype=bool)
+        seeds = np.zeros(n_buckets, dtype=np.uint32)
+        slots = np.empty(n, dtype=np.int64)
+        # Largest buckets first, while most slots are still free
+        for b in sorted(range(n_buckets), key=lambda b: -len(members[b])):
+            rows = members[b]
+            if not len(rows):
+                continue
+            for seed in range(1, max_seed):
+                candidate = (_mix(hashes[rows], np.full(len(rows), seed)) % np.uint64(n_slots)).astype(np.int64)
+                if not taken[candidate].any() and len(np.unique(candidate)) == len(rows):
+                    break
+            else:
+                raise RuntimeError(f"No perfect-hash seed found for bucket {b}")
+            taken[candidate] = True
+            seeds[b] = seed
+            slots[rows] = candidate
+        
+        keys = np.zeros(n_slots, dtype=np.uint64)
+        keys[slots] = hashes
+        return cls(keys, seeds), slots
+    
+    def lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """Slot of each hash, or -1 where the key is not in the table"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(self.keys):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        seeds = self.seeds[(hashes % np.uint64(len(self.seeds))).astype(np.int64)]
+        slots = (_mix(hashes, seeds) % np.uint64(len(self.keys))).astype(np.int64)
+        return np.where(self.keys[slots] == hashes, slots, -1)
+    
+    def save(self, directory: Path, name: str):
+        np.save(directory / f'{name}_keys.npy', self.keys)
+        np.save(directory / f'{name}_seeds.npy', self.seeds)
+    
+    @classmethod
+    def load(cls, directory: Path, name: str) -> 'PerfectHashIndex':
+        return cls(
+            np.load(directory / f'{name}_keys.npy', mmap_mode='r'),
+            np.load(directory / f'{name}_seeds.npy', mmap_mode='r')
+        )
+
+
+def write_risk_tables(
+    directory: Union[str, Path],
+    rates: Dict[str, Dict[str, Tuple[int, int]]],
+    home_countries: Dict[str, str],
+    rows: int,
+    flagged: int,
+    prior_weight: float = 10.0
+):
+    """Build and write the lookup tables.
+    
+    rates maps each RATE_TABLES name to {key: (transactions, flagged)};
+    rows and flagged are the history's totals. Rates are smoothed towards
+    the overall flag rate with prior_weight pseudo-transactions, so rarely
+    seen keys do not get extreme rates. The directory is replaced in one
+    rename once every file is written.
+    """
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    
+    global_rate = flagged / rows if rows else 0.0
+    
+    for name in RATE_TABLES:
+        table = rates.get(name, {})
+        index, slots = PerfectHashIndex.build(np.array([key_hash(k) for k in table], dtype=np.uint64))
+        counts = np.zeros(len(index), dtype=np.uint32)
+        rate = np.full(len(index), global_rate, dtype=np.float32)
+        for slot, (count, key_flagged) in zip(slots, table.values()):
+            counts[slot] = count
+            rate[slot] = (key_flagged + prior_weight * global_rate) / (count + prior_weight)
+        index.save(tmp_dir, name)
+        np.save(tmp_dir / f'{name}_rate.npy', rate)
+        np.save(tmp_dir / f'{name}_count.npy', counts)
+    
+    countries = sorted(set(home_countries.values()))
+    country_index = {country: i for i, country in enumerate(countries)}
+    index, slots = PerfectHashIndex.build(np.array([key_hash(u) for u in home_countries], dtype=np.uint64))
+    home = np.full(len(index), -1, dtype=np.int32)
+    home[slots] = [country_index[c] for c in home_countries.values()]
+    index.save(tmp_dir, 'home')
+    np.save(tmp_dir / 'home_country.npy', home)
+    
+    # The most common home country stands in for users the table does not know
+    default_country = None
+    if home_countries:
+        default_country = countries[int(np.bincount(home[slots]).argmax())]
+    with open(tmp_dir / 'meta.json', 'w') as f:
+        json.dump({
+            'rows': rows,
+            'globalRate': global_rate,
+            'priorWeight': prior_weight,
+            'countries': countries,
+            'defaultCountry': default_country,
+            'counts': {name: len(rates.get(name, {})) for name in RATE_TABLES},
+            'users': len(home_countries),
+            'builtAt': time.time()
+        }, f, indent=2)
+    
+    old_dir = directory.with_name(directory.name + '.old')
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if directory.exists():
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class RiskTables:
+    """Read-only view of the tables written by write_risk_tables().
+    
+    Arrays are memory-mapped, so startup does not read them into memory
+    and worker processes share the page cache. Without tables every rate
+    is 0 and every user's home is `default_country`.
+    """
+    
+    def __init__(self, directory: Optional[Path] = None, default_country: Optional[str] = None):
+        self.directory = directory
+        self.meta: Dict[str, Any] = {}
+        self.indexes: Dict[str, PerfectHashIndex] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        if directory is not None:
+            with open(directory / 'meta.json') as f:
+                self.meta = json.load(f)
+            for name in RATE_TABLES:
+                self.indexes[name] = PerfectHashIndex.load(directory, name)
+                self.columns[f'{name}_rate'] = np.load(directory / f'{name}_rate.npy', mmap_mode='r')
+                self.columns[f'{name}_count'] = np.load(directory / f'{name}_count.npy', mmap_mode='r')
+            self.indexes['home'] = PerfectHashIndex.load(directory, 'home')
+            self.columns['home_country'] = np.load(directory / 'home_country.npy', mmap_mode='r')
+        
+        self.countries: List[str] = list(self.meta.get('countries', []))
+        self.default_country = default_country or self.meta.get('defaultCountry')
+        if self.default_country and self.default_country not in self.countries:
+            self.countries.append(self.default_country)
+        self._country_index = {country: i for i, country in enumerate(self.countries)}
+        self.global_rate = float(self.meta.get('globalRate', 0.0))
+    
+    @classmethod
+    def load(cls, directory: Union[str, Path], default_country: Optional[str] = None) -> 'RiskTables':
+        """Open the tables in `directory`, or empty tables when they are missing or unreadable"""
+        directory = Path(directory)
+        if (directory / 'meta.json').exists():
+            try:
+                return cls(directory, default_country)
+            except Exception as e:
+                print(f"Warning: Could not load risk tables from {directory}: {e}")
+        return cls(None, default_country)
+    
+    @property
+    def loaded(self) -> bool:
+        return self.directory is not None
+    
+    def rates(self, name: str, keys: Sequence[Optional[str]]) -> np.ndarray:
+        """Smoothed fraud rate per key; unknown keys get the overall rate"""
+        result = np.full(len(keys), self.global_rate, dtype=np.float32)
+        index = self.indexes.get(name)
+        if index is None or not len(keys):
+            return result
+        hashes, present = _hashes(keys)
+        slots = index.lookup(hashes)
+        found = present & (slots >= 0)
+        result[found] = self.columns[f'{name}_rate'][slots[found]]
+        return result
+    
+    def _home_index(self, user_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Index into self.countries of each user's home, the default's for unknown users"""
+        default = self._country_index.get(self.default_country, -1)
+        home = np.full(len(user_ids), default, dtype=np.int64)
+        index = self.indexes.get('home')
+        if index is None or not len(user_ids):
+            return home
+        hashes, present = _hashes(user_ids)
+        slots = index.lookup(hashes)
+        found = present & (slots >= 0)
+        home[found] = self.columns['home_country'][slots[found]]
+        return home
+    
+    def foreign_mask(self, locations: Sequence[Optional[str]], user_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """True where a transaction's country is present and differs from the user's home country"""
+        present = np.array([loc is not None and loc != '' for loc in locations], dtype=bool)
+        location_index = np.array([self._country_index.get(loc, -2) for loc in locations], dtype=np.int64)
+        home = self._home_index(user_ids)
+        # Without any known home country every present location counts as foreign
+        return present & ((home < 0) | (location_index != home))
+    
+    def home_country(self, user_id: Optional[str]) -> Optional[str]:
+        index = self._home_index([user_id])[0]
+        return self.countries[index] if index >= 0 else None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'loaded': self.loaded,
+            'directory': str(self.directory) if self.directory else None,
+            'defaultCountry': self.default_country,
+            'globalRate': self.global_rate,
+            'counts': self.meta.get('counts', {}),
+            'users': self.meta.get('users', 0),
+            'builtAt': self.meta.get('builtAt')
+        }
@@ -0,0 +1,90 @@
+"""
+Stream Scoring
+Scores an unbounded stream of items in micro-batches with bounded memory
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from ml_service.services.metrics import registry
+
+_STREAM_END = object()
+
+
+class StreamScorer:
+    """Turn an async stream of items into an async stream of results, in order.
+    
+    A reader task fills a bounded queue, so a slow scorer stops reading from
+    the client (backpressure) instead of buffering. The scorer drains up to
+    max_batch_size items per call, waiting at most max_wait_ms to fill a batch.
+    """
+    
+    def __init__(
+        self,
+        score_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 256,
+        max_wait_ms: float = 5.0,
+        queue_size: int = 1024,
+        name: str = 'stream'
+    ):
+        self.score_batch = score_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue_size = max(queue_size, self.max_batch_size)
+        
+        size_buckets = [2 ** i for i in range(self.max_batch_size.bit_length() + 1)]
+        self.batch_sizes = registry.histogram(f'{name}_batch_size', size_buckets)
+        self.items_scored = registry.counter(f'{name}_items')
+    
+    async def score(self, items: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Yield one result per input item, in input order"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        reader_error: List[BaseException] = []
+        
+        async def read():
+            try:
+                async for item in items:
+                    await queue.put(item)
+            except Exception as e:
+                reader_error.append(e)
+            await queue.put(_STREAM_END)
+        
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                batch = await self._next_batch(queue)
+                if batch is None:
+                    break
+                results = await self.score_batch(batch)
+                self.batch_sizes.observe(len(batch))
+                self.items_scored.inc(len(batch))
+                for result in results:
+                    yield result
+        finally:
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+        
+        if reader_error:
+            raise reader_error[0]
+    
+    async def _next_batch(self, queue: asyncio.Queue) -> Optional[List[Any]]:
+        """Wait for one item, then collect more for up to the batch window"""
+        first = await queue.get()
+        if first is _STREAM_END:
+            return None
+        
+        batch = [first]
+        if queue.qsize() < self.max_batch_size - 1:
+            await asyncio.sleep(self.max_wait)
+        
+        while len(batch) < self.max_batch_size and not queue.empty():
+            item = queue.get_nowait()
+            if item is _STREAM_END:
+                # Put the marker back so the next call ends the stream
+                queue.put_nowait(item)
+                break
+            batch.append(item)
+        return batch
@@ -0,0 +1,301 @@
+"""
+Transaction Graph
+Sparse user-merchant graph with connected components, shared-merchant
+clusters and fraud risk propagation for fraud-ring detection
+"""
+
+import time
+import threading
+import numpy as np
+from array import array
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from typing import Dict, Any, Optional, List, Iterable, Sequence
+
+# Raw feature columns read from the latest graph snapshot
+GRAPH_FEATURE_NAMES = ['user_graph_risk', 'merchant_graph_risk', 'user_cluster_size']
+
+# Scores at or above this seed their user's risk at score / 100
+SEED_MIN_SCORE = 70
+
+
+def merchant_key(transaction: Dict[str, Any]) -> Optional[str]:
+    merchant = transaction.get('merchant') or transaction.get('merchantName')
+    return str(merchant) if merchant else None
+
+
+class _GraphSnapshot:
+    """The adjacency matrix, node names and analytics of one TransactionGraph.refresh().
+    
+    Published with a single assignment and never mutated afterwards, so
+    queries read it without locking.
+    """
+    
+    def __init__(
+        self,
+        adjacency: Optional[sparse.csr_matrix] = None,
+        user_index: Optional[Dict[str, int]] = None,
+        user_names: Optional[List[str]] = None,
+        merchant_index: Optional[Dict[str, int]] = None,
+        merchant_names: Optional[List[str]] = None,
+        seeds: Optional[Dict[int, float]] = None
+    ):
+        self.adjacency = adjacency if adjacency is not None else sparse.csr_matrix((0, 0), dtype=np.float64)
+        self.user_index = user_index or {}
+        self.user_names = user_names or []
+        self.merchant_index = merchant_index or {}
+        self.merchant_names = merchant_names or []
+        self.seeds = seeds or {}
+        n_users, n_merchants = self.adjacency.shape
+        self.n_users = n_users
+        self.n_merchants = n_merchants
+        self.n_edges = self.adjacency.nnz
+        self.built_at = time.time()
+        self.user_component = np.zeros(n_users, dtype=np.int32)
+        self.merchant_component = np.zeros(n_merchants, dtype=np.int32)
+        self.component_users = np.zeros(0, dtype=np.int64)
+        self.user_cluster = np.zeros(n_users, dtype=np.int32)
+        self.cluster_sizes = np.zeros(0, dtype=np.int64)
+        self.cluster_order = np.zeros(0, dtype=np.int64)
+        self.cluster_starts = np.zeros(1, dtype=np.int64)
+        self.user_risk = np.zeros(n_users)
+        self.merchant_risk = np.zeros(n_merchants)
+    
+    def cluster_members(self, cluster: int) -> np.ndarray:
+        return self.cluster_order[self.cluster_starts[cluster]:self.cluster_starts[cluster + 1]]
+
+
+class TransactionGraph:
+    """Bipartite user-merchant graph over a CSR adjacency matrix.
+    
+    Edges arrive in an append-only buffer and are folded into the CSR
+    matrix (weights are transaction counts) by refresh(), which then
+    recomputes every analytic with sparse matrix operations:
+    
+    - connected components of the bipartite graph
+    - shared-merchant clusters: components of the user-user graph linking
+      users with at least min_shared_merchants merchants in common;
+      merchants with more than max_merchant_degree users (marketplaces,
+      utilities) are left out so they do not join everyone together
+    - risk propagation: seed risk (flagged transactions, AML cases) spread
+      user -> merchant -> user like personalized PageRank with `damping`
+    
+    Queries read the latest snapshot, so refresh() can run on a background
+    thread while requests keep being served.
+    """
+    
+    def __init__(
+        self,
+        damping: float = 0.85,
+        iterations: int = 20,
+        min_shared_merchants: int = 2,
+        max_merchant_degree: int = 1000,
+        refresh_seconds: float = 30.0
+    ):
+        self.damping = damping
+        self.iterations = iterations
+        self.min_shared_merchants = min_shared_merchants
+        self.max_merchant_degree = max_merchant_degree
+        self.refresh_seconds = refresh_seconds
+        
+        self.user_index: Dict[str, int] = {}
+        self.user_names: List[str] = []
+        self.merchant_index: Dict[str, int] = {}
+        self.merchant_names: List[str] = []
+        self.seeds: Dict[int, float] = {}
+        self.snapshot = _GraphSnapshot()
+        
+        self._pending_users = array('i')
+        self._pending_merchants = array('i')
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+    
+    @property
+    def pending_edges(self) -> int:
+        return len(self._pending_users)
+    
+    def _node(self, index: Dict[str, int], names: List[str], name: str) -> int:
+        node = index.get(name)
+        if node is None:
+            node = index[name] = len(names)
+            names.append(name)
+        return node
+    
+    def add_edges(self, user_ids: Iterable[Any], merchants: Iterable[Any]):
+        """Buffer one edge per (userId, merchant) pair; pairs missing either end are skipped"""
+        with self._lock:
+            for user_id, merchant in zip(user_ids, merchants):
+                if user_id is None or merchant is None or user_id == '' or merchant == '':
+                    continue
+                self._pending_users.append(self._node(self.user_index, self.user_names, str(user_id)))
+                self._pending_merchants.append(self._node(self.merchant_index, self.merchant_names, str(merchant)))
+    
+    def seed_risk(self, user_ids: Iterable[Any], risks: Iterable[float]):
+        """Raise users' seed risk (0-1) to at least the given values"""
+        with self._lock:
+            for user_id, risk in zip(user_ids, risks):
+                if user_id is None or user_id == '':
+                    continue
+                node = self._node(self.user_index, self.user_names, str(user_id))
+                self.seeds[node] = max(self.seeds.get(node, 0.0), float(risk))
+    
+    def add_transactions(self, transactions: List[Dict[str, Any]], scores: Optional[Sequence[float]] = None):
+        """Add scored transactions as edges; high fraud scores seed their user's risk"""
+        user_ids = [t.get('userId') for t in transactions]
+        self.add_edges(user_ids, [merchant_key(t) for t in transactions])
+        if scores is not None:
+            flagged = [(u, s / 100) for u, s in zip(user_ids, scores) if s >= SEED_MIN_SCORE]
+            if flagged:
+                self.seed_risk(*zip(*flagged))
+        self.maybe_refresh()
+    
+    def maybe_refresh(self):
+        """Start a background refresh when edges are pending and the snapshot is stale"""
+        if not self._pending_users or time.monotonic() - self._last_refresh < self.refresh_seconds:
+            return
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self.refresh, name="transaction-graph-refresh", daemon=True).start()
+    
+    def refresh(self) -> _GraphSnapshot:
+        """Fold pending edges into the adjacency matrix and recompute the analytics"""
+        with self._refresh_lock:
+            self._last_refresh = time.monotonic()
+            with self._lock:
+                users = np.frombuffer(self._pending_users, dtype=np.int32).copy()
+                merchants = np.frombuffer(self._pending_merchants, dtype=np.int32).copy()
+                self._pending_users = array('i')
+                self._pending_merchants = array('i')
+                shape = (len(self.user_names), len(self.merchant_names))
+                seed_risk = dict(self.seeds)
+                names = (dict(self.user_index), list(self.user_names), dict(self.merchant_index), list(self.merchant_names))
+            
+            # Queries may be reading the published matrix; grow a copy
+            adjacency = self.snapshot.adjacency.copy()
+            adjacency.resize(shape)
+            if len(users):
+                new_edges = sparse.csr_matrix((np.ones(len(users)), (users, merchants)), shape=shape)
+                adjacency = (adjacency + new_edges).tocsr()
+            
+            snapshot = _GraphSnapshot(adjacency, *names, seed_risk)
+            self._analyze(snapshot)
+            self.snapshot = snapshot
+            return snapshot
+    
+    def _analyze(self, snapshot: _GraphSnapshot):
+        """Fill in the snapshot's analytics from its adjacency matrix and seeds"""
+        adjacency = snapshot.adjacency
+        n_users, n_merchants = adjacency.shape
+        if n_users == 0:
+            return
+        seeds = np.zeros(n_users)
+        if snapshot.seeds:
+            seeds[list(snapshot.seeds)] = list(snapshot.seeds.values())
+        
+        binary = adjacency.copy()
+        binary.data[:] = 1
+        
+        # Connected components of the bipartite graph (users first, then merchants)
+        bipartite = sparse.bmat([[None, binary], [binary.T, None]], format='csr')
+        _, labels = connected_components(bipartite, directed=False)
+        snapshot.user_component = labels[:n_users].astype(np.int32)
+        snapshot.merchant_component = labels[n_users:].astype(np.int32)
+        snapshot.component_users = np.bincount(snapshot.user_component, minlength=labels.max() + 1)
+        
+        # Shared-merchant clusters from the user-user co-occurrence matrix
+        merchant_degree = np.asarray(binary.sum(axis=0)).ravel()
+        keep = sparse.diags((merchant_degree <= self.max_merchant_degree).astype(np.float64))
+        linked = binary @ keep
+        shared = (linked @ linked.T).tocsr()
+        shared.data[shared.data < self.min_shared_merchants] = 0
+        shared.eliminate_zeros()
+        n_clusters, clusters = connected_components(shared, directed=False)
+        snapshot.user_cluster = clusters.astype(np.int32)
+        snapshot.cluster_sizes = np.bincount(clusters, minlength=n_clusters)
+        snapshot.cluster_order = np.argsort(clusters, kind='stable')
+        snapshot.cluster_starts = np.concatenate([[0], np.cumsum(snapshot.cluster_sizes)])
+        
+        # Risk propagation over transaction-weighted averages
+        user_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+        weighted_degree = np.asarray(adjacency.sum(axis=0)).ravel()
+        to_merchants = sparse.diags(1 / np.maximum(weighted_degree, 1)) @ adjacency.T.tocsr()
+        to_users = sparse.diags(1 / np.maximum(user_degree, 1)) @ adjacency
+        user_risk = seeds.copy()
+        merchant_risk = np.zeros(n_merchants)
+        for _ in range(self.iterations):
+            merchant_risk = to_merchants @ user_risk
+            user_risk = np.maximum(seeds, self.damping * (to_users @ merchant_risk))
+        snapshot.user_risk = user_risk
+        snapshot.merchant_risk = np.minimum(merchant_risk, 1.0)
+    
+    def fill_features(self, out: np.ndarray, transactions: List[Dict[str, Any]]):
+        """Write the GRAPH_FEATURE_NAMES columns for a batch into `out`; unseen nodes get 0"""
+        snapshot = self.snapshot
+        out[:] = 0
+        for i, t in enumerate(transactions):
+            user_id = t.get('userId')
+            user = snapshot.user_index.get(str(user_id)) if user_id is not None else None
+            if user is not None:
+                out[i, 0] = snapshot.user_risk[user]
+                out[i, 2] = snapshot.cluster_sizes[snapshot.user_cluster[user]]
+            merchant = merchant_key(t)
+            node = snapshot.merchant_index.get(merchant) if merchant is not None else None
+            if node is not None:
+                out[i, 1] = snapshot.merchant_risk[node]
+    
+    def summary(self, limit: int = 10) -> Dict[str, Any]:
+        """Graph size, component structure and the riskiest multi-user clusters"""
+        snapshot = self.snapshot
+        clusters = np.flatnonzero(snapshot.cluster_sizes >= 2)
+        risk = np.array([snapshot.user_risk[snapshot.cluster_members(c)].max() for c in clusters])
+        top = clusters[np.argsort(-risk, kind='stable')[:limit]] if len(clusters) else clusters
+        return {
+            'users': snapshot.n_users,
+            'merchants': snapshot.n_merchants,
+            'edges': snapshot.n_edges,
+            'pendingEdges': self.pending_edges,
+            'components': int(len(snapshot.component_users)),
+            'largestComponentUsers': int(snapshot.component_users.max()) if len(snapshot.component_users) else 0,
+            'clusters': int(len(clusters)),
+            'topClusters': [self._describe_cluster(snapshot, c) for c in top],
+            'builtAt': snapshot.built_at
+        }
+    
+    def _describe_cluster(self, snapshot: _GraphSnapshot, cluster: int, member_limit: int = 20) -> Dict[str, Any]:
+        members = snapshot.cluster_members(cluster)
+        risks = snapshot.user_risk[members]
+        order = np.argsort(-risks, kind='stable')[:member_limit]
+        return {
+            'cluster': int(cluster),
+            'size': int(len(members)),
+            'maxRisk': float(risks.max()),
+            'meanRisk': float(risks.mean()),
+            'users': [snapshot.user_names[members[i]] for i in order]
+        }
+    
+    def user_report(self, user_id: str, merchant_limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Component, cluster, propagated risk and riskiest merchants for one user"""
+        snapshot = self.snapshot
+        user = snapshot.user_index.get(user_id)
+        if user is None:
+            return None
+        component = int(snapshot.user_component[user])
+        row = snapshot.adjacency.getrow(user)
+        merchants = row.indices[np.argsort(-snapshot.merchant_risk[row.indices], kind='stable')[:merchant_limit]]
+        return {
+            'risk': float(snapshot.user_risk[user]),
+            'seedRisk': snapshot.seeds.get(user, 0.0),
+            'component': component,
+            'componentUsers': int(snapshot.component_users[component]),
+            'cluster': self._describe_cluster(snapshot, int(snapshot.user_cluster[user])),
+            'merchants': [
+                {
+                    'merchant': snapshot.merchant_names[m],
+                    'transactions': int(row[0, m]),
+                    'risk': float(snapshot.merchant_risk[m])
+                }
+                for m in merchants
+            ],
+            'builtAt': snapshot.built_at
+        }
@@ -0,0 +1,322 @@
+"""
+Compiled Tree Inference
+Flattens trained tree ensembles into contiguous node arrays and evaluates
+them with vectorized NumPy traversal
+"""
+
+import json
+import numpy as np
+from typing import Any, Optional, List, Tuple
+
+EULER_GAMMA = np.euler_gamma
+
+
+class CompiledTreeEnsemble:
+    """All trees of an ensemble stored as flat node arrays.
+    
+    Nodes are renumbered breadth-first so that the children of node i sit
+    at left[i] and left[i] + 1. Leaves point to themselves with an
+    infinite threshold, so finite rows can be advanced max_depth steps
+    without checking whether they already reached a leaf.
+    """
+    
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        value: np.ndarray,
+        is_leaf: np.ndarray,
+        missing_left: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        inclusive: bool = False
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.value = value
+        self.is_leaf = is_leaf
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = max_depth
+        # sklearn sends x <= threshold left, xgboost sends x < threshold left
+        self.inclusive = inclusive
+    
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+    
+    @classmethod
+    def from_trees(
+        cls,
+        trees: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]],
+        inclusive: bool = False
+    ) -> "CompiledTreeEnsemble":
+        """Flatten per-tree (feature, threshold, left, right, value, missing_left) arrays"""
+        feature, threshold, first_child, value, is_leaf, missing_left, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        for tree_feature, tree_threshold, left, right, tree_value, tree_missing in trees:
+            root = len(feature)
+            roots.append(root)
+            # Breadth-first walk; children are appended as adjacent pairs
+            order = [0]
+            depth = {0: 0}
+            for position, node in enumerate(order):
+                if left[node] < 0:
+                    feature.append(0)
+                    threshold.append(np.inf)
+                    first_child.append(root + position)
+                    value.append(tree_value[node])
+                    is_leaf.append(True)
+                    missing_left.append(True)
+                    max_depth = max(max_depth, depth[node])
+                else:
+                    feature.append(tree_feature[node])
+                    threshold.append(tree_threshold[node])
+                    first_child.append(root + len(order))
+                    value.append(0.0)
+                    is_leaf.append(False)
+                    missing_left.append(bool(tree_missing[node]) if tree_missing is not None else False)
+                    depth[left[node]] = depth[right[node]] = depth[node] + 1
+                    order.extend((left[node], right[node]))
+        
+        # Rows are evaluated in float32 (as sklearn and xgboost do). Rounding
+        # thresholds down to float32 keeps x <= t identical for float32 x
+        threshold64 = np.asarray(threshold, dtype=np.float64)
+        threshold32 = threshold64.astype(np.float32)
+        rounded_up = threshold32 > threshold64
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+
+        return cls(
+            feature=np.asarray(feature, dtype=np.intp),
+            threshold=threshold32,
+            left=np.asarray(first_child, dtype=np.intp),
+            value=np.asarray(value, dtype=np.float64),
+            is_leaf=np.asarray(is_leaf, dtype=bool),
+            missing_left=np.asarray(missing_left, dtype=bool),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            inclusive=inclusive
+        )
+    
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the leaf node index reached in every tree, shape (n_rows, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        
+        if np.isfinite(flat).all():
+            for _ in range(self.max_depth):
+                x = flat[row_offset + self.feature[node]]
+                go_right = x > self.threshold[node] if self.inclusive else x >= self.threshold[node]
+                node = self.left[node] + go_right
+            return node
+        
+        # Rows with NaN/inf take the exact path that honours missing-value
+        # directions and never moves past a leaf
+        for _ in range(self.max_depth):
+            x = flat[row_offset + self.feature[node]]
+            threshold = self.threshold[node]
+            go_left = x <= threshold if self.inclusive else x < threshold
+            go_left |= np.isnan(x) & self.missing_left[node]
+            node = np.where(self.is_leaf[node], node, self.left[node] + ~go_left)
+        return node
+    
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Return the leaf value reached in every tree, shape (n_rows, n_trees)"""
+        return self.value[self.apply(X)]
+
+
+def _xgb_trees(model: Any, objective: str) -> Tuple[CompiledTreeEnsemble, float]:
+    """Compile a gbtree XGBoost model's trees; returns (ensemble, base_score)"""
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    
+    if learner['objective']['name'] != objective:
+        raise ValueError(f"Unsupported objective: {learner['objective']['name']}")
+    gradient_booster = learner['gradient_booster']
+    if gradient_booster['name'] != 'gbtree':
+        raise ValueError(f"Unsupported booster: {gradient_booster['name']}")
+    
+    trees = []
+    for tree in gradient_booster['model']['trees']:
+        left = np.asarray(tree['left_children'])
+        trees.append((
+            np.asarray(tree['split_indices']),
+            np.asarray(tree['split_conditions'], dtype=np.float32),
+            left,
+            np.asarray(tree['right_children']),
+            np.asarray(tree['split_conditions'], dtype=np.float32),
+            np.asarray(tree['default_left'], dtype=bool)
+        ))
+    
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return CompiledTreeEnsemble.from_trees(trees), base_score
+
+
+class CompiledXGBClassifier:
+    """Binary XGBoost classifier evaluated from compiled node arrays"""
+    
+    def __init__(self, ensemble: CompiledTreeEnsemble, base_margin: float):
+        self.ensemble = ensemble
+        self.base_margin = base_margin
+    
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledXGBClassifier":
+        """Compile a fitted binary:logistic XGBClassifier (gbtree booster)"""
+        ensemble, base_score = _xgb_trees(model, 'binary:logistic')
+        return cls(ensemble, float(np.log(base_score / (1 - base_score))))
+    
+    def predict_margin(self, X: np.ndarray) -> np.ndarray:
+        return self.ensemble.leaf_values(X).sum(axis=1) + self.base_margin
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Return class probabilities with the same layout as XGBClassifier"""
+        positive = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+
+class CompiledXGBRegressor:
+    """Squared-error XGBoost regressor evaluated from compiled node arrays"""
+    
+    def __init__(self, ensemble: CompiledTreeEnsemble, base_score: float):
+        self.ensemble = ensemble
+        self.base_score = base_score
+    
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledXGBRegressor":
+        """Compile a fitted reg:squarederror XGBRegressor (gbtree booster)"""
+        return cls(*_xgb_trees(model, 'reg:squarederror'))
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.ensemble.leaf_values(X).sum(axis=1) + self.base_score
+
+
+class CompiledIsolationForest:
+    """sklearn IsolationForest evaluated from compiled node arrays"""
+    
+    def __init__(self, ensemble: CompiledTreeEnsemble, max_samples: int, offset: float):
+        self.ensemble = ensemble
+        self.normalizer = _average_path_length(np.array([max_samples]))[0]
+        self.offset_ = offset
+    
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledIsolationForest":
+        """Compile a fitted IsolationForest"""
+        trees = []
+        for estimator, features in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            left = tree.children_left
+            # Leaf value is the full path length: depth plus the expected
+            # remaining depth of the unsplit samples in the leaf
+            value = _node_depths(left, tree.children_right) + _average_path_length(tree.n_node_samples)
+            trees.append((
+                np.asarray(features)[np.maximum(tree.feature, 0)],
+                tree.threshold,
+                left,
+                tree.children_right,
+                value,
+                None
+            ))
+        
+        ensemble = CompiledTreeEnsemble.from_trees(trees, inclusive=True)
+        return cls(ensemble, model.max_samples_, model.offset_)
+    
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        depths = self.ensemble.leaf_values(X).mean(axis=1)
+        return -(2 ** (-depths / self.normalizer))
+    
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def compile_fraud_model(model: Any, atol: float = 1e-5) -> Optional[CompiledXGBClassifier]:
+    """Compile the fraud classifier, or return None if it is unsupported or disagrees"""
+    try:
+        compiled = CompiledXGBClassifier.from_model(model)
+        probe = probe_matrix(compiled.ensemble, model.n_features_in_)
+        error = np.abs(compiled.predict_proba(probe)[:, 1] - model.predict_proba(probe)[:, 1]).max()
+    except Exception as e:
+        print(f"Warning: Could not compile fraud model: {e}")
+        return None
+    
+    if error > atol:
+        print(f"Warning: Compiled fraud model disagrees with original (max error {error:.2e}), using original")
+        return None
+    return compiled
+
+
+def compile_forecast_model(model: Any, atol: float = 1e-2) -> Optional[CompiledXGBRegressor]:
+    """Compile a forecast regressor, or return None if it is unsupported or disagrees"""
+    try:
+        compiled = CompiledXGBRegressor.from_model(model)
+        probe = probe_matrix(compiled.ensemble, model.n_features_in_)
+        error = np.abs(compiled.predict(probe) - model.predict(probe)).max()
+    except Exception as e:
+        print(f"Warning: Could not compile forecast model: {e}")
+        return None
+    
+    if error > atol:
+        print(f"Warning: Compiled forecast model disagrees with original (max error {error:.2e}), using original")
+        return None
+    return compiled
+
+
+def compile_anomaly_model(model: Any, atol: float = 1e-9) -> Optional[CompiledIsolationForest]:
+    """Compile the anomaly model, or return None if it is unsupported or disagrees"""
+    try:
+        compiled = CompiledIsolationForest.from_model(model)
+        probe = probe_matrix(compiled.ensemble, model.n_features_in_)
+        error = np.abs(compiled.decision_function(probe) - model.decision_function(probe)).max()
+    except Exception as e:
+        print(f"Warning: Could not compile anomaly model: {e}")
+        return None
+    
+    if error > atol:
+        print(f"Warning: Compiled anomaly model disagrees with original (max error {error:.2e}), using original")
+        return None
+    return compiled
+
+
+def probe_matrix(ensemble: CompiledTreeEnsemble, n_features: int, n_rows: int = 512, seed: int = 0) -> np.ndarray:
+    """Build rows that land on both sides of the ensemble's split thresholds"""
+    rng = np.random.default_rng(seed)
+    is_split = ~ensemble.is_leaf
+    probe = rng.normal(0, 1, size=(n_rows, n_features))
+    for feature in range(n_features):
+        thresholds = ensemble.threshold[is_split & (ensemble.feature == feature)]
+        if len(thresholds) == 0:
+            continue
+        picked = rng.choice(thresholds, size=n_rows)
+        nudge = rng.choice([-1, 1], size=n_rows) * (np.abs(picked) * 1e-3 + 1e-3)
+        probe[:, feature] = picked + nudge
+    return probe.astype(np.float32)
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Depth of every reachable node (root = 0)"""
+    depths = np.zeros(len(left), dtype=np.float64)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        if left[node] >= 0:
+            depths[left[node]] = depths[right[node]] = depths[node] + 1
+            stack.extend((left[node], right[node]))
+    return depths
+
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected path length of an unsuccessful BST search over n samples"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    lengths[large] = 2.0 * (np.log(n - 1.0) + EULER_GAMMA) - 2.0 * (n - 1.0) / n
+    return lengths
@@ -0,0 +1,102 @@
+"""
+User Aggregate Store
+Keeps per-user running amount statistics so callers need not resend history
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Iterable
+
+# Record layout: [count, mean, m2, max]
+COUNT, MEAN, M2, MAX = 0, 1, 2, 3
+
+
+class UserAggregateStore:
+    """Bounded LRU map of userId -> running count/mean/variance/max amount.
+    
+    Updates use Welford's algorithm, so each transaction costs O(1) and
+    no history is retained. The least recently used users are evicted
+    once max_users is reached.
+    """
+    
+    def __init__(self, max_users: int = 100000):
+        self.max_users = max_users
+        self._records: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._records)
+    
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._records
+    
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the aggregates for a user, or None if unknown"""
+        with self._lock:
+            record = self._records.get(user_id)
+            if record is None:
+                return None
+            self._records.move_to_end(user_id)
+            count, mean, m2, max_amount = record
+        
+        return {
+            'count': int(count),
+            'mean': mean,
+            'variance': m2 / count if count > 1 else 0.0,
+            'max': max_amount
+        }
+    
+    def mean_amounts(self, user_ids: List[Optional[str]]) -> List[Optional[float]]:
+        """Return the mean amount per user id (None for unknown users)"""
+        means = []
+        with self._lock:
+            for user_id in user_ids:
+                record = self._records.get(user_id) if user_id is not None else None
+                if record is None:
+                    means.append(None)
+                else:
+                    self._records.move_to_end(user_id)
+                    means.append(record[MEAN])
+        return means
+    
+    def update(self, user_id: str, amount: float):
+        """Fold one transaction amount into a user's aggregates"""
+        with self._lock:
+            self._update_locked(user_id, amount)
+    
+    def update_many(self, user_ids: Iterable[Optional[str]], amounts: Iterable[float]):
+        """Fold a batch of transaction amounts into the aggregates"""
+        with self._lock:
+            for user_id, amount in zip(user_ids, amounts):
+                if user_id is not None:
+                    self._update_locked(user_id, float(amount))
+    
+    def seed(self, user_id: str, amounts: Iterable[float]) -> bool:
+        """Initialise an unknown user from a history of amounts"""
+        with self._lock:
+            if user_id in self._records:
+                return False
+            for amount in amounts:
+                self._update_locked(user_id, float(amount))
+            return user_id in self._records
+    
+    def clear(self):
+        """Drop all aggregates"""
+        with self._lock:
+            self._records.clear()
+    
+    def _update_locked(self, user_id: str, amount: float):
+        record = self._records.get(user_id)
+        if record is None:
+            self._records[user_id] = [1, amount, 0.0, amount]
+            if len(self._records) > self.max_users:
+                self._records.popitem(last=False)
+            return
+        
+        self._records.move_to_end(user_id)
+        record[COUNT] += 1
+        delta = amount - record[MEAN]
+        record[MEAN] += delta / record[COUNT]
+        record[M2] += delta * (amount - record[MEAN])
+        if amount > record[MAX]:
+            record[MAX] = amount
@@ -0,0 +1,247 @@
+"""
+Velocity Index
+Per-user buffers of recent transaction timestamps and amounts answering
+"count and sum in the last window" queries
+"""
+
+import time
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, Any, Optional, List, Iterable, Set, Tuple
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Windows reported by window_stats(), in seconds
+VELOCITY_WINDOWS = {'1h': HOUR, '24h': DAY, '7d': 7 * DAY}
+
+
+def transaction_time(transaction: Dict[str, Any]) -> Optional[float]:
+    """Return a transaction or history row's timestamp as epoch seconds, None if absent"""
+    value = transaction.get('timestamp') or transaction.get('createdAt')
+    if value is None or value == '':
+        return None
+    return parse_timestamp(value)
+
+
+def transaction_id(transaction: Dict[str, Any]) -> Optional[str]:
+    """Return a transaction or history row's id as a string, None if absent"""
+    value = transaction.get('id')
+    return None if value is None or value == '' else str(value)
+
+
+def parse_timestamp(value: Any, default: Optional[float] = None) -> float:
+    """Return a transaction timestamp as epoch seconds.
+    
+    Accepts ISO-8601 strings (a trailing 'Z' is UTC), datetimes and epoch
+    seconds or milliseconds. Missing or unparseable values use `default`,
+    or the current time when no default is given.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Anything past year 33658 in seconds is really milliseconds
+        return value / 1000 if value > 1e12 else float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return default if default is not None else time.time()
+
+
+class _UserEvents:
+    """Sorted timestamps with a running prefix sum of amounts.
+    
+    Events older than the buffer's head are dropped by advancing `start`
+    (like a ring buffer's read pointer); the lists are compacted once the
+    dead prefix dominates. prefix[i] is the sum of amounts[:i]. Events
+    carrying a transaction id are kept once per id while buffered, so a
+    rescored transaction is not counted again.
+    """
+    
+    __slots__ = ('times', 'amounts', 'prefix', 'ids', 'seen', 'start')
+    
+    def __init__(self):
+        self.times: List[float] = []
+        self.amounts: List[float] = []
+        self.prefix: List[float] = [0.0]
+        self.ids: List[Optional[str]] = []
+        self.seen: Set[str] = set()
+        self.start = 0
+    
+    def __len__(self) -> int:
+        return len(self.times) - self.start
+    
+    def insert(self, timestamp: float, amount: float, event_id: Optional[str] = None):
+        if event_id is not None:
+            if event_id in self.seen:
+                return
+            self.seen.add(event_id)
+        
+        times = self.times
+        if not times or timestamp >= times[-1]:
+            times.append(timestamp)
+            self.amounts.append(amount)
+            self.ids.append(event_id)
+            self.prefix.append(self.prefix[-1] + amount)
+            return
+        
+        # Out-of-order event: insert in place and rebuild the prefix after it
+        k = bisect_right(times, timestamp, self.start)
+        times.insert(k, timestamp)
+        self.amounts.insert(k, amount)
+        self.ids.insert(k, event_id)
+        self.prefix[k:] = accumulate(self.amounts[k:], initial=self.prefix[k])
+    
+    def evict(self, cutoff: float, max_events: int):
+        """Drop events at or before `cutoff` and all but the newest max_events"""
+        start = bisect_right(self.times, cutoff, self.start)
+        start = max(start, len(self.times) - max_events)
+        if start <= self.start:
+            return
+        self.seen.difference_update(event_id for event_id in self.ids[self.start:start] if event_id is not None)
+        self.start = start
+        
+        if start > 64 and start * 2 > len(self.times):
+            base = self.prefix[start]
+            self.times = self.times[start:]
+            self.amounts = self.amounts[start:]
+            self.ids = self.ids[start:]
+            self.prefix = [total - base for total in self.prefix[start:]]
+            self.start = 0
+    
+    def window(self, since: float, until: float) -> Tuple[int, float]:
+        """Return (count, sum) of events with since < timestamp <= until"""
+        lo = bisect_right(self.times, since, self.start)
+        hi = bisect_right(self.times, until, lo)
+        return hi - lo, self.prefix[hi] - self.prefix[lo]
+    
+    def latest(self) -> Optional[float]:
+        return self.times[-1] if len(self) else None
+
+
+class VelocityIndex:
+    """Bounded LRU map of userId -> recent transaction timestamps and amounts.
+    
+    Window queries are two binary searches plus a prefix-sum difference,
+    O(log n) in the user's buffered events. Each user keeps at most
+    max_events_per_user events no older than max_age seconds before their
+    newest one, and the least recently used users are evicted once
+    max_users is reached.
+    """
+    
+    def __init__(self, max_age: float = 7 * DAY, max_events_per_user: int = 1000, max_users: int = 100000):
+        self.max_age = max_age
+        self.max_events_per_user = max_events_per_user
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserEvents]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._users)
+    
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+    
+    def record(self, user_id: str, timestamp: float, amount: float = 0.0, event_id: Optional[str] = None):
+        """Add one transaction to a user's buffer; an event_id already buffered is ignored"""
+        with self._lock:
+            self._record_locked(user_id, timestamp, amount, event_id)
+    
+    def record_many(self, events: Iterable[Tuple[Optional[str], float, float, Optional[str]]]) -> List[bool]:
+        """Add (userId, timestamp, amount, transaction id or None) events in one locked pass.
+        
+        Returns per event whether it is new, i.e. False only for ids already
+        buffered, so callers can keep other per-transaction state in step.
+        """
+        new = []
+        with self._lock:
+            for user_id, timestamp, amount, event_id in events:
+                new.append(user_id is None or self._record_locked(user_id, timestamp, float(amount), event_id))
+        return new
+    
+    def seed(self, user_id: str, events: Iterable[Tuple[float, float, Optional[str]]]) -> bool:
+        """Initialise an unknown user from (timestamp, amount, transaction id or None) history"""
+        with self._lock:
+            if user_id in self._users:
+                return False
+            for timestamp, amount, event_id in events:
+                self._record_locked(user_id, timestamp, float(amount), event_id)
+            return user_id in self._users
+    
+    def count(self, user_id: Optional[str], until: float, window: float = DAY) -> Optional[int]:
+        """Return the user's transaction count in (until - window, until], None if unknown"""
+        return self.counts([user_id], [until], window)[0]
+    
+    def counts(
+        self,
+        user_ids: List[Optional[str]],
+        until: List[float],
+        window: float = DAY,
+        exclude_ids: Optional[List[Optional[str]]] = None
+    ) -> List[Optional[int]]:
+        """Vector form of count() for a batch of (userId, timestamp) pairs.
+        
+        exclude_ids leaves each row's own transaction out of its count, for
+        transactions that are scored again after being recorded.
+        """
+        counts = []
+        exclude_ids = exclude_ids or [None] * len(user_ids)
+        with self._lock:
+            for user_id, timestamp, exclude in zip(user_ids, until, exclude_ids):
+                events = self._users.get(user_id) if user_id is not None else None
+                if events is None:
+                    counts.append(None)
+                    continue
+                self._users.move_to_end(user_id)
+                count = events.window(timestamp - window, timestamp)[0]
+                if exclude is not None and exclude in events.seen:
+                    recorded = events.times[events.ids.index(exclude, events.start)]
+                    count -= timestamp - window < recorded <= timestamp
+                counts.append(count)
+        return counts
+    
+    def window_stats(self, user_id: str, until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return count and sum for every window in VELOCITY_WINDOWS, or None if unknown"""
+        with self._lock:
+            events = self._users.get(user_id)
+            if events is None:
+                return None
+            self._users.move_to_end(user_id)
+            if until is None:
+                until = time.time()
+            
+            stats = {}
+            for name, window in VELOCITY_WINDOWS.items():
+                count, total = events.window(until - window, until)
+                stats[name] = {'count': count, 'sum': total}
+            return {'windows': stats, 'buffered': len(events), 'latest': events.latest()}
+    
+    def clear(self):
+        """Drop all buffered events"""
+        with self._lock:
+            self._users.clear()
+    
+    def _record_locked(self, user_id: str, timestamp: float, amount: float, event_id: Optional[str] = None) -> bool:
+        """Record one event; False when its id is already buffered"""
+        events = self._users.get(user_id)
+        if events is None:
+            events = self._users[user_id] = _UserEvents()
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        
+        if event_id is not None and event_id in events.seen:
+            return False
+        latest = events.latest()
+        # Late events already past the retention horizon are not worth keeping
+        if latest is not None and timestamp <= latest - self.max_age:
+            return True
+        events.insert(timestamp, amount, event_id)
+        events.evict(events.times[-1] - self.max_age, self.max_events_per_user)
+        return True
@@ -0,0 +1,103 @@
+"""
+Build Risk Tables
+Aggregates a transaction history file into the merchant/category fraud-rate
+and user home-country lookup tables the fraud service memory-maps at startup
+"""
+
+import sys
+import time
+import argparse
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.risk_tables import RATE_TABLES, write_risk_tables
+from ml_service.services.fraud_service import RISK_TABLES_DIR
+from rescore_transactions import read_chunks
+
+FLAG_THRESHOLD = 70
+
+def flagged_column(frame):
+    """Fraud label per row: isFlagged, or fraudScore >= 70 where the flag is missing"""
+    flagged = pd.Series(np.nan, index=frame.index)
+    if 'isFlagged' in frame:
+        flags = frame['isFlagged'].astype(str).str.lower().map({'true': 1.0, '1': 1.0, 'false': 0.0, '0': 0.0})
+        flagged = flagged.fillna(flags)
+    if 'fraudScore' in frame:
+        scores = pd.to_numeric(frame['fraudScore'], errors='coerce')
+        flagged = flagged.fillna((scores >= FLAG_THRESHOLD).where(scores.notna()).astype(float))
+    return flagged
+
+def aggregate(chunks):
+    """Fold chunks into per-key (transactions, flagged) counts and per-user country counts"""
+    rates = {name: defaultdict(lambda: [0, 0]) for name in RATE_TABLES}
+    country_counts = defaultdict(lambda: defaultdict(int))
+    rows = flagged_rows = 0
+    
+    for frame in chunks:
+        flagged = flagged_column(frame)
+        labelled = flagged.notna()
+        rows += int(labelled.sum())
+        flagged_rows += int(flagged[labelled].sum())
+        
+        for name in RATE_TABLES:
+            if name not in frame:
+                continue
+            keys = frame.loc[labelled, name]
+            grouped = flagged[labelled].groupby(keys).agg(['count', 'sum'])
+            for key, (count, total) in grouped.iterrows():
+                if key == '':
+                    continue
+                rates[name][str(key)][0] += int(count)
+                rates[name][str(key)][1] += int(total)
+        
+        location = frame['country'] if 'country' in frame else frame.get('location')
+        if location is not None and 'userId' in frame:
+            pairs = pd.DataFrame({'userId': frame['userId'], 'country': location}).dropna()
+            for (user_id, country), count in pairs.value_counts().items():
+                country_counts[str(user_id)][str(country)] += int(count)
+    
+    # Home country: the country a user transacts from most often
+    home_countries = {
+        user_id: max(counts.items(), key=lambda item: item[1])[0]
+        for user_id, counts in country_counts.items()
+    }
+    rates = {name: {key: tuple(value) for key, value in table.items()} for name, table in rates.items()}
+    return rates, home_countries, rows, flagged_rows
+
+def main():
+    """Aggregate the history file and write the tables"""
+    parser = argparse.ArgumentParser(description="Build fraud risk lookup tables from transaction history")
+    parser.add_argument("input", nargs="?", default=str(BASE_DIR / "data" / "transactions.csv"),
+                        help="CSV or Parquet file with merchant, category, country, userId and isFlagged/fraudScore")
+    parser.add_argument("-o", "--output", default=RISK_TABLES_DIR, help="Output directory")
+    parser.add_argument("--chunk-size", type=int, default=500000, help="Rows per chunk")
+    parser.add_argument("--prior-weight", type=float, default=10.0,
+                        help="Pseudo-transactions at the overall rate added to every key's rate")
+    args = parser.parse_args()
+    
+    print("=" * 50)
+    print("Building Risk Tables")
+    print("=" * 50)
+    
+    start = time.perf_counter()
+    rates, home_countries, rows, flagged = aggregate(read_chunks(Path(args.input), args.chunk_size))
+    if not rows:
+        print("Error: no rows with isFlagged or fraudScore labels")
+        sys.exit(1)
+    write_risk_tables(args.output, rates, home_countries, rows, flagged, args.prior_weight)
+    
+    print(f"Rows:       {rows:,} ({flagged / rows:.2%} flagged)")
+    for name in RATE_TABLES:
+        print(f"{name.capitalize() + ' keys:':<12}{len(rates[name]):,}")
+    print(f"Users:      {len(home_countries):,}")
+    print(f"Written to {args.output} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
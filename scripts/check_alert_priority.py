@@ -0,0 +1,56 @@
+"""
+Check Alert Priority
+Scores a routine and an anomalous transaction, opens alerts for both at the
+same fraud score and checks the anomalous one ranks first by priority
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.alert_queue import AlertQueue
+from ml_service.services.fraud_service import FraudDetectionService
+
+FRAUD_SCORE = 80.0
+CREATED_AT = "2026-01-12T12:00:00"
+
+def transactions():
+    """A grocery history, a purchase like it and a large late-night crypto purchase abroad"""
+    history = [
+        {"id": f"h{i}", "userId": "u1", "amount": 40.0 + i, "merchant": "Grocer", "category": "groceries",
+         "type": "debit", "location": "US", "timestamp": f"2026-01-{i + 1:02d}T12:00:00"}
+        for i in range(10)
+    ]
+    normal = {"id": "normal", "userId": "u1", "amount": 45.0, "merchant": "Grocer", "category": "groceries",
+              "type": "debit", "location": "US", "timestamp": CREATED_AT}
+    anomalous = {"id": "anomalous", "userId": "u1", "amount": 9800.0, "merchant": "Crypto Exchange",
+                 "category": "crypto", "type": "debit", "location": "RU", "frequency": 30,
+                 "timestamp": "2026-01-12T03:00:00"}
+    return history, normal, anomalous
+
+def main():
+    """Rank the two alerts and check the anomaly severity raises priority"""
+    service = FraudDetectionService()
+    history, normal, anomalous = transactions()
+    raw, scaled = service.compile_features([normal, anomalous], [history, history])
+    _, is_anomaly, severities = service.score_anomaly_detailed(raw.copy(), scaled.copy())
+    for transaction, flag, severity in zip((normal, anomalous), is_anomaly, severities):
+        print(f"  {transaction['id']:<10} isAnomaly={bool(flag)!s:<5} severity={severity:.1f}")
+    
+    queue = AlertQueue()
+    for transaction, severity in zip((normal, anomalous), severities):
+        queue.upsert(transaction["id"], "u1", transaction["id"], fraud_score=FRAUD_SCORE,
+                     anomaly_score=severity, created_at=CREATED_AT)
+    ranked = [alert["alertId"] for alert in queue.page("priority")["alerts"]]
+    print(f"Priority order at fraud score {FRAUD_SCORE:.0f}: {ranked}")
+    
+    if list(is_anomaly) != [False, True] or ranked != ["anomalous", "normal"]:
+        print("\nAlert priority check FAILED")
+        sys.exit(1)
+    print("\nAlert priority check passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Check Cascade Agreement
+Measures how often the cascade (rule pre-screen + fraud model on the
+uncertain band) agrees with running the full fraud model on everything
+"""
+
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.fraud_service import FraudDetectionService, CASCADE_LOW, CASCADE_HIGH
+from rescore_transactions import read_chunks, chunk_columns, RunningUserMeans, RollingUserCounts
+
+FLAG_THRESHOLD = 70
+
+def synthetic_columns(n_rows, seed=42):
+    """Transactions drawn like the fraud model's synthetic training data"""
+    rng = np.random.default_rng(seed)
+    amount = rng.exponential(5000, n_rows)
+    location_foreign = rng.random(n_rows) < 0.3
+    frequency = rng.poisson(5, n_rows).astype(np.float64)
+    tx_type = rng.choice(np.array(['credit', 'debit', 'withdrawal']), n_rows, p=[0.3, 0.5, 0.2])
+    return amount, location_foreign, frequency, tx_type, np.full(n_rows, np.nan)
+
+def collect_scores(service, column_batches):
+    """Return (pre-screen scores, full model scores) over every batch"""
+    prescreen, full = [], []
+    for columns in column_batches:
+        raw, scaled = service.feature_compiler.compile_columns(*columns)
+        model_scores = service._model_scores(raw, scaled)
+        if model_scores is None:
+            print("Error: no fraud model available to compare against")
+            sys.exit(1)
+        prescreen.append(service.rule_engine.score(raw))
+        full.append(model_scores)
+    return np.concatenate(prescreen), np.concatenate(full)
+
+def agreement(prescreen, full, low, high):
+    """Compare cascade decisions for one band with the full model's"""
+    settled_low = prescreen < low
+    settled_high = prescreen >= high
+    cascade = np.where(settled_low | settled_high, prescreen, full)
+    
+    full_flags = full >= FLAG_THRESHOLD
+    cascade_flags = cascade >= FLAG_THRESHOLD
+    flagged = full_flags.sum()
+    return {
+        'settled': (settled_low | settled_high).mean(),
+        'agreement': (full_flags == cascade_flags).mean(),
+        'recall': (full_flags & cascade_flags).sum() / flagged if flagged else 1.0,
+        'missed': int((full_flags & ~cascade_flags).sum()),
+        'max_screened_model_score': full[settled_low].max() if settled_low.any() else 0.0
+    }
+
+def main():
+    """Score a dataset both ways and report agreement for a sweep of bands"""
+    parser = argparse.ArgumentParser(description="Measure cascade agreement with the full fraud model")
+    parser.add_argument("input", nargs="?", default=None,
+                        help="CSV or Parquet file shaped like data/transactions.csv")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Score N synthetic transactions instead of a file")
+    parser.add_argument("--low", type=float, default=CASCADE_LOW, help="Pre-screen benign threshold")
+    parser.add_argument("--high", type=float, default=CASCADE_HIGH, help="Pre-screen fraud threshold")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Exit non-zero if decision agreement at --low/--high is below this")
+    args = parser.parse_args()
+    
+    print("=" * 50)
+    print("Cascade Agreement")
+    print("=" * 50)
+    
+    service = FraudDetectionService()
+    if args.synthetic:
+        batches = [synthetic_columns(args.synthetic)]
+        print(f"Data: {args.synthetic:,} synthetic transactions")
+    else:
+        input_path = Path(args.input) if args.input else BASE_DIR / "data" / "transactions.csv"
+        user_means = RunningUserMeans()
+        velocity = RollingUserCounts()
+        batches = (
+            chunk_columns(frame, user_means, velocity, service.risk_tables)
+            for frame in read_chunks(input_path, args.chunk_size)
+        )
+        print(f"Data: {input_path}")
+    
+    prescreen, full = collect_scores(service, batches)
+    print(f"Rows: {len(full):,}, flagged by the full model: {(full >= FLAG_THRESHOLD).mean():.2%}\n")
+    
+    print(f"{'low':>6} {'high':>6} {'settled':>8} {'agree':>8} {'recall':>8} {'missed':>7} {'max screened':>13}")
+    lows = sorted({0.0, 10.0, 20.0, 30.0, 40.0, 50.0, args.low})
+    for low in lows:
+        result = agreement(prescreen, full, low, args.high)
+        marker = "  <- configured" if low == args.low else ""
+        print(
+            f"{low:>6g} {args.high:>6g} {result['settled']:>8.2%} {result['agreement']:>8.2%} "
+            f"{result['recall']:>8.2%} {result['missed']:>7} {result['max_screened_model_score']:>13.2f}{marker}"
+        )
+    
+    configured = agreement(prescreen, full, args.low, args.high)
+    if args.min_agreement is not None and configured['agreement'] < args.min_agreement:
+        print(f"\nAgreement {configured['agreement']:.4f} is below {args.min_agreement}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Check Forecast Scale
+Forecasts synthetic daily histories at very different spending levels and
+checks each forecast stays within a sane multiple of its history's level
+"""
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.forecast_service import ForecastService
+
+# (label, low, high) of the uniform daily amounts in each history
+LEVELS = [
+    ('small', 10, 200),
+    ('medium', 200, 1000),
+    ('training scale', 1000, 5000),
+    ('large', 20000, 80000)
+]
+
+def history(low: float, high: float, days: int, seed: int):
+    """One debit per day for `days` days up to yesterday"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=days)
+    return [
+        {"date": date.isoformat(), "amount": float(amount), "type": "debit"}
+        for date, amount in zip(dates, rng.uniform(low, high, days))
+    ]
+
+def main():
+    """Forecast each level and compare the mean daily forecast with the history's trailing mean"""
+    parser = argparse.ArgumentParser(description="Check forecasts stay on the scale of their history")
+    parser.add_argument("--days", type=int, default=120, help="Days of history per user")
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="Largest allowed forecast/history level ratio")
+    args = parser.parse_args()
+    
+    service = ForecastService()
+    failed = False
+    for seed, (label, low, high) in enumerate(LEVELS):
+        rows = history(low, high, args.days, seed)
+        result = asyncio.run(service.generate_forecast(None, 'daily', 1, rows, 'spending'))
+        level = np.mean([row["amount"] for row in rows[-28:]])
+        forecast = np.mean([point["predictedAmount"] for point in result["predictions"]])
+        ratio = forecast / level
+        ok = 1 / args.max_ratio <= ratio <= args.max_ratio
+        print(f"  {'ok  ' if ok else 'FAIL'} {label:<15} history {level:>9.1f}/day  forecast {forecast:>9.1f}/day  "
+              f"x{ratio:.2f}  {result['model']} accuracy {result['accuracy']:.2f}")
+        failed |= not ok
+    
+    if failed:
+        print("\nForecast scale check FAILED")
+        sys.exit(1)
+    print("\nForecast scale check passed")
+
+if __name__ == "__main__":
+    main()
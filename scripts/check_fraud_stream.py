@@ -0,0 +1,50 @@
+"""
+Check Fraud Stream
+Sends an NDJSON stream with malformed lines among valid transactions to
+/api/fraud/detect/stream and checks every line gets its own result, in order
+"""
+
+import sys
+import json
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.app import app
+
+def stream_lines():
+    """Valid requests with a non-JSON line, invalid UTF-8 and a schema error between them"""
+    valid = [
+        json.dumps({"transaction": {"id": f"tx-{i}", "userId": "u1", "amount": 100.0 * (i + 1), "type": "debit"}}).encode()
+        for i in range(4)
+    ]
+    return [valid[0], b"not json {", valid[1], b"\xff\xfe garbage", valid[2], b'{"transaction": {"amount": "x"}}', valid[3]]
+
+def main():
+    """Stream the lines and check the results line by line"""
+    lines = stream_lines()
+    with TestClient(app) as client:
+        response = client.post("/api/fraud/detect/stream", content=b"\n".join(lines) + b"\n")
+    
+    results = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    print(f"Status {response.status_code}, {len(results)} results for {len(lines)} lines")
+    
+    failed = response.status_code != 200 or len(results) != len(lines)
+    for line, result in zip(lines, results):
+        expected_error = not line.startswith(b'{"transaction": {"id"')
+        ok = ("error" in result) == expected_error
+        label = "error" if "error" in result else f"scored {result.get('transactionId')}"
+        print(f"  {'ok  ' if ok else 'FAIL'} {line[:40]!r}: {label}")
+        failed |= not ok
+    
+    if failed:
+        print("\nStream check FAILED")
+        sys.exit(1)
+    print("\nStream check passed")
+
+if __name__ == "__main__":
+    main()
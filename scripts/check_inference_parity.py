@@ -0,0 +1,90 @@
+"""
+Check Compiled Inference Parity
+Compares the compiled NumPy tree backends with the trained fraud models
+"""
+
+import sys
+import time
+import joblib
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.tree_inference import (
+    CompiledXGBClassifier,
+    CompiledIsolationForest,
+    probe_matrix
+)
+
+MODELS_DIR = BASE_DIR / "models" / "fraud"
+
+def time_single_row(predict, x, repeats=1000):
+    """Return the mean latency in microseconds of predict on one row"""
+    predict(x)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict(x)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+def check(name, original, compiled, original_fn, compiled_fn, n_rows=10000):
+    """Report the max difference and single-row latency of both backends"""
+    X = probe_matrix(compiled.ensemble, original.n_features_in_, n_rows=n_rows, seed=1)
+    error = np.abs(compiled_fn(X) - original_fn(X)).max()
+    
+    x = X[:1]
+    original_us = time_single_row(original_fn, x, repeats=200)
+    compiled_us = time_single_row(compiled_fn, x)
+    
+    print(f"{name}:")
+    print(f"  max abs error over {n_rows} rows: {error:.3e}")
+    print(f"  single row: original {original_us:.1f}us, compiled {compiled_us:.1f}us")
+    return error
+
+def main():
+    """Run parity checks for every trained fraud model"""
+    print("=" * 50)
+    print("Compiled Inference Parity")
+    print("=" * 50)
+    
+    failed = False
+    
+    fraud_path = MODELS_DIR / "fraud_detection_model.pkl"
+    if fraud_path.exists():
+        model = joblib.load(fraud_path)
+        compiled = CompiledXGBClassifier.from_model(model)
+        error = check(
+            "fraud_detection_model",
+            model,
+            compiled,
+            lambda X: model.predict_proba(X)[:, 1],
+            lambda X: compiled.predict_proba(X)[:, 1]
+        )
+        failed |= error > 1e-5
+    else:
+        print(f"Skipping fraud model: {fraud_path} not found")
+    
+    anomaly_path = MODELS_DIR / "anomaly_detection_model.pkl"
+    if anomaly_path.exists():
+        model = joblib.load(anomaly_path)
+        compiled = CompiledIsolationForest.from_model(model)
+        error = check(
+            "anomaly_detection_model",
+            model,
+            compiled,
+            model.decision_function,
+            compiled.decision_function
+        )
+        failed |= error > 1e-9
+    else:
+        print(f"Skipping anomaly model: {anomaly_path} not found")
+    
+    if failed:
+        print("\nParity check FAILED")
+        sys.exit(1)
+    print("\nParity check passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Batch Forecasts
+Forecasts every user in a transaction history file (CSV or Parquet) across a
+process pool and streams the results to an NDJSON file as chunks complete
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.forecast_engine import TARGET_TYPES, PERIODS, daily_totals, chunk_totals
+
+DATA_DIR = BASE_DIR / "data"
+
+# Columns the forecasts read; anything else in the file is skipped
+COLUMNS = ('userId', 'date', 'timestamp', 'createdAt', 'ds', 'amount', 'y', 'value', 'type')
+
+# Service instance owned by each pool worker (or the main process with --workers 0)
+_service = None
+
+def _init_worker():
+    global _service
+    from ml_service.services.forecast_service import ForecastService
+    _service = ForecastService()
+
+def forecast_chunk(totals, period, months, target):
+    """Forecast one chunk of users' daily totals"""
+    return _service.generate_batch(totals, period, months, target)
+
+def read_history(path):
+    """Read only the forecast columns of a CSV or Parquet file"""
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        names = pq.ParquetFile(path).schema_arrow.names
+        return pd.read_parquet(path, columns=[c for c in COLUMNS if c in names])
+    return pd.read_csv(path, usecols=lambda c: c in COLUMNS)
+
+def run(input_path, output, period, months, target, workers, chunk_users):
+    """Forecast every user of input_path and write one JSON line per user to output"""
+    start = time.perf_counter()
+    totals = daily_totals(read_history(input_path), target)
+    chunks = list(chunk_totals(totals, chunk_users))
+    print(f"  {len(chunks):,} chunks prepared in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    
+    pool = None
+    if workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    else:
+        _init_worker()
+    
+    users = 0
+    
+    def write(results):
+        nonlocal users
+        for result in results:
+            output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+        users += len(results)
+        elapsed = time.perf_counter() - start
+        print(f"  {users:,} users  {users / elapsed:,.0f} users/s", file=sys.stderr)
+    
+    try:
+        if pool is None:
+            for _, chunk in chunks:
+                write(forecast_chunk(chunk, period, months, target))
+        else:
+            futures = [pool.submit(forecast_chunk, chunk, period, months, target) for _, chunk in chunks]
+            for future in as_completed(futures):
+                write(future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    
+    return users, time.perf_counter() - start
+
+def main():
+    """Parse arguments and run the batch forecast"""
+    parser = argparse.ArgumentParser(description="Forecast every user in a transaction history file")
+    parser.add_argument("input", nargs="?", default=str(DATA_DIR / "transactions.csv"),
+                        help="CSV or Parquet file with userId, a date column, amount and optionally type")
+    parser.add_argument("-o", "--output", default=None,
+                        help="NDJSON output path, '-' for stdout (default: <input>_forecasts.ndjson)")
+    parser.add_argument("--period", choices=PERIODS, default="monthly", help="Output bucket size")
+    parser.add_argument("--months", type=int, default=1, help="Forecast horizon in months")
+    parser.add_argument("--target", choices=sorted(TARGET_TYPES), default="spending", help="What to forecast")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Forecasting processes; 0 forecasts in the main process")
+    parser.add_argument("--chunk-users", type=int, default=200, help="Users per worker task")
+    args = parser.parse_args()
+    
+    input_path = Path(args.input)
+    output_path = args.output or str(input_path.with_name(f"{input_path.stem}_forecasts.ndjson"))
+    
+    print("=" * 50, file=sys.stderr)
+    print("Batch Forecasts", file=sys.stderr)
+    print("=" * 50, file=sys.stderr)
+    print(f"Input:   {input_path}", file=sys.stderr)
+    print(f"Output:  {output_path}", file=sys.stderr)
+    print(f"Workers: {args.workers}, users per chunk: {args.chunk_users:,}", file=sys.stderr)
+    
+    output = sys.stdout if output_path == "-" else open(output_path, "w")
+    try:
+        users, elapsed = run(
+            input_path, output, args.period, args.months, args.target, args.workers, args.chunk_users
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    print(f"\nForecast {users:,} users in {elapsed:.1f}s ({users / max(elapsed, 1e-9):,.0f} users/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
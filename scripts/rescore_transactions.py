@@ -0,0 +1,269 @@
+"""
+Bulk Rescore Transactions
+Rescores a transaction history file (CSV or Parquet) with the current fraud
+and anomaly models and writes the results to Parquet
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Add parent directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ml_service.services.velocity_index import DAY
+from ml_service.services.risk_tables import RiskTables, RATE_TABLES
+from ml_service.services.fraud_service import RISK_TABLES_DIR, HOME_COUNTRY
+
+DATA_DIR = BASE_DIR / "data"
+
+# Service instance owned by each pool worker (or the main process with --workers 0)
+_service = None
+
+def _init_worker():
+    global _service
+    from ml_service.services.fraud_service import FraudDetectionService
+    _service = FraudDetectionService()
+
+def score_chunk(amount, location_foreign, frequency, tx_type, avg_amount, context=None):
+    """Compile features and score one chunk; returns (fraud scores, anomaly scores, anomaly flags)"""
+    raw, scaled = _service.feature_compiler.compile_columns(
+        amount, location_foreign, frequency, tx_type, avg_amount, context
+    )
+    fraud_scores = _service.score_batch(raw, scaled)
+    anomaly_scores, is_anomaly = _service.score_anomaly_batch(raw, scaled, fraud_scores)
+    return fraud_scores, anomaly_scores, is_anomaly
+
+def read_chunks(path, chunk_size):
+    """Yield DataFrame chunks of a CSV or Parquet file without loading it whole"""
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+class RunningUserMeans:
+    """Per-user amount totals carried across chunks.
+    
+    Each row gets the mean of the same user's earlier rows in file order,
+    matching what the API sees from its running aggregates. Sort the file
+    by timestamp first for point-in-time averages.
+    """
+    
+    def __init__(self):
+        self.counts = {}
+        self.totals = {}
+    
+    def prior_means(self, user_ids, amounts):
+        codes, users = pd.factorize(user_ids)
+        amounts = pd.Series(amounts)
+        grouped = amounts.groupby(codes)
+        
+        prev_counts = np.array([self.counts.get(u, 0) for u in users], dtype=np.float64)
+        prev_totals = np.array([self.totals.get(u, 0.0) for u in users], dtype=np.float64)
+        counts = prev_counts[codes] + grouped.cumcount().to_numpy()
+        totals = prev_totals[codes] + (grouped.cumsum() - amounts).to_numpy()
+        
+        chunk_counts = np.bincount(codes, minlength=len(users))
+        chunk_totals = np.bincount(codes, weights=amounts.to_numpy(), minlength=len(users))
+        for i, user_id in enumerate(users):
+            self.counts[user_id] = prev_counts[i] + chunk_counts[i]
+            self.totals[user_id] = prev_totals[i] + chunk_totals[i]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+class RollingUserCounts:
+    """Per-user 24h transaction counts carried across chunks.
+    
+    Each row gets the number of the same user's earlier rows in the 24 hours
+    up to its timestamp, as the API's velocity index would report; rows are
+    counted in timestamp order, ties in file order. Only events within 24h
+    of the newest timestamp seen are carried to the next chunk, so memory
+    stays bounded by one window of traffic. Sort the file by timestamp
+    first for exact counts across chunks.
+    """
+    
+    def __init__(self, window=DAY):
+        self.window = pd.Timedelta(seconds=window)
+        self.carried = pd.DataFrame({
+            'user': pd.Series(dtype=object),
+            'time': pd.Series(dtype='datetime64[ns, UTC]')
+        })
+    
+    def prior_counts(self, user_ids, times):
+        """Counts for one chunk's rows; rows without a user or a timestamp count 0"""
+        counts = np.zeros(len(user_ids))
+        valid = (pd.notna(user_ids) & times.notna().to_numpy())
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return counts
+        
+        events = pd.concat([
+            self.carried.assign(row=-1),
+            pd.DataFrame({'user': user_ids[valid], 'time': times[valid].to_numpy(), 'row': rows})
+        ], ignore_index=True)
+        events['code'] = pd.factorize(events['user'])[0]
+        events = events.sort_values(['code', 'time', 'row'], kind='stable', ignore_index=True)
+        
+        # Rolling (t - 24h, t] count per user, including the row itself
+        window = pd.Series(1.0, index=pd.DatetimeIndex(events['time']))
+        in_window = window.groupby(events['code'].to_numpy()).rolling(self.window).count().to_numpy()
+        chunk_rows = events['row'].to_numpy() >= 0
+        counts[events['row'].to_numpy()[chunk_rows]] = in_window[chunk_rows] - 1
+        
+        newest = events['time'].max()
+        self.carried = events.loc[events['time'] > newest - self.window, ['user', 'time']].reset_index(drop=True)
+        return counts
+
+def replay_frequency(frame, counter):
+    """24h transaction counts per row, carried across chunks by a RollingUserCounts"""
+    times = pd.to_datetime(frame['timestamp'], utc=True, errors='coerce')
+    return counter.prior_counts(frame['userId'].to_numpy(), times)
+
+def _values(column):
+    """Column values as a list with missing entries as None"""
+    return column.astype(object).where(column.notna(), None).tolist()
+
+def chunk_columns(frame, user_means, velocity=None, risk=None):
+    """Extract the column arrays score_chunk() needs from a transactions chunk"""
+    n = len(frame)
+    amount = pd.to_numeric(frame['amount'], errors='coerce').fillna(0).to_numpy(np.float64)
+    
+    location = frame['location'] if 'location' in frame else frame.get('country')
+    if location is None:
+        location_foreign = np.zeros(n, dtype=bool)
+    elif risk is not None:
+        user_ids = _values(frame['userId']) if 'userId' in frame else [None] * n
+        location_foreign = risk.foreign_mask(_values(location), user_ids)
+    else:
+        location_foreign = ~(location.isna() | (location == '')).to_numpy()
+    
+    if 'frequency' in frame:
+        frequency = pd.to_numeric(frame['frequency'], errors='coerce').fillna(0).to_numpy(np.float64)
+    elif velocity is not None and 'userId' in frame and 'timestamp' in frame:
+        frequency = replay_frequency(frame, velocity)
+    else:
+        frequency = np.zeros(n)
+    
+    tx_type = frame['type'].fillna('').astype(str).to_numpy() if 'type' in frame else np.full(n, '')
+    
+    if user_means is not None and 'userId' in frame:
+        avg_amount = user_means.prior_means(frame['userId'].to_numpy(), amount)
+    else:
+        avg_amount = np.full(n, np.nan)
+    
+    context = {}
+    if risk is not None:
+        for name in RATE_TABLES:
+            keys = _values(frame[name]) if name in frame else [None] * n
+            context[f'{name}_fraud_rate'] = risk.rates(name, keys)
+    
+    return amount, location_foreign, frequency, tx_type, avg_amount, context
+
+def attach_scores(frame, fraud_scores, anomaly_scores, is_anomaly):
+    frame = frame.copy()
+    frame['fraudScore'] = fraud_scores.astype(np.float64)
+    frame['isFlagged'] = fraud_scores >= 70
+    frame['anomalyScore'] = anomaly_scores.astype(np.float64)
+    frame['isAnomaly'] = np.asarray(is_anomaly, dtype=bool)
+    return frame
+
+def rescore(input_path, output_path, chunk_size, workers, use_history=True, risk=None):
+    """Rescore input_path chunk by chunk and write the results to output_path"""
+    user_means = RunningUserMeans() if use_history else None
+    velocity = RollingUserCounts() if use_history else None
+    pool = None
+    if workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    else:
+        _init_worker()
+    
+    # Keep a bounded number of chunks in flight so memory stays flat
+    max_in_flight = max(1, workers * 2)
+    pending = deque()
+    writer = None
+    rows = 0
+    start = time.perf_counter()
+    
+    def write_next():
+        nonlocal writer, rows
+        frame, result = pending.popleft()
+        scores = result.result() if pool is not None else result
+        frame = attach_scores(frame, *scores)
+        if writer is None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = pq.ParquetWriter(output_path, table.schema)
+        else:
+            table = pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False)
+        writer.write_table(table)
+        
+        rows += len(frame)
+        elapsed = time.perf_counter() - start
+        print(f"  {rows:,} rows  {rows / elapsed:,.0f} rows/s")
+    
+    try:
+        for frame in read_chunks(input_path, chunk_size):
+            columns = chunk_columns(frame, user_means, velocity, risk)
+            if pool is not None:
+                pending.append((frame, pool.submit(score_chunk, *columns)))
+            else:
+                pending.append((frame, score_chunk(*columns)))
+            while len(pending) >= max_in_flight:
+                write_next()
+        while pending:
+            write_next()
+    finally:
+        if writer is not None:
+            writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    
+    return rows, time.perf_counter() - start
+
+def main():
+    """Parse arguments and run the rescoring job"""
+    parser = argparse.ArgumentParser(description="Rescore a transaction history file with the fraud models")
+    parser.add_argument("input", nargs="?", default=str(DATA_DIR / "transactions.csv"),
+                        help="CSV or Parquet file shaped like data/transactions.csv")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Parquet output path (default: <input>_scored.parquet)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Scoring processes; 0 scores in the main process")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Skip per-user running averages and 24h counts (avg_amount and frequency stay 0)")
+    parser.add_argument("--risk-tables", default=RISK_TABLES_DIR,
+                        help="Directory written by build_risk_tables.py (home countries and fraud rates)")
+    args = parser.parse_args()
+    
+    input_path = Path(args.input)
+    output_path = Path(args.output) if args.output else input_path.with_name(f"{input_path.stem}_scored.parquet")
+    
+    print("=" * 50)
+    print("Bulk Transaction Rescoring")
+    print("=" * 50)
+    print(f"Input:   {input_path}")
+    print(f"Output:  {output_path}")
+    print(f"Workers: {args.workers}, chunk size: {args.chunk_size:,}")
+    
+    risk = RiskTables.load(args.risk_tables, default_country=HOME_COUNTRY)
+    print(f"Risk tables: {args.risk_tables if risk.loaded else 'not found, any country counts as foreign'}")
+    
+    rows, elapsed = rescore(input_path, output_path, args.chunk_size, args.workers, not args.no_history, risk)
+    
+    print(f"\nRescored {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
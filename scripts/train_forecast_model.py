@@ -46,7 +46,7 @@ def generate_forecast_data(n_samples=1000):
     
     return df
 
-def train_spending_forecast_model():
+def train_spending_forecast_model(filename="spending_forecast_model.pkl"):
     """Train spending forecast model using Prophet or alternative"""
     print("Training spending forecast model...")
     
@@ -62,7 +62,7 @@ def train_spending_forecast_model():
         
         model.fit(df)
         
-        model_path = MODELS_DIR / "spending_forecast_model.pkl"
+        model_path = MODELS_DIR / filename
         joblib.dump(model, model_path)
         
         print(f"Prophet model saved to {model_path}")
@@ -97,7 +97,7 @@ def train_spending_forecast_model():
         
         model.fit(X, y)
         
-        model_path = MODELS_DIR / "spending_forecast_model.pkl"
+        model_path = MODELS_DIR / filename
         joblib.dump(model, model_path)
         
         print(f"XGBoost model saved to {model_path}")
@@ -107,8 +107,8 @@ def train_income_forecast_model():
     """Train income forecast model"""
     print("Training income forecast model...")
     
-    # Similar to spending forecast
-    return train_spending_forecast_model()
+    # Same lag-feature model as spending, saved under the income name
+    return train_spending_forecast_model("income_forecast_model.pkl")
 
 def generate_default_risk_data(n_samples=5000):
     """Generate synthetic default risk training data"""